@@ -34,7 +34,7 @@ def main():
 
     callback = Future()
 
-    boomerang.async(callback).throw()
+    boomerang.asynchronous(callback).throw()
 
     time.sleep(10)
 
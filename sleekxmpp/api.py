@@ -1,6 +1,14 @@
+import time
+import threading
+
 from sleekxmpp.xmlstream import JID
 
 
+#: Upper bounds in seconds of the buckets in the per API histograms
+#: of handler latency. Slower calls are counted in a final bucket.
+LATENCY_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0)
+
+
 class APIWrapper(object):
 
     def __init__(self, api, name):
@@ -41,9 +49,19 @@ class APIRegistry(object):
     def __init__(self, xmpp):
         self._handlers = {}
         self._handler_defaults = {}
+        self._cache = {}
+        self._lock = threading.RLock()
         self.xmpp = xmpp
         self.settings = {}
 
+        #: The maximum number of resolved handlers cached per API.
+        self.cache_size = 4096
+
+        #: Per API counters of calls, cache hits, and the total time
+        #: spent in handlers along with a histogram of handler
+        #: latency, following :data:`LATENCY_BUCKETS`.
+        self.stats = {}
+
     def _setup(self, ctype, op):
         """Initialize the API callback dictionaries.
 
@@ -67,9 +85,12 @@ class APIRegistry(object):
 
     def purge(self, ctype):
         """Remove all information for a given API."""
-        del self.settings[ctype]
-        del self._handler_defaults[ctype]
-        del self._handlers[ctype]
+        with self._lock:
+            del self.settings[ctype]
+            del self._handler_defaults[ctype]
+            del self._handlers[ctype]
+            self._cache.pop(ctype, None)
+            self.stats.pop(ctype, None)
 
     def run(self, ctype, op, jid=None, node=None, ifrom=None, args=None):
         """Execute an API callback, based on specificity.
@@ -96,6 +117,71 @@ class APIRegistry(object):
         :param string node: Optionally provide specific node.
         :param JID ifrom: Optionally provide the requesting JID.
         :param tuple args: Optional positional arguments to the handler.
+
+        The resolved handler is cached, until handlers for the API
+        are registered or removed. Each handler is given its own copy
+        of the JID, which it may modify.
+        """
+        jid_key = str(jid) if jid else ''
+        if not jid_key:
+            jid_key = self.xmpp.boundjid.full
+        if self.xmpp.is_component:
+            bare = self.settings.get(ctype, {}).get('component_bare', False)
+        else:
+            bare = self.settings.get(ctype, {}).get('client_bare', False)
+        key = (op, jid_key, node, bare)
+
+        with self._lock:
+            cache = self._cache.get(ctype)
+            if cache is None:
+                cache = self._cache[ctype] = {}
+            resolved = cache.get(key)
+            hit = resolved is not None
+            if not hit:
+                resolved = self._resolve(ctype, op, jid, node)
+                if len(cache) >= self.cache_size:
+                    cache.clear()
+                cache[key] = resolved
+
+            stats = self.stats.get(ctype)
+            if stats is None:
+                stats = self.stats[ctype] = {
+                    'calls': 0, 'hits': 0, 'time': 0.0,
+                    'histogram': [0] * (len(LATENCY_BUCKETS) + 1)}
+            stats['calls'] += 1
+            if hit:
+                stats['hits'] += 1
+
+        jid, node, handler = resolved
+        if handler:
+            # The resolved JID is shared by all calls, so hand each
+            # handler its own copy.
+            jid = JID(jid)
+            start = time.time()
+            try:
+                return handler(jid, node, ifrom, args)
+            except TypeError:
+                # To preserve backward compatibility, drop the ifrom
+                # parameter for existing handlers that don't understand it.
+                return handler(jid, node, args)
+            finally:
+                elapsed = time.time() - start
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if elapsed <= bound:
+                        break
+                else:
+                    i = len(LATENCY_BUCKETS)
+                with self._lock:
+                    stats['time'] += elapsed
+                    stats['histogram'][i] += 1
+
+    def _resolve(self, ctype, op, jid, node):
+        """Find the handler for an operation, based on specificity.
+
+        See :meth:`~ApiRegistry.run` for more details.
+
+        :returns: A tuple of the normalized JID and node, and the
+                  handler, which may be ``None``.
         """
         self._setup(ctype, op)
 
@@ -127,14 +213,7 @@ class APIRegistry(object):
             handler = self._handlers[ctype][op]['jid'].get(jid, None)
         if handler is None:
             handler = self._handlers[ctype][op].get('global', None)
-
-        if handler:
-            try:
-                return handler(jid, node, ifrom, args)
-            except TypeError:
-                # To preserve backward compatibility, drop the ifrom
-                # parameter for existing handlers that don't understand it.
-                return handler(jid, node, args)
+        return jid, node, handler
 
     def register(self, handler, ctype, op, jid=None, node=None, default=False):
         """Register an API callback, with JID+node specificity.
@@ -149,15 +228,18 @@ class APIRegistry(object):
         :param JID jid: Optionally provide specific JID.
         :param string node: Optionally provide specific node.
         """
-        self._setup(ctype, op)
-        if jid is None and node is None:
-            if handler is None:
-                handler = self._handler_defaults[op]
-            self._handlers[ctype][op]['global'] = handler
-        elif jid is not None and node is None:
-            self._handlers[ctype][op]['jid'][jid] = handler
-        else:
-            self._handlers[ctype][op]['node'][(jid, node)] = handler
+        with self._lock:
+            self._setup(ctype, op)
+            if jid is None and node is None:
+                if handler is None:
+                    handler = self._handler_defaults[ctype].get(op)
+                self._handlers[ctype][op]['global'] = handler
+            elif jid is not None and node is None:
+                self._handlers[ctype][op]['jid'][jid] = handler
+            else:
+                self._handlers[ctype][op]['node'][(jid, node)] = handler
+            # Drop resolved handlers once the change is in place.
+            self._cache.pop(ctype, None)
 
         if default:
             self.register_default(handler, ctype, op)
@@ -169,8 +251,9 @@ class APIRegistry(object):
         :param string ctype: The name of the API to modify.
         :param string op: The API operation to use.
         """
-        self._setup(ctype, op)
-        self._handler_defaults[ctype][op] = handler
+        with self._lock:
+            self._setup(ctype, op)
+            self._handler_defaults[ctype][op] = handler
 
     def unregister(self, ctype, op, jid=None, node=None):
         """Remove an API callback.
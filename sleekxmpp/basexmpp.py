@@ -94,6 +94,14 @@ class BaseXMPP(XMLStream):
         #: :meth:`register_plugins` is called.
         self.plugin_whitelist = []
 
+        #: When ``True``, :meth:`register_plugins` only records the
+        #: plugins to load. Each is imported and initialized when it
+        #: is first accessed, such as with ``xmpp['xep_0030']``, or
+        #: when a stanza carrying one of its namespaces is received.
+        #: Deferred plugins do not react to events, or advertise
+        #: their features, until then.
+        self.lazy_plugins = False
+
         #: The main roster object. This roster supports multiple
         #: owner JIDs, as in the case for components. For clients
         #: which only have a single JID, see :attr:`client_roster`.
@@ -267,7 +275,8 @@ class BaseXMPP(XMLStream):
         """Register and initialize all built-in plugins.
 
         Optionally, the list of plugins loaded may be limited to those
-        contained in :attr:`plugin_whitelist`.
+        contained in :attr:`plugin_whitelist`. If :attr:`lazy_plugins`
+        is set, plugins are only enabled once they are used.
 
         Plugin configurations stored in :attr:`plugin_config` will be used.
         """
@@ -277,10 +286,67 @@ class BaseXMPP(XMLStream):
             plugin_list = plugins.__all__
 
         for plugin in plugin_list:
-            if plugin in plugins.__all__:
+            if plugin not in plugins.__all__:
+                raise NameError("Plugin %s not in plugins.__all__." % plugin)
+            if self.lazy_plugins and plugin not in plugins.EAGER_PLUGINS:
+                self.plugin.defer(plugin, self.plugin_config.get(plugin, {}))
+            else:
                 self.register_plugin(plugin)
+
+        if self.lazy_plugins:
+            self.add_filter('in', self._activate_plugins)
+            self.add_event_handler('session_bind', self._advertise_plugins)
+
+    def _advertise_plugins(self, jid):
+        """Advertise the disco features of deferred plugins.
+
+        Peers cache the entity capabilities sent at the start of a
+        session, so the features of plugins which are not yet enabled
+        must be included right away. Plugins whose features are not
+        known ahead of time are enabled instead.
+
+        :param jid: The bound JID.
+        """
+        for name, features in plugins.PLUGIN_FEATURES.items():
+            if not self.plugin.deferred(name):
+                continue
+            if features is None:
+                self.plugin.activate(name)
+                continue
+            if 'xep_0030' not in self.plugin:
+                continue
+            for feature in features:
+                self.plugin['xep_0030'].add_feature(feature)
+
+    def _activate_plugins(self, stanza):
+        """Enable deferred plugins for the payloads of a received stanza.
+
+        If any plugin is enabled, the stanza is rebuilt so that it
+        includes the plugin's stanza interfaces.
+
+        :param stanza: The received stanza.
+        """
+        rebuild = False
+        for sub in stanza.xml:
+            tag = sub.tag
+            if tag[:1] != '{':
+                continue
+            name = plugins.PLUGIN_NAMESPACES.get(tag[1:tag.find('}')])
+            if name is None:
+                continue
+            if self.plugin.deferred(name):
+                self.plugin.activate(name)
+                rebuild = True
             else:
-                raise NameError("Plugin %s not in plugins.__all__." % plugin)
+                # Another thread may have enabled the plugin after
+                # this stanza was built.
+                plugin_class = stanza.plugin_tag_map.get(tag)
+                if plugin_class is not None and \
+                   plugin_class.plugin_attrib not in stanza.loaded_plugins:
+                    rebuild = True
+        if rebuild:
+            return self._build_stanza(stanza.xml)
+        return stanza
 
     def __getitem__(self, key):
         """Return a plugin given its name, if it has been registered."""
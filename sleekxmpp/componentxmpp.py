@@ -16,7 +16,6 @@ from __future__ import absolute_import
 
 import logging
 import sys
-import hashlib
 
 from sleekxmpp.basexmpp import BaseXMPP
 from sleekxmpp.xmlstream import XMLStream
@@ -147,6 +146,7 @@ class ComponentXMPP(BaseXMPP):
             pre_hash = bytes(pre_hash, 'utf-8')
 
         handshake = ET.Element('{jabber:component:accept}handshake')
+        import hashlib
         handshake.text = hashlib.sha1(pre_hash).hexdigest().lower()
         self.send_xml(handshake, now=True)
 
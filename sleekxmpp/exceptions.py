@@ -89,3 +89,25 @@ class IqError(XMPPError):
 
         #: The :class:`~sleekxmpp.stanza.iq.Iq` error result stanza.
         self.iq = iq
+
+
+class RateLimited(Exception):
+
+    """
+    An exception raised when a stanza can not be sent without exceeding
+    the stream's outbound rate limits, and the caller asked to fail
+    instead of waiting.
+
+    Unlike :class:`XMPPError`, this is a local failure, so no error
+    reply is sent if it escapes an event handler.
+    """
+
+    def __init__(self, stanza, delay):
+        super(RateLimited, self).__init__(
+                'Outbound rate limit exceeded, retry in %.3fs' % delay)
+
+        #: The stanza which was not sent.
+        self.stanza = stanza
+
+        #: The time in seconds until the stanza could have been sent.
+        self.delay = delay
@@ -86,3 +86,132 @@ __all__ = [
     'xep_0325',  # IoT Systems Control
     'xep_0332',  # HTTP Over XMPP Transport
 ]
+
+#: Plugins which take part in stream negotiation, and so are always
+#: enabled right away, even when other plugins are loaded lazily.
+EAGER_PLUGINS = set([
+    'xep_0077',  # In-Band Registration
+    'xep_0078',  # Non-SASL Authentication
+    'xep_0079',  # Advanced Message Processing
+    'xep_0115',  # Entity Capabilities
+    'xep_0138',  # Stream Compression
+    'xep_0198',  # Stream Management
+    'xep_0352',  # Client State Indication
+])
+
+#: Map the namespaces of stanza payloads to the plugins handling them,
+#: so that lazily loaded plugins can be enabled when their payloads
+#: first arrive.
+PLUGIN_NAMESPACES = {
+    'jabber:x:data': 'xep_0004',
+    'jabber:iq:rpc': 'xep_0009',
+    'jabber:iq:last': 'xep_0012',
+    'http://jabber.org/protocol/offline': 'xep_0013',
+    'jabber:iq:privacy': 'xep_0016',
+    'http://jabber.org/protocol/feature-neg': 'xep_0020',
+    'jabber:x:encrypted': 'xep_0027',
+    'jabber:x:signed': 'xep_0027',
+    'http://jabber.org/protocol/disco#info': 'xep_0030',
+    'http://jabber.org/protocol/disco#items': 'xep_0030',
+    'http://jabber.org/protocol/address': 'xep_0033',
+    'http://jabber.org/protocol/muc#user': 'xep_0045',
+    'http://jabber.org/protocol/ibb': 'xep_0047',
+    'jabber:iq:private': 'xep_0049',
+    'http://jabber.org/protocol/commands': 'xep_0050',
+    'vcard-temp': 'xep_0054',
+    'http://jabber.org/protocol/pubsub#event': 'xep_0060',
+    'http://jabber.org/protocol/pubsub#owner': 'xep_0060',
+    'http://jabber.org/protocol/pubsub': 'xep_0060',
+    'http://jabber.org/protocol/bytestreams': 'xep_0065',
+    'jabber:iq:oob': 'xep_0066',
+    'jabber:x:oob': 'xep_0066',
+    'http://jabber.org/protocol/xhtml-im': 'xep_0071',
+    'jabber:iq:register': 'xep_0077',
+    'http://jabber.org/protocol/amp': 'xep_0079',
+    'http://jabber.org/protocol/chatstates': 'xep_0085',
+    'jabber:x:delay': 'xep_0091',
+    'jabber:iq:version': 'xep_0092',
+    'http://jabber.org/protocol/mood': 'xep_0107',
+    'http://jabber.org/protocol/caps': 'xep_0115',
+    'http://jabber.org/protocol/shim': 'xep_0131',
+    'vcard-temp:x:update': 'xep_0153',
+    'urn:xmpp:receipts': 'xep_0184',
+    'urn:xmpp:invisible:0': 'xep_0186',
+    'urn:xmpp:visible:0': 'xep_0186',
+    'urn:xmpp:blocking': 'xep_0191',
+    'urn:xmpp:ping': 'xep_0199',
+    'urn:xmpp:time': 'xep_0202',
+    'urn:xmpp:delay': 'xep_0203',
+    'urn:xmpp:attention:0': 'xep_0224',
+    'urn:xmpp:bob': 'xep_0231',
+    'urn:xmpp:oauth:0': 'xep_0235',
+    'jabber:x:conference': 'xep_0249',
+    'urn:xmpp:saslcert:1': 'xep_0257',
+    'urn:xmpp:sec-label:0': 'xep_0258',
+    'urn:xmpp:sec-label:catalog:2': 'xep_0258',
+    'urn:xmpp:sic:0': 'xep_0279',
+    'urn:xmpp:carbons:2': 'xep_0280',
+    'urn:xmpp:forward:0': 'xep_0297',
+    'urn:xmpp:message-correct:0': 'xep_0308',
+    'urn:xmpp:mam:2': 'xep_0313',
+    'urn:xmpp:idle:1': 'xep_0319',
+    'urn:xmpp:iot:sensordata': 'xep_0323',
+    'urn:xmpp:iot:control': 'xep_0325',
+    'urn:xmpp:http': 'xep_0332',
+}
+
+#: The service discovery features advertised by plugins, so that they
+#: can be included in disco#info replies and entity capabilities while
+#: the plugins are still deferred. Plugins whose features depend on
+#: their configuration are mapped to ``None``, and are enabled when a
+#: session is bound instead.
+PLUGIN_FEATURES = {
+    'xep_0004': ('jabber:x:data',),
+    'xep_0009': ('jabber:iq:rpc',),
+    'xep_0012': ('jabber:iq:last',),
+    'xep_0016': ('jabber:iq:privacy',),
+    'xep_0020': ('http://jabber.org/protocol/feature-neg',),
+    'xep_0033': ('http://jabber.org/protocol/address',),
+    'xep_0047': ('http://jabber.org/protocol/ibb',),
+    'xep_0048': ('storage:bookmarks', 'storage:bookmarks+notify'),
+    'xep_0050': ('http://jabber.org/protocol/commands',),
+    'xep_0054': ('vcard-temp',),
+    'xep_0059': ('http://jabber.org/protocol/rsm',),
+    'xep_0065': ('http://jabber.org/protocol/bytestreams',),
+    'xep_0066': ('jabber:iq:oob', 'jabber:x:oob'),
+    'xep_0071': ('http://jabber.org/protocol/xhtml-im',),
+    'xep_0080': ('http://jabber.org/protocol/geoloc',
+                 'http://jabber.org/protocol/geoloc+notify'),
+    'xep_0084': ('urn:xmpp:avatar:metadata',
+                 'urn:xmpp:avatar:metadata+notify'),
+    'xep_0085': ('http://jabber.org/protocol/chatstates',),
+    'xep_0092': ('jabber:iq:version',),
+    'xep_0106': ('jid\\20escaping',),
+    'xep_0107': ('http://jabber.org/protocol/mood',
+                 'http://jabber.org/protocol/mood+notify'),
+    'xep_0108': ('http://jabber.org/protocol/activity',
+                 'http://jabber.org/protocol/activity+notify'),
+    'xep_0118': ('http://jabber.org/protocol/tune',
+                 'http://jabber.org/protocol/tune+notify'),
+    'xep_0131': None,
+    'xep_0152': ('urn:xmpp:reach:0', 'urn:xmpp:reach:0+notify'),
+    'xep_0172': ('http://jabber.org/protocol/nick',
+                 'http://jabber.org/protocol/nick+notify'),
+    'xep_0184': ('urn:xmpp:receipts',),
+    'xep_0196': ('urn:xmpp:gaming:0', 'urn:xmpp:gaming:0+notify'),
+    'xep_0199': ('urn:xmpp:ping',),
+    'xep_0202': ('urn:xmpp:time',),
+    'xep_0224': ('urn:xmpp:attention:0',),
+    'xep_0231': ('urn:xmpp:bob',),
+    'xep_0235': ('urn:xmpp:oauth:0',),
+    'xep_0249': ('jabber:x:conference',),
+    'xep_0258': ('urn:xmpp:sec-label:0',),
+    'xep_0279': ('urn:xmpp:sic:0',),
+    'xep_0280': ('urn:xmpp:carbons:2', 'urn:xmpp:forward:0'),
+    'xep_0297': ('urn:xmpp:forward:0',),
+    'xep_0308': ('urn:xmpp:message-correct:0',),
+    'xep_0319': ('urn:xmpp:idle:1',),
+    'xep_0323': ('urn:xmpp:iot:sensordata',),
+    'xep_0325': ('urn:xmpp:iot:control',),
+    'xep_0332': None,
+}
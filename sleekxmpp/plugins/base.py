@@ -118,6 +118,10 @@ class PluginManager(object):
         #: Maintain references to active plugins.
         self._plugins = {}
 
+        #: Plugins which will be enabled on first use, mapped to
+        #: their configuration.
+        self._deferred = {}
+
         self._plugin_lock = threading.RLock()
 
         #: Globally set default plugin configuration. This will
@@ -161,6 +165,9 @@ class PluginManager(object):
                 if not plugin_class:
                     raise PluginNotFound(name)
 
+                deferred = self._deferred.pop(name, None)
+                if config is None:
+                    config = deferred
                 if config is None:
                     config = self.config.get(name, None)
 
@@ -179,6 +186,49 @@ class PluginManager(object):
                     pass
                 self.plugins[name].post_init()
 
+    def defer(self, name, config=None):
+        """Register a plugin to be enabled when it is first accessed.
+
+        Nothing is imported or initialized until then, which keeps
+        startup cheap for plugins that a session may never use.
+
+        :param string name: The short name of the plugin.
+        :param dict config: Optional settings dictionary for
+                            configuring plugin behaviour.
+        """
+        with self._plugin_lock:
+            if name not in self._enabled:
+                self._deferred[name] = config
+
+    def deferred(self, name):
+        """Check if a plugin is waiting to be enabled on first use.
+
+        :param string name: The name of the plugin to check.
+        :return: boolean
+        """
+        # A plugin stops being deferred as soon as its activation
+        # starts, so wait for any activation in progress to finish.
+        with self._plugin_lock:
+            return name in self._deferred
+
+    def activate(self, name):
+        """Enable a deferred plugin, and finish initializing it
+        and any dependencies enabled along with it.
+
+        :param string name: The short name of the plugin.
+        """
+        names = set()
+        with self._plugin_lock:
+            if name not in self._deferred:
+                return
+            self.enable(name, enabled=names)
+            for enabled_name in names:
+                plugin = self._plugins[enabled_name]
+                if not hasattr(plugin, 'post_inited'):
+                    plugin.post_init()
+                    plugin.post_inited = True
+        log.debug('Activated deferred plugin: %s', name)
+
     def enable_all(self, names=None, config=None):
         """Enable all registered plugins.
 
@@ -222,6 +272,7 @@ class PluginManager(object):
         if _disabled is None:
             _disabled = set()
         with self._plugin_lock:
+            self._deferred.pop(name, None)
             if name not in _disabled and name in self._enabled:
                 _disabled.add(name)
                 plugin = self._plugins.get(name, None)
@@ -245,9 +296,16 @@ class PluginManager(object):
         """
         plugin = self._plugins.get(name, None)
         if plugin is None:
-            raise PluginNotFound(name)
+            self.activate(name)
+            plugin = self._plugins.get(name, None)
+            if plugin is None:
+                raise PluginNotFound(name)
         return plugin
 
+    def __contains__(self, name):
+        """Check if a plugin is enabled, or will be on first use."""
+        return name in self._plugins or name in self._deferred
+
     def __iter__(self):
         """Return an iterator over the set of enabled plugins."""
         return self._plugins.__iter__()
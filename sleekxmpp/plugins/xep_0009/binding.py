@@ -36,102 +36,111 @@ def xml2fault(params):
     fault['string'] = vals[0]['faultString']
     return fault
 
+_VALUE = '{%s}value' % _namespace
+_PARAM = '{%s}param' % _namespace
+_ARRAY = '{%s}array' % _namespace
+_DATA = '{%s}data' % _namespace
+_STRUCT = '{%s}struct' % _namespace
+_MEMBER = '{%s}member' % _namespace
+_NAME = '{%s}name' % _namespace
+
+
+#: Functions converting the text of scalar values, keyed on the
+#: tag of the element inside of a <value /> element.
+_DECODERS = {
+    '{%s}nil' % _namespace: lambda text: None,
+    '{%s}i4' % _namespace: int,
+    '{%s}int' % _namespace: int,
+    '{%s}boolean' % _namespace: lambda text: bool(int(text)),
+    '{%s}string' % _namespace: lambda text: text,
+    '{%s}double' % _namespace: float,
+    '{%s}base64' % _namespace: lambda text: rpcbase64(text.encode()),
+    # Older versions of XEP-0009 used Base64
+    '{%s}Base64' % _namespace: lambda text: rpcbase64(text.encode()),
+    '{%s}dateTime.iso8601' % _namespace: lambda text: rpctime(text),
+}
+
+
 def py2xml(*args):
     params = ET.Element("{%s}params" % _namespace)
     for x in args:
-        param = ET.Element("{%s}param" % _namespace)
-        param.append(_py2xml(x))
-        params.append(param) #<params><param>...
-    return params
+        param = ET.SubElement(params, _PARAM)
+        _encode(x, ET.SubElement(param, _VALUE))
+    return params #<params><param>...
 
 def _py2xml(*args):
     for x in args:
-        val = ET.Element("{%s}value" % _namespace)
-        if x is None:
-            nil = ET.Element("{%s}nil" % _namespace)
-            val.append(nil)
-        elif type(x) is int:
-            i4 = ET.Element("{%s}i4" % _namespace)
-            i4.text = str(x)
-            val.append(i4)
-        elif type(x) is bool:
-            boolean = ET.Element("{%s}boolean" % _namespace)
-            boolean.text = str(int(x))
-            val.append(boolean)
-        elif type(x) in (str, unicode):
-            string = ET.Element("{%s}string" % _namespace)
-            string.text = x
-            val.append(string)
-        elif type(x) is float:
-            double = ET.Element("{%s}double" % _namespace)
-            double.text = str(x)
-            val.append(double)
-        elif type(x) is rpcbase64:
-            b64 = ET.Element("{%s}base64" % _namespace)
-            b64.text = x.encoded()
-            val.append(b64)
-        elif type(x) is rpctime:
-            iso = ET.Element("{%s}dateTime.iso8601" % _namespace)
-            iso.text = str(x)
-            val.append(iso)
-        elif type(x) in (list, tuple):
-            array = ET.Element("{%s}array" % _namespace)
-            data = ET.Element("{%s}data" % _namespace)
-            for y in x:
-                data.append(_py2xml(y))
-            array.append(data)
-            val.append(array)
-        elif type(x) is dict:
-            struct = ET.Element("{%s}struct" % _namespace)
-            for y in x.keys():
-                member = ET.Element("{%s}member" % _namespace)
-                name = ET.Element("{%s}name" % _namespace)
-                name.text = y
-                member.append(name)
-                member.append(_py2xml(x[y]))
-                struct.append(member)
-            val.append(struct)
+        val = ET.Element(_VALUE)
+        _encode(x, val)
         return val
 
+def _encode(x, value):
+    """Fill in a <value /> element, without recursing into arrays
+    and structs so that deeply nested data can be encoded."""
+    stack = [(x, value)]
+    while stack:
+        x, value = stack.pop()
+        kind = type(x)
+        scalar = _ENCODERS.get(kind)
+        if scalar is not None:
+            tag, text = scalar
+            if text is None:
+                ET.SubElement(value, tag)
+            else:
+                ET.SubElement(value, tag).text = text(x)
+        elif kind in (list, tuple):
+            data = ET.SubElement(ET.SubElement(value, _ARRAY), _DATA)
+            for y in x:
+                stack.append((y, ET.SubElement(data, _VALUE)))
+        elif kind is dict:
+            struct = ET.SubElement(value, _STRUCT)
+            for key, y in x.items():
+                member = ET.SubElement(struct, _MEMBER)
+                ET.SubElement(member, _NAME).text = key
+                stack.append((y, ET.SubElement(member, _VALUE)))
+
 def xml2py(params):
-    namespace = 'jabber:iq:rpc'
-    vals = []
-    for param in params.findall('{%s}param' % namespace):
-        vals.append(_xml2py(param.find('{%s}value' % namespace)))
-    return vals
+    return [_xml2py(param.find(_VALUE)) for param in params.findall(_PARAM)]
+
+def iterxml2py(params):
+    """Decode the parameters of a call or response one at a time."""
+    for param in params.findall(_PARAM):
+        yield _xml2py(param.find(_VALUE))
+
+def iterarray(value):
+    """Decode the items of an array <value /> one at a time, instead
+    of building a list of the whole array."""
+    data = value.find(_ARRAY).find(_DATA)
+    for val in data.findall(_VALUE):
+        yield _xml2py(val)
 
 def _xml2py(value):
-    namespace = 'jabber:iq:rpc'
-    if value.find('{%s}nil' % namespace) is not None:
-        return None
-    if value.find('{%s}i4' % namespace) is not None:
-        return int(value.find('{%s}i4' % namespace).text)
-    if value.find('{%s}int' % namespace) is not None:
-        return int(value.find('{%s}int' % namespace).text)
-    if value.find('{%s}boolean' % namespace) is not None:
-        return bool(int(value.find('{%s}boolean' % namespace).text))
-    if value.find('{%s}string' % namespace) is not None:
-        return value.find('{%s}string' % namespace).text
-    if value.find('{%s}double' % namespace) is not None:
-        return float(value.find('{%s}double' % namespace).text)
-    if value.find('{%s}base64' % namespace) is not None:
-        return rpcbase64(value.find('{%s}base64' % namespace).text.encode())
-    if value.find('{%s}Base64' % namespace) is not None:
-        # Older versions of XEP-0009 used Base64
-        return rpcbase64(value.find('{%s}Base64' % namespace).text.encode())
-    if value.find('{%s}dateTime.iso8601' % namespace) is not None:
-        return rpctime(value.find('{%s}dateTime.iso8601' % namespace).text)
-    if value.find('{%s}struct' % namespace) is not None:
-        struct = {}
-        for member in value.find('{%s}struct' % namespace).findall('{%s}member' % namespace):
-            struct[member.find('{%s}name' % namespace).text] = _xml2py(member.find('{%s}value' % namespace))
-        return struct
-    if value.find('{%s}array' % namespace) is not None:
-        array = []
-        for val in value.find('{%s}array' % namespace).find('{%s}data' % namespace).findall('{%s}value' % namespace):
-            array.append(_xml2py(val))
-        return array
-    raise ValueError()
+    # Each pending <value /> is decoded into container[key], working
+    # from a stack instead of recursing into arrays and structs.
+    result = [None]
+    stack = [(value, result, 0)]
+    while stack:
+        value, container, key = stack.pop()
+        if not len(value):
+            raise ValueError()
+        elem = value[0]
+        convert = _DECODERS.get(elem.tag)
+        if convert is not None:
+            container[key] = convert(elem.text)
+        elif elem.tag == _STRUCT:
+            struct = container[key] = {}
+            members = elem.findall(_MEMBER)
+            for member in reversed(members):
+                stack.append((member.find(_VALUE), struct,
+                              member.find(_NAME).text))
+        elif elem.tag == _ARRAY:
+            values = elem.find(_DATA).findall(_VALUE)
+            array = container[key] = [None] * len(values)
+            for index in range(len(values) - 1, -1, -1):
+                stack.append((values[index], array, index))
+        else:
+            raise ValueError()
+    return result[0]
 
 
 
@@ -171,3 +180,17 @@ class rpctime(object):
 
     def __str__(self):
         return self.iso8601()
+
+
+#: The tags of scalar values and functions producing their text,
+#: keyed on the exact Python type.
+_ENCODERS = {
+    type(None): ('{%s}nil' % _namespace, None),
+    int: ('{%s}i4' % _namespace, str),
+    bool: ('{%s}boolean' % _namespace, lambda x: str(int(x))),
+    str: ('{%s}string' % _namespace, lambda x: x),
+    unicode: ('{%s}string' % _namespace, lambda x: x),
+    float: ('{%s}double' % _namespace, str),
+    rpcbase64: ('{%s}base64' % _namespace, lambda x: x.encoded()),
+    rpctime: ('{%s}dateTime.iso8601' % _namespace, str),
+}
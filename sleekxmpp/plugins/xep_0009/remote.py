@@ -7,6 +7,7 @@
 """
 
 from sleekxmpp.plugins.xep_0009.binding import py2xml, xml2py, xml2fault, fault2xml
+from sleekxmpp.util import WorkerPool
 from threading import RLock
 import abc
 import inspect
@@ -14,6 +15,7 @@ import logging
 import sleekxmpp
 import sys
 import threading
+import time
 import traceback
 
 log = logging.getLogger(__name__)
@@ -412,7 +414,11 @@ class Proxy(Endpoint):
         self._callback = callback
 
     def __getattribute__(self, name, *args):
-        if name in ('__dict__', '_endpoint', 'async', '_callback'):
+        if name == 'async':
+            # 'async' is a reserved word since Python 3.7, but older
+            # code may still look the method up by that name.
+            name = 'asynchronous'
+        if name in ('__dict__', '_endpoint', 'asynchronous', '_callback'):
             return object.__getattribute__(self, name)
         else:
             attribute = self._endpoint.__getattribute__(name)
@@ -427,7 +433,7 @@ class Proxy(Endpoint):
                     pass   # If the attribute doesn't exist, don't care!
             return attribute
 
-    def async(self, callback):
+    def asynchronous(self, callback):
         return Proxy(self._endpoint, callback)
 
     def get_endpoint(self):
@@ -467,7 +473,8 @@ class RemoteSession(object):
     '''
 
 
-    def __init__(self, client, session_close_callback):
+    def __init__(self, client, session_close_callback, window=8,
+                 max_workers=8, call_timeout=30):
         '''
         Initializes a new RPC session.
 
@@ -475,14 +482,51 @@ class RemoteSession(object):
             client -- The SleekXMPP client associated with this session.
             session_close_callback -- A callback called when the
                 session is closed.
+            window -- The maximum number of calls awaiting a reply
+                from any one remote entity.
+            max_workers -- The number of threads running local
+                handlers for incoming calls.
+            call_timeout -- The time in seconds after which a call
+                without a reply is failed, freeing its place in
+                the window.
         '''
         self._client = client
         self._session_close_callback = session_close_callback
         self._event = threading.Event()
         self._entries = {}
         self._callbacks = {}
+        self._calls = {}
+        self._in_flight = {}
         self._acls = {}
         self._lock = RLock()
+        self._window_cond = threading.Condition(self._lock)
+        self._workers = WorkerPool(max_workers, name='xep_0009')
+        self.window = window
+        self.call_timeout = call_timeout
+        self._expire_task = 'Jabber-RPC Timeouts %s' % id(self)
+
+        #: Counters of calls made, completed and failed, the total
+        #: and largest time in seconds spent waiting for replies,
+        #: and of incoming calls handled and the time spent on them.
+        self.stats = {'calls': 0, 'completed': 0, 'failed': 0,
+                      'timeouts': 0, 'latency': 0.0, 'max_latency': 0.0,
+                      'batches': 0, 'batch_rate': 0.0,
+                      'handled': 0, 'handler_time': 0.0}
+
+    def _bind_events(self):
+        '''
+        Registers the session's handlers for Jabber-RPC events, and
+        the task failing calls which have waited too long for a reply.
+        '''
+        xmpp = self._client.plugin['xep_0009'].xmpp
+        xmpp.add_event_handler('jabber_rpc_method_call', self._on_jabber_rpc_method_call)
+        # Replies free places in the window, so they must not wait
+        # behind an event handler blocked on a full window.
+        xmpp.add_event_handler('jabber_rpc_method_response', self._on_jabber_rpc_method_response, threaded=True)
+        xmpp.add_event_handler('jabber_rpc_method_fault', self._on_jabber_rpc_method_fault, threaded=True)
+        xmpp.add_event_handler('jabber_rpc_error', self._on_jabber_rpc_error, threaded=True)
+        xmpp.schedule(self._expire_task, min(self.call_timeout, 1.0),
+                      self._expire_calls, repeat=True)
 
     def _wait(self):
         self._event.wait()
@@ -520,7 +564,7 @@ class RemoteSession(object):
         with self._lock:
             pid = self._find_key(self._callbacks, callback)
             if pid is not None:
-                del self._callback[pid]
+                self._pop_callback(pid, failed=True)
             else:
                 raise ValueError("Unknown callback!")
         pass
@@ -593,26 +637,188 @@ class RemoteSession(object):
 #        return self._client.is_available(pto)
 
     def _call_remote(self, pto, pmethod, callback, *arguments):
-        iq = self._client.plugin['xep_0009'].make_iq_method_call(pto, pmethod, py2xml(*arguments))
-        pid = iq['id']
         if callback is None:
             future = Future()
-            self._register_callback(pid, future)
-            iq.send()
-            return future.get_value(30)
+            pid = self._send_call(pto, pmethod, future, arguments)
+            try:
+                return future.get_value(self.call_timeout)
+            except TimeoutException:
+                self._pop_callback(pid, timeout=True)
+                raise
         else:
             log.debug("[RemoteSession] _call_remote %s", callback)
-            self._register_callback(pid, callback)
-            iq.send()
+            self._send_call(pto, pmethod, callback, arguments)
+
+    def call_async(self, pto, pmethod, *arguments):
+        '''
+        Calls a remote method without waiting for the reply. This
+        blocks only while the window of calls awaiting a reply from
+        the remote entity is full.
+
+        Arguments:
+            pto -- The JID of the remote entity.
+            pmethod -- The full method name, '<fqn>.<method>'.
+            *arguments -- The method arguments.
+
+        Returns a Future holding the result.
+        '''
+        future = Future()
+        self._send_call(pto, pmethod, future, arguments)
+        return future
+
+    def multi_call(self, pto, calls, timeout=None):
+        '''
+        Makes a batch of remote calls, keeping up to a window of
+        them in flight at once, and waits for all of their results.
+
+        Arguments:
+            pto -- The JID of the remote entity.
+            calls -- A list of (method name, argument tuple) pairs.
+            timeout -- The time in seconds to wait for the whole
+                batch. Defaults to the session's call timeout.
+
+        Returns a list of results in the order of the calls. A call
+        which failed has the exception in place of its result.
+        '''
+        if timeout is None:
+            timeout = self.call_timeout
+        start = time.time()
+        futures = []
+        for pmethod, arguments in calls:
+            future = Future()
+            pid = self._send_call(pto, pmethod, future, arguments)
+            futures.append((pid, future))
+        results = []
+        for pid, future in futures:
+            try:
+                remaining = max(0, start + timeout - time.time())
+                results.append(future.get_value(remaining))
+            except TimeoutException as e:
+                self._pop_callback(pid, timeout=True)
+                results.append(e)
+            except RemoteException as e:
+                results.append(e)
+        elapsed = time.time() - start
+        with self._lock:
+            self.stats['batches'] += 1
+            if elapsed > 0:
+                self.stats['batch_rate'] = len(calls) / elapsed
+        log.debug("Jabber-RPC batch of %s calls to %s took %.3fs",
+                  len(calls), pto, elapsed)
+        return results
+
+    def _send_call(self, pto, pmethod, callback, arguments):
+        key = str(pto)
+        self._acquire_slot(key)
+        try:
+            iq = self._client.plugin['xep_0009'].make_iq_method_call(pto, pmethod, py2xml(*arguments))
+        except:
+            self._release_slot(key)
+            raise
+        pid = iq['id']
+        with self._lock:
+            self._callbacks[pid] = callback
+            self._calls[pid] = (key, time.time())
+            self.stats['calls'] += 1
+        try:
+            iq.send(block=False)
+        except:
+            # Frees the call's place in the window.
+            self._pop_callback(pid, failed=True)
+            raise
+        return pid
+
+    def _acquire_slot(self, key):
+        '''
+        Waits for room in the window of calls to a remote entity.
+        '''
+        with self._window_cond:
+            while self._in_flight.get(key, 0) >= self.window:
+                self._window_cond.wait()
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def _release_slot(self, key):
+        with self._window_cond:
+            self._in_flight[key] -= 1
+            if not self._in_flight[key]:
+                del self._in_flight[key]
+            self._window_cond.notify()
+
+    def _expire_calls(self):
+        '''
+        Fails calls which have waited too long for a reply. Runs as
+        a scheduled task.
+        '''
+        now = time.time()
+        with self._lock:
+            expired = [pid for pid, (key, start) in self._calls.items()
+                       if now - start > self.call_timeout]
+        for pid in expired:
+            callback = self._pop_callback(pid, timeout=True)
+            if callback is not None:
+                self._complete(callback, error=TimeoutException())
+
+    def _pop_callback(self, pid, failed=False, timeout=False):
+        '''
+        Removes the callback for a call which has been answered or
+        abandoned, freeing its place in the window.
+        '''
+        with self._lock:
+            callback = self._callbacks.pop(pid, None)
+            call = self._calls.pop(pid, None)
+            if call is None:
+                return callback
+            key, start = call
+            if timeout:
+                self.stats['timeouts'] += 1
+            elif failed:
+                self.stats['failed'] += 1
+            else:
+                self.stats['completed'] += 1
+            latency = time.time() - start
+            self.stats['latency'] += latency
+            self.stats['max_latency'] = max(self.stats['max_latency'],
+                                            latency)
+            self._release_slot(key)
+        return callback
+
+    def _complete(self, callback, value=None, error=None):
+        '''
+        Passes the outcome of a call to its callback. Futures are set
+        directly, while other callbacks run in the worker pool so that
+        they can not hold up the event thread.
+        '''
+        if error is not None:
+            method, arg = callback.cancel_with_error, error
+        else:
+            method, arg = callback.set_value, value
+        if isinstance(callback, Future):
+            method(arg)
+        else:
+            self._workers.submit(method, arg)
 
     def close(self, wait=False):
         '''
         Closes this session.
         '''
         self._client.disconnect(wait=wait)
+        self._client.plugin['xep_0009'].xmpp.scheduler.remove(self._expire_task)
+        self._workers.shutdown()
         self._session_close_callback()
 
     def _on_jabber_rpc_method_call(self, iq):
+        self._workers.submit(self._handle_method_call, iq)
+
+    def _handle_method_call(self, iq):
+        start = time.time()
+        try:
+            self._invoke(iq)
+        finally:
+            with self._lock:
+                self.stats['handled'] += 1
+                self.stats['handler_time'] += time.time() - start
+
+    def _invoke(self, iq):
         iq.enable('rpc_query')
         params = iq['rpc_query']['method_call']['params']
         args = xml2py(params)
@@ -653,14 +859,13 @@ class RemoteSession(object):
         iq.enable('rpc_query')
         args = xml2py(iq['rpc_query']['method_response']['params'])
         pid = iq['id']
-        with self._lock:
-            callback = self._callbacks[pid]
-            del self._callbacks[pid]
+        callback = self._pop_callback(pid)
+        if callback is None:
+            return
         if(len(args) > 0):
-            callback.set_value(args[0])
+            self._complete(callback, args[0])
         else:
-            callback.set_value(None)
-        pass
+            self._complete(callback, None)
 
     def _on_jabber_rpc_method_response2(self, iq):
         iq.enable('rpc_query')
@@ -669,26 +874,25 @@ class RemoteSession(object):
         else:
             args = xml2py(iq['rpc_query']['method_response']['params'])
             pid = iq['id']
-            with self._lock:
-                callback = self._callbacks[pid]
-                del self._callbacks[pid]
+            callback = self._pop_callback(pid)
+            if callback is None:
+                return
             if(len(args) > 0):
-                callback.set_value(args[0])
+                self._complete(callback, args[0])
             else:
-                callback.set_value(None)
-            pass
+                self._complete(callback, None)
 
     def _on_jabber_rpc_method_fault(self, iq):
         iq.enable('rpc_query')
         fault = xml2fault(iq['rpc_query']['method_response']['fault'])
         pid = iq['id']
-        with self._lock:
-            callback = self._callbacks[pid]
-            del self._callbacks[pid]
+        callback = self._pop_callback(pid, failed=True)
+        if callback is None:
+            return
         e = {
              500: InvocationException
         }[fault['code']](fault['string'])
-        callback.cancel_with_error(e)
+        self._complete(callback, error=e)
 
     def _on_jabber_rpc_error(self, iq):
         pid = iq['id']
@@ -697,9 +901,9 @@ class RemoteSession(object):
         type = iq['error']['type']
         condition = iq['error']['condition']
         #! print("['REMOTE.PY']._BINDING_handle_remote_procedure_error -> ERROR! ERROR! ERROR! Condition is '%s'" % condition)
-        with self._lock:
-            callback = self._callbacks[pid]
-            del self._callbacks[pid]
+        callback = self._pop_callback(pid, failed=True)
+        if callback is None:
+            return
         e = {
             'item-not-found': RemoteException("No remote handler available for %s at %s!" % (pmethod, iq['from'])),
             'forbidden': AuthorizationException("Forbidden to invoke remote handler for %s at %s!" % (pmethod, iq['from'])),
@@ -707,7 +911,7 @@ class RemoteSession(object):
         }[condition]
         if e is None:
             RemoteException("An unexpected exception occurred at %s!" % iq['from'])
-        callback.cancel_with_error(e)
+        self._complete(callback, error=e)
 
 
 class Remote(object):
@@ -739,10 +943,7 @@ class Remote(object):
             with Remote._lock:
                 del cls._sessions[client.boundjid.bare]
         result = RemoteSession(client, _session_close_callback)
-        client.plugin['xep_0009'].xmpp.add_event_handler('jabber_rpc_method_call', result._on_jabber_rpc_method_call, threaded=True)
-        client.plugin['xep_0009'].xmpp.add_event_handler('jabber_rpc_method_response', result._on_jabber_rpc_method_response, threaded=True)
-        client.plugin['xep_0009'].xmpp.add_event_handler('jabber_rpc_method_fault', result._on_jabber_rpc_method_fault, threaded=True)
-        client.plugin['xep_0009'].xmpp.add_event_handler('jabber_rpc_error', result._on_jabber_rpc_error, threaded=True)
+        result._bind_events()
         if callback is None:
             start_event_handler = result._notify
         else:
@@ -109,6 +109,203 @@ class MUCPresence(ElementBase):
         return self
 
 
+class Occupant(object):
+
+    """
+    The last known presence fields of a room occupant.
+
+    Fields may be read and written like the keys of a dictionary,
+    such as ``occupant['jid']`` or ``occupant['role']``. Changing an
+    indexed field of an occupant stored in :class:`Occupants` also
+    updates the room's indexes.
+    """
+
+    _fields = ('room', 'nick', 'jid', 'role', 'affiliation',
+               'show', 'status', 'alt_nick')
+    _indexed = ('jid', 'role', 'affiliation')
+    __slots__ = _fields + ('_owner',)
+
+    def __init__(self, room, nick, jid=None, role='', affiliation='',
+                 show='', status='', alt_nick=''):
+        self._owner = None
+        self.room = room
+        self.nick = nick
+        self.jid = jid if jid is not None else JID('')
+        self.role = role
+        self.affiliation = affiliation
+        self.show = show
+        self.status = status
+        self.alt_nick = alt_nick
+
+    @classmethod
+    def from_presence(cls, pr):
+        muc = pr['muc']
+        return cls(muc['room'], muc['nick'],
+                   jid=muc['jid'],
+                   role=muc['role'],
+                   affiliation=muc['affiliation'],
+                   show=pr['show'],
+                   status=pr['status'],
+                   alt_nick=pr['nick'])
+
+    def __setattr__(self, key, value):
+        owner = getattr(self, '_owner', None)
+        if owner is not None and key in self._indexed:
+            occupants, nick = owner
+            occupants._reindex(nick, self, key, value)
+        else:
+            object.__setattr__(self, key, value)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def get(self, key, default=None):
+        if key not in self._fields:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return list(self._fields)
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self._fields]
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class Occupants(dict):
+
+    """
+    The occupants of a room, keyed by nick.
+
+    Occupants are also indexed by their real JID (when the room
+    discloses it), role, and affiliation, so that lookups do not
+    need to scan the whole room.
+    """
+
+    def __init__(self):
+        dict.__init__(self)
+        self._jids = {}
+        self._bare_jids = {}
+        self._roles = {}
+        self._affiliations = {}
+
+    def __setitem__(self, nick, occupant):
+        if nick in self:
+            self._remove(nick)
+        dict.__setitem__(self, nick, occupant)
+        self._index(nick, occupant)
+        if isinstance(occupant, Occupant):
+            object.__setattr__(occupant, '_owner', (self, nick))
+
+    def __delitem__(self, nick):
+        self._remove(nick)
+        dict.__delitem__(self, nick)
+
+    def pop(self, nick, *args):
+        if nick in self:
+            self._remove(nick)
+        return dict.pop(self, nick, *args)
+
+    def popitem(self):
+        nick, occupant = dict.popitem(self)
+        self._unindex(nick, occupant)
+        self._release(occupant)
+        return nick, occupant
+
+    def setdefault(self, nick, occupant=None):
+        if nick not in self:
+            self[nick] = occupant
+        return dict.__getitem__(self, nick)
+
+    def update(self, *args, **kwargs):
+        for nick, occupant in dict(*args, **kwargs).items():
+            self[nick] = occupant
+
+    def clear(self):
+        for occupant in self.values():
+            self._release(occupant)
+        dict.clear(self)
+        self._jids.clear()
+        self._bare_jids.clear()
+        self._roles.clear()
+        self._affiliations.clear()
+
+    def by_jid(self, jid):
+        """Return the nick used by a real full JID, or ``None``."""
+        return self._jids.get(str(jid))
+
+    def by_bare_jid(self, jid):
+        """Return the set of nicks used by a real bare JID."""
+        return set(self._bare_jids.get(JID(jid).bare, ()))
+
+    def by_role(self, role):
+        """Return the set of nicks with the given role."""
+        return set(self._roles.get(role, ()))
+
+    def by_affiliation(self, affiliation):
+        """Return the set of nicks with the given affiliation."""
+        return set(self._affiliations.get(affiliation, ()))
+
+    def _remove(self, nick):
+        occupant = dict.__getitem__(self, nick)
+        self._unindex(nick, occupant)
+        self._release(occupant)
+
+    def _release(self, occupant):
+        owner = getattr(occupant, '_owner', None)
+        if owner is not None and owner[0] is self:
+            object.__setattr__(occupant, '_owner', None)
+
+    def _reindex(self, nick, occupant, key, value):
+        """Change an indexed field of an occupant stored as nick."""
+        self._unindex(nick, occupant)
+        object.__setattr__(occupant, key, value)
+        self._index(nick, occupant)
+
+    def _index(self, nick, occupant):
+        jid = occupant['jid']
+        if jid:
+            jid = JID(jid)
+            self._jids[jid.full] = nick
+            self._bare_jids.setdefault(jid.bare, set()).add(nick)
+        self._roles.setdefault(occupant['role'], set()).add(nick)
+        self._affiliations.setdefault(occupant['affiliation'],
+                                      set()).add(nick)
+
+    def _unindex(self, nick, occupant):
+        jid = occupant['jid']
+        if jid:
+            jid = JID(jid)
+            if self._jids.get(jid.full) == nick:
+                del self._jids[jid.full]
+            self._discard(self._bare_jids, jid.bare, nick)
+        self._discard(self._roles, occupant['role'], nick)
+        self._discard(self._affiliations, occupant['affiliation'], nick)
+
+    @staticmethod
+    def _discard(index, key, nick):
+        nicks = index.get(key)
+        if nicks is not None:
+            nicks.discard(nick)
+            if not nicks:
+                del index[key]
+
+
 class XEP_0045(BasePlugin):
 
     """
@@ -118,10 +315,22 @@ class XEP_0045(BasePlugin):
     name = 'xep_0045'
     description = 'XEP-0045: Multi-User Chat'
     dependencies = set(['xep_0030', 'xep_0004'])
+    default_config = {
+        #: If ``True``, the presences received while joining a room
+        #: do not raise per-occupant events; the occupants are instead
+        #: reported together by the ``muc::<room>::roster_loaded``
+        #: event once the join completes.
+        'batch_join': False
+    }
+
+    #: Matches the status code marking our own presence in a room.
+    _self_presence = '{%(ns)s}x/{%(ns)s}status[@code="110"]' % {
+            'ns': 'http://jabber.org/protocol/muc#user'}
 
     def plugin_init(self):
         self.rooms = {}
         self.ourNicks = {}
+        self.joining = set()
         self.xep = '0045'
         # load MUC support in presence stanzas
         register_stanza_plugin(Presence, MUCPresence)
@@ -152,30 +361,39 @@ class XEP_0045(BasePlugin):
         """
         got_offline = False
         got_online = False
-        if pr['muc']['room'] not in self.rooms.keys():
+        room = pr['muc']['room']
+        if room not in self.rooms:
             return
-        entry = pr['muc'].getStanzaValues()
-        entry['show'] = pr['show']
-        entry['status'] = pr['status']
-        entry['alt_nick'] = pr['nick']
+        occupants = self.rooms[room]
+        entry = Occupant.from_presence(pr)
+        nick = entry.nick
+        is_self = nick == self.ourNicks.get(room) or \
+                  pr.xml.find(self._self_presence) is not None
         if pr['type'] == 'unavailable':
-            if entry['nick'] in self.rooms[entry['room']]:
-                del self.rooms[entry['room']][entry['nick']]
-            if '{}/{}'.format(entry['room'], entry['nick']) == self.getOurJidInRoom(entry['room']):
-                log.debug("I got kicked :( from %s" % entry['room'])
-                del self.rooms[entry['room']]
+            occupants.pop(nick, None)
+            if nick == self.ourNicks.get(room):
+                log.debug("I got kicked :( from %s" % room)
+                del self.rooms[room]
+                self.joining.discard(room)
             got_offline = True
         else:
-            if entry['nick'] not in self.rooms[entry['room']]:
+            if nick not in occupants:
                 got_online = True
-            self.rooms[entry['room']][entry['nick']] = entry
-        log.debug("MUC presence from %s/%s : %s", entry['room'],entry['nick'], entry)
-        self.xmpp.event("groupchat_presence", pr)
-        self.xmpp.event("muc::%s::presence" % entry['room'], pr)
-        if got_offline:
-            self.xmpp.event("muc::%s::got_offline" % entry['room'], pr)
-        if got_online:
-            self.xmpp.event("muc::%s::got_online" % entry['room'], pr)
+            occupants[nick] = entry
+        log.debug("MUC presence from %s/%s : %s", room, nick, entry)
+
+        joining = room in self.joining
+        if joining and is_self:
+            self.joining.discard(room)
+        if not (joining and self.batch_join and not is_self):
+            self.xmpp.event("groupchat_presence", pr)
+            self.xmpp.event("muc::%s::presence" % room, pr)
+            if got_offline:
+                self.xmpp.event("muc::%s::got_offline" % room, pr)
+            if got_online:
+                self.xmpp.event("muc::%s::got_online" % room, pr)
+        if joining and is_self and room in self.rooms:
+            self.xmpp.event("muc::%s::roster_loaded" % room, occupants)
 
     def handle_groupchat_message(self, msg):
         """ Handle a message event in a muc.
@@ -198,17 +416,10 @@ class XEP_0045(BasePlugin):
         self.xmpp.event('groupchat_subject', msg)
 
     def jidInRoom(self, room, jid):
-        for nick in self.rooms[room]:
-            entry = self.rooms[room][nick]
-            if entry is not None and entry['jid'].full == jid:
-                return True
-        return False
+        return self.rooms[room].by_jid(jid) is not None
 
     def getNick(self, room, jid):
-        for nick in self.rooms[room]:
-            entry = self.rooms[room][nick]
-            if entry is not None and entry['jid'].full == jid:
-                return nick
+        return self.rooms[room].by_jid(jid)
 
     def configureRoom(self, room, form=None, ifrom=None):
         if form is None:
@@ -253,8 +464,9 @@ class XEP_0045(BasePlugin):
             #wait for our own room presence back
             expect = ET.Element("{%s}presence" % self.xmpp.default_ns, {'from':"%s/%s" % (room, nick)})
             self.xmpp.send(stanza, expect)
-        self.rooms[room] = {}
+        self.rooms[room] = Occupants()
         self.ourNicks[room] = nick
+        self.joining.add(room)
 
     def destroy(self, room, reason='', altroom = '', ifrom=None):
         iq = self.xmpp.makeIqSet()
@@ -341,6 +553,7 @@ class XEP_0045(BasePlugin):
         else:
             self.xmpp.sendPresence(pshow='unavailable', pto="%s/%s" % (room, nick), pfrom=pfrom)
         del self.rooms[room]
+        self.joining.discard(room)
 
     def getRoomConfig(self, room, ifrom=''):
         iq = self.xmpp.makeIqGet('http://jabber.org/protocol/muc#owner')
@@ -396,10 +609,25 @@ class XEP_0045(BasePlugin):
     def getRoster(self, room):
         """ Get the list of nicks in a room.
         """
-        if room not in self.rooms.keys():
+        if room not in self.rooms:
             return None
         return self.rooms[room].keys()
 
+    def getUsersByRole(self, room, role):
+        """ Get the set of nicks in a room with the given role.
+        """
+        if room not in self.rooms:
+            return None
+        return self.rooms[room].by_role(role)
+
+    def getNicksByAffiliation(self, room, affiliation):
+        """ Get the set of nicks in a room with the given affiliation,
+            as known from the occupants' presence.
+        """
+        if room not in self.rooms:
+            return None
+        return self.rooms[room].by_affiliation(affiliation)
+
     def getUsersByAffiliation(cls, room, affiliation='member', ifrom=None):
         if affiliation not in ('outcast', 'member', 'admin', 'owner', 'none'):
             raise TypeError
@@ -10,7 +10,7 @@ from sleekxmpp.plugins.base import register_plugin
 
 from sleekxmpp.plugins.xep_0047 import stanza
 from sleekxmpp.plugins.xep_0047.stanza import Open, Close, Data
-from sleekxmpp.plugins.xep_0047.stream import IBBytestream
+from sleekxmpp.plugins.xep_0047.stream import IBBytestream, IBBFile
 from sleekxmpp.plugins.xep_0047.ibb import XEP_0047
 
 
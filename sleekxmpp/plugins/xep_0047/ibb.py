@@ -24,6 +24,7 @@ class XEP_0047(BasePlugin):
         'block_size': 4096,
         'max_block_size': 8192,
         'window_size': 1,
+        'max_window_size': None,
         'auto_accept': False,
     }
 
@@ -115,12 +116,17 @@ class XEP_0047(BasePlugin):
         with self._preauthed_sids_lock:
             self._preauthed_sids[(jid, sid, ifrom)] = True
 
-    def open_stream(self, jid, block_size=None, sid=None, window=1, use_messages=False,
-                    ifrom=None, block=True, timeout=None, callback=None):
+    def open_stream(self, jid, block_size=None, sid=None, window=None, use_messages=False,
+                    ifrom=None, block=True, timeout=None, callback=None,
+                    max_window=None):
         if sid is None:
             sid = str(uuid.uuid4())
         if block_size is None:
             block_size = self.block_size
+        if window is None:
+            window = self.window_size
+        if max_window is None:
+            max_window = self.max_window_size
 
         iq = self.xmpp.Iq()
         iq['type'] = 'set'
@@ -132,7 +138,7 @@ class XEP_0047(BasePlugin):
 
         stream = IBBytestream(self.xmpp, sid, block_size,
                               iq['from'], iq['to'], window,
-                              use_messages)
+                              use_messages, max_window)
 
         with self._stream_lock:
             self._pending_streams[iq['id']] = stream
@@ -188,7 +194,8 @@ class XEP_0047(BasePlugin):
 
         stream = IBBytestream(self.xmpp, sid, size,
                               iq['to'], iq['from'],
-                              self.window_size)
+                              self.window_size,
+                              max_window_size=self.max_window_size)
         stream.stream_started.set()
         self.api['set_stream'](stream.self_jid, stream.sid, stream.peer_jid, stream)
         iq.reply()
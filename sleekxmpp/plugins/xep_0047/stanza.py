@@ -10,7 +10,11 @@ VALID_B64 = re.compile(r'[A-Za-z0-9\+\/]*=*')
 
 
 def to_b64(data):
-    return bytes(base64.b64encode(bytes(data))).decode('utf-8')
+    # Buffers are encoded directly, so that slices of a memoryview
+    # do not need to be copied first.
+    if not isinstance(data, (bytearray, memoryview)):
+        data = bytes(data)
+    return bytes(base64.b64encode(data)).decode('utf-8')
 
 
 def from_b64(data):
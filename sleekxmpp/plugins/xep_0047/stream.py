@@ -1,9 +1,10 @@
+import io
+import time
 import socket
 import threading
 import logging
 
 from sleekxmpp.stanza import Iq
-from sleekxmpp.util import Queue
 from sleekxmpp.exceptions import XMPPError
 
 
@@ -12,11 +13,31 @@ log = logging.getLogger(__name__)
 
 class IBBytestream(object):
 
-    def __init__(self, xmpp, sid, block_size, jid, peer, window_size=1, use_messages=False):
+    """
+    An in-band bytestream which may be used like a socket.
+
+    Outgoing data is split into blocks of ``block_size`` bytes, with up
+    to ``window_size`` blocks awaiting acknowledgement at once. When
+    ``max_window_size`` is larger than ``window_size``, the window grows
+    by one block each time a full window is acked without a rise in
+    round trip time, and is halved (at most once per round trip) when
+    the round trip time doubles, which indicates that blocks are
+    queueing up on the way to the peer.
+
+    Incoming blocks are reassembled into a single buffer which can be
+    consumed with :meth:`recv`, :meth:`read`, or the file-like object
+    returned by :meth:`as_file`. Like a socket's, :meth:`makefile`
+    returns the stream itself.
+    """
+
+    def __init__(self, xmpp, sid, block_size, jid, peer, window_size=1,
+                 use_messages=False, max_window_size=None):
         self.xmpp = xmpp
         self.sid = sid
         self.block_size = block_size
         self.window_size = window_size
+        self.max_window_size = max(window_size, max_window_size or 0)
+        self._adaptive = self.max_window_size > window_size
         self.use_messages = use_messages
 
         if jid is None:
@@ -34,58 +55,140 @@ class IBBytestream(object):
         self.stream_in_closed = threading.Event()
         self.stream_out_closed = threading.Event()
 
-        self.recv_queue = Queue()
+        self.recv_buffer = bytearray()
+        self._recv_cond = threading.Condition()
 
-        self.send_window = threading.BoundedSemaphore(value=self.window_size)
+        self.send_window = threading.Condition()
         self.window_ids = set()
         self.window_empty = threading.Event()
         self.window_empty.set()
 
+        self._sent_at = {}
+        self._window_acked = 0
+        self._last_decrease = 0
+
+        #: The lowest and most recent ack round trip times, in seconds.
+        self.min_rtt = None
+        self.rtt = None
+
+        #: The number of payload bytes sent and received.
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
     def send(self, data):
         if not self.stream_started.is_set() or \
                self.stream_out_closed.is_set():
             raise socket.error
         data = data[0:self.block_size]
-        self.send_window.acquire()
+
+        if not self.use_messages:
+            with self.send_window:
+                while len(self.window_ids) >= self.window_size and \
+                      not self.stream_out_closed.is_set():
+                    self.send_window.wait()
+                if self.stream_out_closed.is_set():
+                    raise socket.error
+                iq = self.xmpp.Iq(stype='set',
+                                  sto=self.peer_jid,
+                                  sfrom=self.self_jid)
+                iq.lane = 'bulk'
+                self.window_empty.clear()
+                self.window_ids.add(iq['id'])
+                self._sent_at[iq['id']] = time.time()
+
         with self._send_seq_lock:
             self.send_seq = (self.send_seq + 1) % 65535
             seq = self.send_seq
+
         if self.use_messages:
             msg = self.xmpp.Message()
+            msg.lane = 'bulk'
             msg['to'] = self.peer_jid
             msg['from'] = self.self_jid
             msg['id'] = self.xmpp.new_id()
             msg['ibb_data']['sid'] = self.sid
             msg['ibb_data']['seq'] = seq
             msg['ibb_data']['data'] = data
-            msg.send()
-            self.send_window.release()
+            try:
+                sent = msg.send()
+            except:
+                self._abort_send()
+                raise
         else:
-            iq = self.xmpp.Iq()
-            iq['type'] = 'set'
-            iq['to'] = self.peer_jid
-            iq['from'] = self.self_jid
             iq['ibb_data']['sid'] = self.sid
             iq['ibb_data']['seq'] = seq
             iq['ibb_data']['data'] = data
-            self.window_empty.clear()
-            self.window_ids.add(iq['id'])
-            iq.send(block=False, callback=self._recv_ack)
+            try:
+                sent = iq.send(block=False, callback=self._recv_ack)
+            except:
+                self._abort_send(iq['id'])
+                raise
+        if sent is False:
+            self._abort_send(None if self.use_messages else iq['id'])
+            raise socket.error('IBB block dropped by the rate limits')
+        self.bytes_sent += len(data)
         return len(data)
 
+    def _abort_send(self, block_id=None):
+        """
+        Forget a block which could not be sent, and close the stream,
+        since the peer would otherwise see a gap in the sequence.
+        """
+        with self.send_window:
+            if block_id is not None:
+                self.window_ids.discard(block_id)
+                self._sent_at.pop(block_id, None)
+            if not self.window_ids:
+                self.window_empty.set()
+            self.send_window.notify_all()
+        log.debug('IBB stream %s failed to send a block', self.sid)
+        self.close()
+
     def sendall(self, data):
+        if not isinstance(data, memoryview):
+            if not isinstance(data, (bytes, bytearray)):
+                data = data.encode('utf-8')
+            data = memoryview(data)
         sent_len = 0
         while sent_len < len(data):
             sent_len += self.send(data[sent_len:])
 
     def _recv_ack(self, iq):
-        self.window_ids.remove(iq['id'])
-        if not self.window_ids:
-            self.window_empty.set()
-        self.send_window.release()
+        with self.send_window:
+            self.window_ids.discard(iq['id'])
+            sent_at = self._sent_at.pop(iq['id'], None)
+            if sent_at is not None:
+                self._adjust_window(time.time() - sent_at)
+            if not self.window_ids:
+                self.window_empty.set()
+            self.send_window.notify_all()
         if iq['type'] == 'error':
             self.close()
 
+    def _adjust_window(self, rtt):
+        """Grow or shrink the send window based on an ack's round trip time.
+
+        Must be called while holding the send window lock.
+        """
+        self.rtt = rtt
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+        if not self._adaptive:
+            return
+
+        now = time.time()
+        if rtt > 2 * self.min_rtt:
+            self._window_acked = 0
+            if self.window_size > 1 and now - self._last_decrease > rtt:
+                self.window_size = max(1, self.window_size // 2)
+                self._last_decrease = now
+        else:
+            self._window_acked += 1
+            if self._window_acked >= self.window_size and \
+               self.window_size < self.max_window_size:
+                self.window_size += 1
+                self._window_acked = 0
+
     def _recv_data(self, stanza):
         with self._recv_seq_lock:
             new_seq = stanza['ibb_data']['seq']
@@ -99,26 +202,57 @@ class IBBytestream(object):
             self.close()
             raise XMPPError('not-acceptable')
 
-        self.recv_queue.put(data)
-        self.xmpp.event('ibb_stream_data', {'stream': self, 'data': data})
+        with self._recv_cond:
+            self.recv_buffer.extend(data)
+            self.bytes_received += len(data)
+            self._recv_cond.notify_all()
+
+        if self.xmpp.event_handled('ibb_stream_data'):
+            self.xmpp.event('ibb_stream_data', {'stream': self, 'data': data})
 
         if isinstance(stanza, Iq):
             stanza.reply()
             stanza.send()
 
-    def recv(self, *args, **kwargs):
-        return self.read(block=True)
+    def recv(self, size=None, *args, **kwargs):
+        return self.read(block=True, size=size)
 
-    def read(self, block=True, timeout=None, **kwargs):
-        if not self.stream_started.is_set() or \
-               self.stream_in_closed.is_set():
+    def read(self, block=True, timeout=None, size=None, **kwargs):
+        """
+        Return received data, up to ``size`` bytes if given.
+
+        Returns ``None`` if no data is available before the timeout
+        expires, or immediately if ``block`` is ``False``.
+        """
+        if not self.stream_started.is_set():
             raise socket.error
         if timeout is not None:
             block = True
-        try:
-            return self.recv_queue.get(block, timeout)
-        except:
-            return None
+        with self._recv_cond:
+            if not self.recv_buffer and block and \
+               not self.stream_in_closed.is_set():
+                self._recv_cond.wait(timeout)
+            if not self.recv_buffer:
+                if self.stream_in_closed.is_set():
+                    raise socket.error
+                return None
+            if size is None or size >= len(self.recv_buffer):
+                data = bytes(self.recv_buffer)
+                del self.recv_buffer[:]
+            else:
+                data = bytes(self.recv_buffer[:size])
+                del self.recv_buffer[:size]
+            return data
+
+    def _set_in_closed(self):
+        with self._recv_cond:
+            self.stream_in_closed.set()
+            self._recv_cond.notify_all()
+
+    def _set_out_closed(self):
+        with self.send_window:
+            self.stream_out_closed.set()
+            self.send_window.notify_all()
 
     def close(self):
         iq = self.xmpp.Iq()
@@ -126,14 +260,14 @@ class IBBytestream(object):
         iq['to'] = self.peer_jid
         iq['from'] = self.self_jid
         iq['ibb_close']['sid'] = self.sid
-        self.stream_out_closed.set()
+        self._set_out_closed()
         iq.send(block=False,
-                callback=lambda x: self.stream_in_closed.set())
+                callback=lambda x: self._set_in_closed())
         self.xmpp.event('ibb_stream_end', self)
 
     def _closed(self, iq):
-        self.stream_in_closed.set()
-        self.stream_out_closed.set()
+        self._set_in_closed()
+        self._set_out_closed()
         iq.reply()
         iq.send()
         self.xmpp.event('ibb_stream_end', self)
@@ -141,8 +275,47 @@ class IBBytestream(object):
     def makefile(self, *args, **kwargs):
         return self
 
+    def as_file(self):
+        """Return a file-like object reading from and writing to the stream."""
+        return IBBFile(self)
+
     def connect(*args, **kwargs):
         return None
 
     def shutdown(self, *args, **kwargs):
         return None
+
+
+class IBBFile(io.RawIOBase):
+
+    """
+    A file-like wrapper around an :class:`IBBytestream`.
+
+    Reads block until data arrives, and return an empty result
+    once the stream has been closed and all data consumed.
+    """
+
+    def __init__(self, stream):
+        io.RawIOBase.__init__(self)
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def readinto(self, b):
+        stream = self.stream
+        with stream._recv_cond:
+            while not stream.recv_buffer and \
+                  not stream.stream_in_closed.is_set():
+                stream._recv_cond.wait()
+            size = min(len(b), len(stream.recv_buffer))
+            b[:size] = stream.recv_buffer[:size]
+            del stream.recv_buffer[:size]
+        return size
+
+    def write(self, b):
+        self.stream.sendall(b)
+        return len(b)
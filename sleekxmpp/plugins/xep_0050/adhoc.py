@@ -17,6 +17,7 @@ from sleekxmpp.xmlstream import register_stanza_plugin, JID
 from sleekxmpp.plugins import BasePlugin
 from sleekxmpp.plugins.xep_0050 import stanza
 from sleekxmpp.plugins.xep_0050 import Command
+from sleekxmpp.plugins.xep_0050.sessions import SessionStore
 from sleekxmpp.plugins.xep_0004 import Form
 
 
@@ -38,8 +39,16 @@ class XEP_0050(BasePlugin):
     Also see <http://xmpp.org/extensions/xep-0050.html>
 
     Configuration Values:
-        threaded -- Indicates if command events should be threaded.
-                    Defaults to True.
+        threaded        -- Indicates if command events should be threaded.
+                           Defaults to True.
+        session_db      -- A session storage backend to use instead of
+                           a SessionStore kept in memory.
+        session_ttl     -- The seconds an abandoned session is kept.
+                           Defaults to 600.
+        max_sessions    -- The number of sessions kept before the oldest
+                           are discarded. Defaults to 10000.
+        expiry_interval -- The seconds between removing expired
+                           sessions. Defaults to 60.
 
     Events:
         command_execute  -- Received a command with action="execute"
@@ -52,7 +61,7 @@ class XEP_0050(BasePlugin):
                     Defaults to True.
         commands -- A dictionary mapping JID/node pairs to command
                     names and handlers.
-        sessions -- A dictionary or equivalent backend mapping
+        sessions -- A SessionStore or equivalent backend mapping
                     session IDs to dictionaries containing data
                     relevant to a command's session.
 
@@ -84,14 +93,23 @@ class XEP_0050(BasePlugin):
     stanza = stanza
     default_config = {
         'threaded': True,
-        'session_db': None
+        'session_db': None,
+        'session_ttl': 600,
+        'max_sessions': 10000,
+        'expiry_interval': 60
     }
 
     def plugin_init(self):
         """Start the XEP-0050 plugin."""
         self.sessions = self.session_db
         if self.sessions is None:
-            self.sessions = {}
+            self.sessions = SessionStore(ttl=self.session_ttl,
+                                         max_sessions=self.max_sessions)
+
+        self.xmpp.schedule('Ad-Hoc Session Expiry',
+                           self.expiry_interval,
+                           self._expire_sessions,
+                           repeat=True)
 
         self.commands = {}
 
@@ -117,6 +135,7 @@ class XEP_0050(BasePlugin):
                                     threaded=self.threaded)
 
     def plugin_end(self):
+        self.xmpp.scheduler.remove('Ad-Hoc Session Expiry')
         self.xmpp.del_event_handler('command_execute',
                                     self._handle_command_start)
         self.xmpp.del_event_handler('command_next',
@@ -139,24 +158,40 @@ class XEP_0050(BasePlugin):
         a generic, external data storage mechanism.
 
         The replacement backend must be able to interact through
-        the same syntax and interfaces as a normal dictionary.
+        the same syntax and interfaces as a normal dictionary. To
+        keep expiring sessions and storing them compactly, pass a
+        SessionStore wrapping the backend, such as:
+
+            SessionStore(SQLiteBackend('sessions.db'), ttl=600)
 
         Arguments:
             db -- The new session storage mechanism.
         """
         self.sessions = db
 
+    def _expire_sessions(self):
+        """Remove expired sessions, if the backend supports it."""
+        expire = getattr(self.sessions, 'expire', None)
+        if expire is not None:
+            expire()
+
     def prep_handlers(self, handlers, **kwargs):
         """
         Prepare a list of functions for use by the backend service.
 
-        Intended to be replaced by the backend service as needed.
+        Handlers are registered with the session store by name, so
+        that sessions using them can be resumed by any process which
+        prepared the same handlers. May be replaced by the backend
+        service as needed.
 
         Arguments:
             handlers -- A list of function pointers
             **kwargs -- Any additional parameters required by the backend.
         """
-        pass
+        register = getattr(self.sessions, 'register_handler', None)
+        if register is not None:
+            for handler in handlers:
+                register(handler)
 
     # =================================================================
     # Server side (command provider) API
@@ -0,0 +1,432 @@
+"""
+    SleekXMPP: The Sleek XMPP Library
+    Copyright (C) 2011 Nathanael C. Fritz, Lance J.T. Stout
+    This file is part of SleekXMPP.
+
+    See the file LICENSE for copying permission.
+"""
+
+import io
+import heapq
+import itertools
+import logging
+import pickle
+import threading
+import time
+from importlib import import_module
+
+from sleekxmpp.xmlstream import ET, ElementBase, JID
+from sleekxmpp.xmlstream.tostring import tostring
+
+
+log = logging.getLogger(__name__)
+
+
+class SessionStore(object):
+
+    """
+    Storage for ad-hoc command sessions which expire.
+
+    Sessions are kept in a compact form instead of as live objects:
+    payload stanzas are serialized to XML, JIDs to strings, stanza
+    classes to their names, and handlers to the names they were
+    registered with using :meth:`register_handler`. Handlers which
+    were not registered are kept in memory by this store only, so a
+    session using them can not be resumed by another process.
+
+    The backend may be any object offering the dictionary interface,
+    such as a :class:`SQLiteBackend` to share sessions between worker
+    processes and keep them across restarts. Its values are tuples of
+    the session's expiry time and its compact form. A backend may
+    provide ``expired`` and ``oldest`` methods to find the sessions to
+    expire and evict; otherwise the store keeps its own heap of the
+    sessions ordered by expiry time, so that neither requires a scan
+    of the backend.
+
+    Attributes:
+        backend      -- The mapping holding the stored sessions.
+        ttl          -- The seconds a session is kept after it was
+                        last stored, or None to keep it until it is
+                        deleted.
+        max_sessions -- The number of sessions to keep before the
+                        ones closest to expiring are discarded, or
+                        None for no limit.
+        handlers     -- A dictionary mapping names to registered
+                        handlers.
+        stats        -- Counters of the sessions stored, expired and
+                        evicted to stay within max_sessions.
+
+    Methods:
+        register_handler -- Make a handler storable by name.
+        expire           -- Remove all expired sessions.
+    """
+
+    def __init__(self, backend=None, ttl=None, max_sessions=None):
+        self.backend = {} if backend is None else backend
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.handlers = {}
+        self.stats = {'stored': 0, 'expired': 0, 'evicted': 0}
+
+        self._names = {}
+        self._local = {}
+        self._classes = {}
+        self._lock = threading.RLock()
+
+        # A heap of (expires, sequence, sid) entries, with the
+        # sequence of each session's current entry by its ID. Entries
+        # for sessions which were stored again or removed are
+        # discarded once they reach the front of the heap.
+        self._heap = []
+        self._index = {}
+        self._sequence = itertools.count()
+        self._indexed = not hasattr(self.backend, 'expired')
+        if self._indexed:
+            for sid, (expires, _) in list(self.backend.items()):
+                self._push(sid, expires)
+
+    def register_handler(self, handler, name=None):
+        """
+        Make a handler storable by name, so that sessions using it
+        can be resumed by any process which registered it.
+
+        Arguments:
+            handler -- The handler function.
+            name    -- The name to store the handler as. Defaults to
+                       the handler's module and qualified name.
+        """
+        if name is None:
+            name = '%s.%s' % (handler.__module__,
+                              getattr(handler, '__qualname__',
+                                      handler.__name__))
+        with self._lock:
+            self.handlers[name] = handler
+            self._names[handler] = name
+        return name
+
+    def expire(self, now=None):
+        """
+        Remove all expired sessions.
+
+        Arguments:
+            now -- The current time. Defaults to time.time().
+
+        Returns the number of sessions removed.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if self._indexed:
+                expired = []
+                while self._heap and self._heap[0][0] <= now:
+                    expires, seq, sid = heapq.heappop(self._heap)
+                    if self._index.get(sid) == seq:
+                        expired.append(sid)
+                        self._discard(sid)
+            else:
+                expired = self.backend.expired(now)
+                for sid in expired:
+                    self._discard(sid)
+                # Sessions may have been removed from a shared backend
+                # by other processes.
+                for sid in list(self._local):
+                    if sid not in self.backend:
+                        del self._local[sid]
+            self.stats['expired'] += len(expired)
+        if expired:
+            log.debug('Expired %s ad-hoc command sessions', len(expired))
+        return len(expired)
+
+    def _push(self, sid, expires):
+        """
+        Index a session by its expiry time, with sessions which do not
+        expire ordered after all others.
+
+        Must be called while holding the lock.
+        """
+        seq = next(self._sequence)
+        self._index[sid] = seq
+        heapq.heappush(self._heap, (float('inf') if expires is None
+                                    else expires, seq, sid))
+        if len(self._heap) > 2 * len(self._index) + 64:
+            self._heap = [entry for entry in self._heap
+                          if self._index.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+
+    def _discard(self, sid):
+        try:
+            del self.backend[sid]
+        except KeyError:
+            pass
+        self._local.pop(sid, None)
+        self._index.pop(sid, None)
+
+    def _evict(self):
+        """
+        Discard the session closest to expiring.
+
+        Returns False if there was no session to discard.
+        """
+        sid = None
+        if not self._indexed:
+            sid = self.backend.oldest()
+        else:
+            while self._heap:
+                expires, seq, oldest = heapq.heappop(self._heap)
+                if self._index.get(oldest) == seq:
+                    sid = oldest
+                    break
+        if sid is None:
+            return False
+        self._discard(sid)
+        self.stats['evicted'] += 1
+        return True
+
+    def _load(self, sid):
+        """Return the compact form of a session, or None if missing."""
+        try:
+            expires, packed = self.backend[sid]
+        except KeyError:
+            return None
+        if expires is not None and expires <= time.time():
+            with self._lock:
+                self._discard(sid)
+                self.stats['expired'] += 1
+            return None
+        return packed
+
+    def __getitem__(self, sid):
+        packed = self._load(sid)
+        if packed is None or not self._resumable(sid, packed):
+            raise KeyError(sid)
+        return self._unpack(sid, packed)
+
+    def get(self, sid, default=None):
+        packed = self._load(sid)
+        if packed is None or not self._resumable(sid, packed):
+            return default
+        return self._unpack(sid, packed)
+
+    def __contains__(self, sid):
+        packed = self._load(sid)
+        return packed is not None and self._resumable(sid, packed)
+
+    def __setitem__(self, sid, session):
+        expires = None
+        if self.ttl is not None:
+            expires = time.time() + self.ttl
+        with self._lock:
+            packed = self._pack(sid, session)
+            if self.max_sessions is not None and sid not in self.backend:
+                if len(self.backend) >= self.max_sessions:
+                    self.expire()
+                while len(self.backend) >= self.max_sessions:
+                    if not self._evict():
+                        break
+            self.backend[sid] = (expires, packed)
+            if self._indexed:
+                self._push(sid, expires)
+            self.stats['stored'] += 1
+
+    def __delitem__(self, sid):
+        with self._lock:
+            self._local.pop(sid, None)
+            self._index.pop(sid, None)
+            del self.backend[sid]
+
+    def __len__(self):
+        return len(self.backend)
+
+    def _pack(self, sid, session):
+        """
+        Convert a session into its compact form.
+
+        Must be called while holding the lock.
+        """
+        data = {}
+        stanzas = {}
+        jids = {}
+        classes = {}
+        handlers = {}
+        local = {}
+        for key, value in session.items():
+            if isinstance(value, ElementBase):
+                stanzas[key] = (False, [self._pack_stanza(value)])
+            elif isinstance(value, list) and value and \
+                    all(isinstance(item, ElementBase) for item in value):
+                stanzas[key] = (True, [self._pack_stanza(item)
+                                       for item in value])
+            elif isinstance(value, JID):
+                jids[key] = value.full
+            elif isinstance(value, set) and value and \
+                    all(isinstance(item, type) for item in value):
+                classes[key] = [self._class_name(cls) for cls in value]
+            elif callable(value) and not isinstance(value, type):
+                try:
+                    name = self._names.get(value)
+                except TypeError:
+                    name = None
+                if name is None:
+                    local[key] = value
+                else:
+                    handlers[key] = name
+            else:
+                data[key] = value
+        if local:
+            self._local[sid] = local
+        else:
+            self._local.pop(sid, None)
+        return {'data': data, 'stanzas': stanzas, 'jids': jids,
+                'classes': classes, 'handlers': handlers}
+
+    def _resumable(self, sid, packed):
+        """
+        Check that every handler used by a session is registered.
+
+        A session stored by another process with a handler that was
+        not registered here can not continue, so it is treated as
+        missing.
+        """
+        for name in packed['handlers'].values():
+            if name not in self.handlers:
+                log.warning('Ad-hoc command session %s uses unknown ' + \
+                            'handler %s', sid, name)
+                return False
+        return True
+
+    def _unpack(self, sid, packed):
+        """Rebuild a session from its compact form."""
+        session = dict(packed['data'])
+        for key, (is_list, items) in packed['stanzas'].items():
+            items = [self._unpack_stanza(item) for item in items]
+            session[key] = items if is_list else items[0]
+        for key, jid in packed['jids'].items():
+            session[key] = JID(jid)
+        for key, names in packed['classes'].items():
+            session[key] = set(self._load_class(name) for name in names)
+        for key, name in packed['handlers'].items():
+            session[key] = self.handlers[name]
+        session.update(self._local.get(sid, {}))
+        return session
+
+    def _class_name(self, cls):
+        name = '%s.%s' % (cls.__module__, cls.__name__)
+        self._classes[name] = cls
+        return name
+
+    def _load_class(self, name):
+        cls = self._classes.get(name)
+        if cls is None:
+            module, _, cls_name = name.rpartition('.')
+            cls = getattr(import_module(module), cls_name)
+            self._classes[name] = cls
+        return cls
+
+    def _pack_stanza(self, stanza):
+        return (self._class_name(stanza.__class__),
+                tostring(stanza.xml, xmlns='', top_level=True))
+
+    def _unpack_stanza(self, packed):
+        name, xml = packed
+        return self._load_class(name)(xml=ET.fromstring(xml))
+
+
+class _PlainUnpickler(pickle.Unpickler):
+
+    """
+    An unpickler which only rebuilds plain values, refusing to load
+    any other classes or functions named by the pickle.
+    """
+
+    allowed = set([('builtins', 'set'), ('builtins', 'frozenset'),
+                   ('__builtin__', 'set'), ('__builtin__', 'frozenset'),
+                   ('_codecs', 'encode')])
+
+    def find_class(self, module, name):
+        if (module, name) not in self.allowed:
+            raise pickle.UnpicklingError('Refusing to load %s.%s' % (
+                                         module, name))
+        return pickle.Unpickler.find_class(self, module, name)
+
+
+class SQLiteBackend(object):
+
+    """
+    A session backend using an SQLite database, which may be shared
+    by several processes.
+
+    Sessions are stored pickled, but are loaded with an unpickler
+    which only accepts plain values such as strings, numbers, and
+    lists, tuples, sets, and dictionaries of them. Stored sessions
+    still name the stanza classes and handlers to resume them with,
+    so the database must only be writable by trusted processes.
+
+    Arguments:
+        path  -- The path of the database file.
+        table -- The name of the table holding the sessions.
+    """
+
+    def __init__(self, path, table='adhoc_sessions'):
+        import sqlite3
+        self._binary = sqlite3.Binary
+        self.table = table
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('CREATE TABLE IF NOT EXISTS %s ('
+                         'id TEXT PRIMARY KEY, expires REAL, data BLOB)' %
+                         self.table)
+        self._db.execute('CREATE INDEX IF NOT EXISTS %s_expires '
+                         'ON %s (expires)' % (self.table, self.table))
+
+    def _query(self, sql, *args):
+        with self._lock:
+            return self._db.execute(sql % self.table, args).fetchall()
+
+    def __getitem__(self, sid):
+        rows = self._query('SELECT expires, data FROM %s WHERE id = ?', sid)
+        if not rows:
+            raise KeyError(sid)
+        expires, data = rows[0]
+        try:
+            packed = _PlainUnpickler(io.BytesIO(bytes(data))).load()
+        except pickle.UnpicklingError as e:
+            log.warning('Could not load ad-hoc command session %s: %s',
+                        sid, e)
+            raise KeyError(sid)
+        return expires, packed
+
+    def __setitem__(self, sid, value):
+        expires, packed = value
+        self._query('INSERT OR REPLACE INTO %s VALUES (?, ?, ?)',
+                    sid, expires, self._binary(pickle.dumps(packed, 2)))
+
+    def __delitem__(self, sid):
+        with self._lock:
+            cursor = self._db.execute('DELETE FROM %s WHERE id = ?' %
+                                      self.table, (sid,))
+        if not cursor.rowcount:
+            raise KeyError(sid)
+
+    def __contains__(self, sid):
+        return bool(self._query('SELECT 1 FROM %s WHERE id = ?', sid))
+
+    def __len__(self):
+        return self._query('SELECT COUNT(*) FROM %s')[0][0]
+
+    def keys(self):
+        return [row[0] for row in self._query('SELECT id FROM %s')]
+
+    def expired(self, now):
+        """Return the IDs of sessions which expired by a given time."""
+        return [row[0] for row in self._query(
+                'SELECT id FROM %s WHERE expires <= ?', now)]
+
+    def oldest(self):
+        """Return the ID of the session closest to expiring."""
+        rows = self._query('SELECT id FROM %s ORDER BY expires LIMIT 1')
+        return rows[0][0] if rows else None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
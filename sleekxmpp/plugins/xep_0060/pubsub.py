@@ -8,7 +8,8 @@
 
 import logging
 
-from sleekxmpp.xmlstream import JID
+from sleekxmpp.stanza import Message
+from sleekxmpp.xmlstream import JID, ET
 from sleekxmpp.xmlstream.handler import Callback
 from sleekxmpp.xmlstream.matcher import StanzaPath
 from sleekxmpp.plugins.base import BasePlugin
@@ -28,6 +29,13 @@ class XEP_0060(BasePlugin):
     description = 'XEP-0060: Publish-Subscribe'
     dependencies = set(['xep_0030', 'xep_0004', 'xep_0082', 'xep_0131'])
     stanza = stanza
+    default_config = {
+        #: If ``True``, a notification carrying several items raises
+        #: a single ``pubsub_items`` event (and ``<event_name>_items``
+        #: for mapped nodes) with the whole message, instead of
+        #: ``publish`` and ``retract`` events for each item.
+        'batch_items': False
+    }
 
     def plugin_init(self):
         self.node_event_map = {}
@@ -64,34 +72,51 @@ class XEP_0060(BasePlugin):
 
     def _handle_event_items(self, msg):
         """Raise events for publish and retraction notifications."""
-        node = msg['pubsub_event']['items']['node']
+        items = msg['pubsub_event']['items']
+        node = items['node']
+        event_name = self.node_event_map.get(node, None)
 
-        multi = len(msg['pubsub_event']['items']) > 1
-        values = {}
-        if multi:
-            values = msg.values
-            del values['pubsub_event']
+        multi = len(items) > 1
+        if multi and self.batch_items:
+            self.xmpp.event('pubsub_items', msg)
+            if event_name:
+                self.xmpp.event('%s_items' % event_name, msg)
+            return
 
-        for item in msg['pubsub_event']['items']:
-            event_name = self.node_event_map.get(node, None)
+        for item in items:
             event_type = 'publish'
             if item.name == 'retract':
                 event_type = 'retract'
 
             if multi:
-                condensed = self.xmpp.Message()
-                condensed.values = values
-                condensed['pubsub_event']['items']['node'] = node
-                condensed['pubsub_event']['items'].append(item)
                 self.xmpp.event('pubsub_%s' % event_type, msg)
                 if event_name:
                     self.xmpp.event('%s_%s' % (event_name, event_type),
-                                    condensed)
+                                    self._item_view(msg, item))
             else:
                 self.xmpp.event('pubsub_%s' % event_type, msg)
                 if event_name:
                     self.xmpp.event('%s_%s' % (event_name, event_type), msg)
 
+    def _item_view(self, msg, item):
+        """
+        Return a message containing only one item of a notification.
+
+        The new message shares its payload elements with the original
+        instead of copying them, and so should be treated as read-only.
+        """
+        event = msg['pubsub_event']
+        items = event['items']
+
+        xml = ET.Element(msg.xml.tag, msg.xml.attrib)
+        for child in msg.xml:
+            if child is not event.xml:
+                xml.append(child)
+        event_xml = ET.SubElement(xml, event.xml.tag)
+        items_xml = ET.SubElement(event_xml, items.xml.tag, items.xml.attrib)
+        items_xml.append(item.xml)
+        return Message(self.xmpp, xml)
+
     def _handle_event_purge(self, msg):
         """Raise events for node purge notifications."""
         node = msg['pubsub_event']['purge']['node']
@@ -458,6 +483,7 @@ class XEP_0060(BasePlugin):
                         be executed when a reply stanza is received.
         """
         iq = self.xmpp.Iq(sto=jid, sfrom=ifrom, stype='set')
+        iq.lane = 'bulk'
         iq['pubsub']['publish']['node'] = node
         if id is not None:
             iq['pubsub']['publish']['item']['id'] = id
@@ -1,3 +1,4 @@
+import time
 import logging
 import threading
 import socket
@@ -26,7 +27,11 @@ class XEP_0065(base_plugin):
     description = "Socks5 Bytestreams"
     dependencies = set(['xep_0030'])
     default_config = {
-        'auto_accept': False
+        'auto_accept': False,
+
+        # The size of the buffer used when copying data between
+        # files and SOCKS5 sessions without sendfile support.
+        'buffer_size': 65536
     }
 
     def plugin_init(self):
@@ -35,6 +40,7 @@ class XEP_0065(base_plugin):
         self._proxies = {}
         self._sessions = {}
         self._sessions_lock = threading.Lock()
+        self._stats = {}
 
         self._preauthed_sids_lock = threading.Lock()
         self._preauthed_sids = {}
@@ -60,6 +66,106 @@ class XEP_0065(base_plugin):
         """Returns the socket associated to the SID."""
         return self._sessions.get(sid, None)
 
+    def get_stats(self, sid):
+        """
+        Return the transfer statistics for a session.
+
+        The result contains the number of bytes sent and received with
+        :meth:`send_file` and :meth:`recv_file`, the time in seconds
+        spent in those transfers, and the resulting throughput in
+        bytes per second. The final statistics of a closed session
+        are kept until they are read once.
+        """
+        with self._sessions_lock:
+            if sid in self._sessions:
+                stats = dict(self._stats.get(sid, {}))
+            else:
+                stats = self._stats.pop(sid, {})
+        if stats:
+            total = stats['bytes_sent'] + stats['bytes_received']
+            stats['throughput'] = total / stats['time'] if stats['time'] else 0
+        return stats
+
+    def _get_session(self, sid):
+        sock = self.get_socket(sid)
+        if sock is None:
+            raise socket.error('Unknown SOCKS5 session: %s' % sid)
+        if sid not in self._stats:
+            self._stats[sid] = {'bytes_sent': 0,
+                                'bytes_received': 0,
+                                'time': 0.0}
+        return sock, self._stats[sid]
+
+    def send_file(self, sid, fileobj, offset=0, count=None):
+        """
+        Send the contents of a file over a SOCKS5 session.
+
+        The file is passed to the kernel with sendfile() where
+        possible, so that its data is never copied through Python.
+        Otherwise the file is sent through a single reusable buffer.
+
+        Returns the number of bytes sent.
+
+        Arguments:
+            sid     -- The session's stream ID.
+            fileobj -- A file object opened in binary mode.
+            offset  -- The file position to start sending from.
+            count   -- The maximum number of bytes to send. Defaults
+                       to sending until the end of the file.
+        """
+        sock, stats = self._get_session(sid)
+        start = time.time()
+        if hasattr(sock, 'sendfile'):
+            sent = sock.sendfile(fileobj, offset, count)
+        else:
+            sent = 0
+            buf = memoryview(bytearray(self.buffer_size))
+            fileobj.seek(offset)
+            while count is None or sent < count:
+                size = len(buf)
+                if count is not None:
+                    size = min(size, count - sent)
+                read = fileobj.readinto(buf[:size])
+                if not read:
+                    break
+                sock.sendall(buf[:read])
+                sent += read
+        stats['bytes_sent'] += sent
+        stats['time'] += time.time() - start
+        return sent
+
+    def recv_file(self, sid, fileobj, count=None):
+        """
+        Receive data from a SOCKS5 session into a file.
+
+        Data is received into a single preallocated buffer with
+        recv_into(), and written to the file from that buffer.
+
+        Returns the number of bytes received.
+
+        Arguments:
+            sid     -- The session's stream ID.
+            fileobj -- A file object opened in binary mode.
+            count   -- The maximum number of bytes to receive. Defaults
+                       to receiving until the session is closed.
+        """
+        sock, stats = self._get_session(sid)
+        start = time.time()
+        received = 0
+        buf = memoryview(bytearray(self.buffer_size))
+        while count is None or received < count:
+            size = len(buf)
+            if count is not None:
+                size = min(size, count - received)
+            read = sock.recv_into(buf, size)
+            if not read:
+                break
+            fileobj.write(buf[:read])
+            received += read
+        stats['bytes_received'] += received
+        stats['time'] += time.time() - start
+        return received
+
     def handshake(self, to, ifrom=None, sid=None, timeout=None):
         """ Starts the handshake to establish the socks5 bytestreams
         connection.
@@ -250,6 +356,10 @@ class XEP_0065(base_plugin):
         sock.connect((dest, 0))
         log.info('Socket connected.')
 
+        # Discard any unread statistics of an earlier session.
+        with self._sessions_lock:
+            self._stats.pop(sid, None)
+
         _close = sock.close
         def close(*args, **kwargs):
             with self._sessions_lock:
@@ -6,12 +6,12 @@
     See the file LICENSE for copying permission.
 """
 
+import io
+import time
 import logging
 import socket
 import zlib
-
-from sleekxmpp.thirdparty.suelta.util import bytes
-
+import binascii
 
 from sleekxmpp.stanza import StreamFeatures
 from sleekxmpp.xmlstream import RestartStream, register_stanza_plugin, ElementBase, StanzaBase
@@ -65,31 +65,113 @@ class Compressed(StanzaBase):
 
 
 
+#: The zlib flush modes which may be used after each write.
+FLUSH_MODES = {
+    'sync': zlib.Z_SYNC_FLUSH,
+    'full': zlib.Z_FULL_FLUSH,
+    'partial': getattr(zlib, 'Z_PARTIAL_FLUSH', zlib.Z_SYNC_FLUSH),
+}
+
+try:
+    _cpu_time = time.thread_time
+except AttributeError:
+    _cpu_time = getattr(time, 'process_time', time.clock)
+
+
 class ZlibSocket(object):
 
-    def __init__(self, socketobj):
+    """
+    A socket wrapper which compresses outgoing data and decompresses
+    incoming data.
+
+    Each write is compressed and flushed as a unit, so writers which
+    coalesce several stanzas into one write share a single flush.
+
+    :param socketobj: The underlying socket.
+    :param int level: The zlib compression level, from 0 to 9.
+    :param flush: The flush mode after each write: ``'sync'``,
+                  ``'full'`` (resets the compression dictionary),
+                  or ``'partial'``.
+    """
+
+    def __init__(self, socketobj, level=zlib.Z_DEFAULT_COMPRESSION,
+                 flush='sync'):
         self.__socket = socketobj
-        self.compressor = zlib.compressobj()
+        self.compressor = zlib.compressobj(level)
         self.decompressor = zlib.decompressobj(zlib.MAX_WBITS)
+        self.flush_mode = FLUSH_MODES[flush]
+
+        #: Byte counts before and after compression in each direction,
+        #: and the CPU time in seconds spent compressing and
+        #: decompressing.
+        self.stats = {'sent': 0,
+                      'sent_compressed': 0,
+                      'received': 0,
+                      'received_compressed': 0,
+                      'compress_time': 0.0,
+                      'decompress_time': 0.0}
 
     def __getattr__(self, name):
         return getattr(self.__socket, name)
 
+    @property
+    def ratio(self):
+        """The size of the compressed output relative to the input."""
+        if not self.stats['sent']:
+            return 1.0
+        return self.stats['sent_compressed'] / float(self.stats['sent'])
+
     def send(self, data):
-        sentlen = len(data)
-        data = self.compressor.compress(data)
-        data += self.compressor.flush(zlib.Z_SYNC_FLUSH)
-        log.debug(b'>>> (compressed)' + (data.encode("hex")))
-        #return self.__socket.send(data)
-        sentactuallen = self.__socket.send(data)
-        assert(sentactuallen == len(data))
+        self.sendall(data)
+        return len(data)
+
+    def sendall(self, data):
+        start = _cpu_time()
+        compressed = self.compressor.compress(data)
+        compressed += self.compressor.flush(self.flush_mode)
+        self.stats['compress_time'] += _cpu_time() - start
+        self.stats['sent'] += len(data)
+        self.stats['sent_compressed'] += len(compressed)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('>>> (compressed) %s', binascii.hexlify(compressed))
+        self.__socket.sendall(compressed)
+
+    def recv(self, bufsize, *args, **kwargs):
+        while True:
+            data = self.decompressor.unconsumed_tail
+            if not data:
+                data = self.__socket.recv(bufsize, *args, **kwargs)
+                if not data:
+                    return data
+                self.stats['received_compressed'] += len(data)
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug('<<< (compressed) %s', binascii.hexlify(data))
+            start = _cpu_time()
+            data = self.decompressor.decompress(data, bufsize)
+            self.stats['decompress_time'] += _cpu_time() - start
+            if data:
+                self.stats['received'] += len(data)
+                return data
+
+    def makefile(self, *args, **kwargs):
+        return ZlibFile(self)
+
+
+class ZlibFile(io.RawIOBase):
+
+    """A readable file wrapper around a :class:`ZlibSocket`."""
 
-        return sentlen
+    def __init__(self, socketobj):
+        io.RawIOBase.__init__(self)
+        self.socket = socketobj
+
+    def readable(self):
+        return True
 
-    def recv(self, *args, **kwargs):
-        data = self.__socket.recv(*args, **kwargs)
-        log.debug(b'<<< (compressed)' + data.encode("hex"))
-        return self.decompressor.decompress(self.decompressor.unconsumed_tail + data)
+    def readinto(self, b):
+        data = self.socket.recv(len(b))
+        b[:len(data)] = data
+        return len(data)
 
 
 class XEP_0138(BasePlugin):
@@ -99,12 +181,21 @@ class XEP_0138(BasePlugin):
     name = "xep_0138"
     description = "XEP-0138: Compression"
     dependencies = set(["xep_0030"])
+    default_config = {
+        #: The order of compression among the stream features.
+        'order': 5,
+        #: The zlib compression level, from 0 (none) to 9 (smallest).
+        'level': zlib.Z_DEFAULT_COMPRESSION,
+        #: The flush mode after each write; see :data:`FLUSH_MODES`.
+        'flush': 'sync'
+    }
 
     def plugin_init(self):
         self.xep = '0138'
         self.description = 'Stream Compression (Generic)'
 
         self.compression_methods = {'zlib': True}
+        self.socket = None
 
         register_stanza_plugin(StreamFeatures, Compression)
         self.xmpp.register_stanza(Compress)
@@ -119,7 +210,7 @@ class XEP_0138(BasePlugin):
         self.xmpp.register_feature('compression',
                 self._handle_compression,
                 restart=True,
-                order=self.config.get('order', 5))
+                order=self.order)
 
     def register_compression_method(self, name, handler):
         self.compression_methods[name] = handler
@@ -137,10 +228,23 @@ class XEP_0138(BasePlugin):
     def _handle_compressed(self, stanza):
         self.xmpp.features.add('compression')
         log.debug('Stream Compressed!')
-        compressed_socket = ZlibSocket(self.xmpp.socket)
-        self.xmpp.set_socket(compressed_socket)
+        self.socket = ZlibSocket(self.xmpp.socket,
+                                 level=self.level,
+                                 flush=self.flush)
+        self.xmpp.set_socket(self.socket)
         raise RestartStream()
 
+    def get_stats(self):
+        """Return the compression statistics for the current stream.
+
+        Returns ``None`` if the stream is not compressed.
+        """
+        if self.socket is None or self.xmpp.socket is not self.socket:
+            return None
+        stats = dict(self.socket.stats)
+        stats['ratio'] = self.socket.ratio
+        return stats
+
     def _handle_failure(self, stanza):
         pass
 
@@ -0,0 +1,172 @@
+"""
+    SleekXMPP: The Sleek XMPP Library
+    Copyright (C) 2012 Nathanael C. Fritz, Lance J.T. Stout
+    This file is part of SleekXMPP.
+
+    See the file LICENSE for copying permission.
+"""
+
+import logging
+import tempfile
+import threading
+import collections
+
+
+log = logging.getLogger(__name__)
+
+
+class ReplayBuffer(object):
+
+    """
+    A bounded store of serialized, unacknowledged outgoing stanzas.
+
+    Stanzas are kept as UTF-8 encoded bytes in memory until the total
+    size exceeds ``max_size``. If a ``spill_path`` directory is given,
+    the oldest entries are then moved to a temporary file in that
+    directory, which is used as a ring of at most ``spill_size``
+    bytes. Once neither memory nor the spill file can hold more
+    data, the buffer is marked as overflowed and new stanzas are no
+    longer retained, since the stream can no longer be resumed
+    without losing data.
+
+    :param int max_size: The maximum number of bytes kept in memory.
+                         ``None`` means no limit.
+    :param spill_path: Optional directory for the disk spill file.
+    :param int spill_size: The maximum number of bytes kept on disk.
+    """
+
+    def __init__(self, max_size=None, spill_path=None, spill_size=None):
+        self.max_size = max_size
+        self.spill_path = spill_path
+        self.spill_size = spill_size
+
+        #: Set when a stanza could not be retained.
+        self.overflowed = False
+
+        self._lock = threading.Lock()
+        self._memory = collections.deque()
+        self._memory_size = 0
+        self._spilled = collections.deque()
+        self._spill_file = None
+        self._spill_used = 0
+
+    def __len__(self):
+        return len(self._spilled) + len(self._memory)
+
+    @property
+    def size(self):
+        """The number of bytes held in memory and on disk."""
+        return self._memory_size + self._spill_used
+
+    def append(self, seq, data):
+        """
+        Retain a serialized stanza until it has been acked.
+
+        :param int seq: The stanza's stream management sequence number.
+        :param data: The serialized stanza text.
+        """
+        data = data.encode('utf-8')
+        with self._lock:
+            if self.overflowed:
+                return
+            self._memory.append((seq, data))
+            self._memory_size += len(data)
+            while self.max_size is not None and \
+                  self._memory_size > self.max_size:
+                if not self._spill():
+                    log.warning('Stream management replay buffer ' + \
+                                'overflowed; stream resumption disabled.')
+                    self.overflowed = True
+                    self._clear()
+                    return
+
+    def pop(self, count, load=True):
+        """
+        Discard the oldest entries once they have been acked.
+
+        :param int count: The number of entries to discard.
+        :param bool load: If ``True``, return the serialized stanzas
+                          which were discarded. Otherwise an empty
+                          list is returned, and spilled entries are
+                          not read back from disk.
+        """
+        acked = []
+        with self._lock:
+            for x in range(min(count, len(self))):
+                if self._spilled:
+                    seq, offset, length = self._spilled.popleft()
+                    self._spill_used -= length
+                    if load:
+                        acked.append(self._read(offset, length))
+                else:
+                    seq, data = self._memory.popleft()
+                    self._memory_size -= len(data)
+                    if load:
+                        acked.append(data.decode('utf-8'))
+        return acked
+
+    def __iter__(self):
+        """Iterate over the retained stanza texts, oldest first."""
+        with self._lock:
+            spilled = [self._read(offset, length)
+                       for seq, offset, length in self._spilled]
+            memory = [data.decode('utf-8') for seq, data in self._memory]
+        return iter(spilled + memory)
+
+    def clear(self):
+        """Discard all retained stanzas and reset the overflow flag."""
+        with self._lock:
+            self._clear()
+            self.overflowed = False
+
+    def close(self):
+        """Discard all retained stanzas and remove the spill file."""
+        self.clear()
+        with self._lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+
+    def _clear(self):
+        self._memory.clear()
+        self._memory_size = 0
+        self._spilled.clear()
+        self._spill_used = 0
+
+    def _spill(self):
+        """Move the oldest in-memory entry to the spill file."""
+        if self.spill_path is None:
+            return False
+        seq, data = self._memory[0]
+        length = len(data)
+
+        offset = 0
+        if self._spilled:
+            head = self._spilled[0][1]
+            tail = self._spilled[-1][1] + self._spilled[-1][2]
+            if tail <= head:
+                # The ring has already wrapped around.
+                offset = tail if tail + length <= head else None
+            elif self.spill_size is None or \
+                 tail + length <= self.spill_size:
+                offset = tail
+            elif length > head:
+                offset = None
+        elif self.spill_size is not None and length > self.spill_size:
+            offset = None
+        if offset is None:
+            return False
+
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(dir=self.spill_path)
+        self._spill_file.seek(offset)
+        self._spill_file.write(data)
+        self._spilled.append((seq, offset, length))
+        self._spill_used += length
+        self._memory.popleft()
+        self._memory_size -= length
+        return True
+
+    def _read(self, offset, length):
+        self._spill_file.seek(offset)
+        return self._spill_file.read(length).decode('utf-8')
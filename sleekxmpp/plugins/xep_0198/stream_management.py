@@ -6,16 +6,18 @@
     See the file LICENSE for copying permission.
 """
 
+import time
 import logging
 import threading
 import collections
 
 from sleekxmpp.stanza import Message, Presence, Iq, StreamFeatures
-from sleekxmpp.xmlstream import register_stanza_plugin
+from sleekxmpp.xmlstream import register_stanza_plugin, ET
 from sleekxmpp.xmlstream.handler import Callback, Waiter
 from sleekxmpp.xmlstream.matcher import MatchXPath, MatchMany
 from sleekxmpp.plugins.base import BasePlugin
 from sleekxmpp.plugins.xep_0198 import stanza
+from sleekxmpp.plugins.xep_0198.replay import ReplayBuffer
 
 
 log = logging.getLogger(__name__)
@@ -23,6 +25,14 @@ log = logging.getLogger(__name__)
 
 MAX_SEQ = 2 ** 32
 
+#: The number of unanswered ack requests to keep for measuring
+#: round trip times.
+MAX_ACK_REQUESTS = 100
+
+# Round trip times are measured with a monotonic clock when the
+# Python version provides one.
+_clock = getattr(time, 'monotonic', time.time)
+
 
 class XEP_0198(BasePlugin):
 
@@ -43,6 +53,15 @@ class XEP_0198(BasePlugin):
         #: every sent stanza. Defaults to ``5``.
         'window': 5,
 
+        #: The maximum time in seconds that sent stanzas may wait for an
+        #: ack request when fewer than ``window`` stanzas have been sent.
+        #: Set to ``None`` to only request acks based on ``window``.
+        #: Defaults to ``1.0``.
+        'window_time': 1.0,
+
+        #: The smoothing factor used for the average ack round trip time.
+        'rtt_alpha': 0.125,
+
         #: The stream management ID for the stream. Knowing this value is
         #: required in order to do stream resumption.
         'sm_id': None,
@@ -57,6 +76,20 @@ class XEP_0198(BasePlugin):
         #: requested when enabling stream management. Defaults to ``True``.
         'allow_resume': True,
 
+        #: The maximum number of bytes of unacked stanzas to keep in
+        #: memory for resending after a stream is resumed. Set to
+        #: ``None`` to remove the limit. Defaults to 1 MiB.
+        'buffer_size': 2 ** 20,
+
+        #: An optional directory where unacked stanzas are spilled once
+        #: ``buffer_size`` is exceeded, instead of giving up on
+        #: stream resumption.
+        'spill_path': None,
+
+        #: The maximum number of bytes of unacked stanzas to spill to
+        #: disk. Defaults to 64 MiB.
+        'spill_size': 64 * 2 ** 20,
+
         'order': 10100,
         'resume_order': 9000
     }
@@ -69,16 +102,28 @@ class XEP_0198(BasePlugin):
         if self.xmpp.is_component:
             return
 
-        self.window_counter = self.window
-        self.window_counter_lock = threading.Lock()
-
         self.enabled = threading.Event()
-        self.unacked_queue = collections.deque()
+        self.unacked_queue = ReplayBuffer(self.buffer_size,
+                                          self.spill_path,
+                                          self.spill_size)
 
-        self.seq_lock = threading.Lock()
-        self.handled_lock = threading.Lock()
         self.ack_lock = threading.Lock()
 
+        # The outgoing counters are only modified by the out_ordered
+        # filter, which runs while holding the stream's send lock,
+        # and the handled counter is only modified by the
+        # incoming filter, which runs in the stream's read thread,
+        # so neither need a lock of their own.
+        self._since_request = 0
+        self._ack_timer = False
+        self._ack_requests = collections.deque(maxlen=MAX_ACK_REQUESTS)
+
+        #: Statistics about ack requests and their round trip times,
+        #: in seconds, for tuning ``window``, ``window_time``
+        #: and ``buffer_size``.
+        self.ack_stats = {}
+        self._reset_stats()
+
         register_stanza_plugin(StreamFeatures, stanza.StreamManagement)
         self.xmpp.register_stanza(stanza.Enable)
         self.xmpp.register_stanza(stanza.Enabled)
@@ -134,7 +179,7 @@ class XEP_0198(BasePlugin):
                     instream=True))
 
         self.xmpp.add_filter('in', self._handle_incoming)
-        self.xmpp.add_filter('out_sync', self._handle_outgoing)
+        self.xmpp.add_filter('out_ordered', self._handle_outgoing)
 
         self.xmpp.add_event_handler('session_end', self.session_end)
 
@@ -146,7 +191,7 @@ class XEP_0198(BasePlugin):
         self.xmpp.unregister_feature('sm', self.resume_order)
         self.xmpp.del_event_handler('session_end', self.session_end)
         self.xmpp.del_filter('in', self._handle_incoming)
-        self.xmpp.del_filter('out_sync', self._handle_outgoing)
+        self.xmpp.del_filter('out_ordered', self._handle_outgoing)
         self.xmpp.remove_handler('Stream Management Enabled')
         self.xmpp.remove_handler('Stream Management Resumed')
         self.xmpp.remove_handler('Stream Management Failed')
@@ -158,6 +203,7 @@ class XEP_0198(BasePlugin):
         self.xmpp.remove_stanza(stanza.Resumed)
         self.xmpp.remove_stanza(stanza.Ack)
         self.xmpp.remove_stanza(stanza.RequestAck)
+        self.unacked_queue.close()
 
     def session_end(self, event):
         """Reset stream management state."""
@@ -167,18 +213,52 @@ class XEP_0198(BasePlugin):
         self.handled = 0
         self.seq = 0
         self.last_ack = 0
+        self._since_request = 0
+        self._ack_requests.clear()
+        self._reset_stats()
+        if self._ack_timer:
+            self.xmpp.scheduler.remove('SM Ack Request')
+            self._ack_timer = False
+
+    def _reset_stats(self):
+        self.ack_stats.update({
+            'requests': 0,
+            'acks': 0,
+            'unacked': 0,
+            'rtt': None,
+            'rtt_avg': None,
+            'rtt_max': None})
 
     def send_ack(self):
         """Send the current ack count to the server."""
         ack = stanza.Ack(self.xmpp)
-        with self.handled_lock:
-            ack['h'] = self.handled
+        ack['h'] = self.handled
         self.xmpp.send_raw(str(ack), now=True)
 
     def request_ack(self, e=None):
         """Request an ack from the server."""
-        req = stanza.RequestAck(self.xmpp)
-        self.xmpp.send_queue.put(str(req))
+        # The request must be recorded in the same order as the
+        # outgoing filter numbers sent stanzas.
+        with self.xmpp.send_lock:
+            self.xmpp.send_raw(self._make_request_ack(), lane='control')
+
+    def _make_request_ack(self):
+        """
+        Return an ack request, recording when it was made.
+
+        Must be called while holding the stream's send lock.
+        """
+        self._since_request = 0
+        self._ack_requests.append((self.seq, _clock()))
+        self.ack_stats['requests'] += 1
+        return str(stanza.RequestAck(self.xmpp))
+
+    def _handle_ack_timer(self):
+        """Request an ack if sent stanzas have waited too long."""
+        with self.xmpp.send_lock:
+            self._ack_timer = False
+            if self._since_request and self.enabled.is_set():
+                self.request_ack()
 
     def _handle_sm_feature(self, features):
         """
@@ -201,6 +281,11 @@ class XEP_0198(BasePlugin):
                 enable['resume'] = self.allow_resume
                 enable.send(now=True)
                 self.handled = 0
+        elif self.sm_id and self.unacked_queue.overflowed:
+            log.warning('Not resuming stream %s: too many unacked ' + \
+                        'stanzas to resend.', self.sm_id)
+            self.sm_id = None
+            self.unacked_queue.clear()
         elif self.sm_id and self.allow_resume:
             self.enabled.set()
             resume = stanza.Resume(self.xmpp)
@@ -238,8 +323,8 @@ class XEP_0198(BasePlugin):
         """
         self.xmpp.features.add('stream_management')
         self._handle_ack(stanza)
-        for id, stanza in self.unacked_queue:
-            self.xmpp.send(stanza, now=True, use_filters=False)
+        for data in self.unacked_queue:
+            self.xmpp.send_raw(data, now=True)
         self.xmpp.session_started_event.set()
         self.xmpp.event('session_resumed', stanza)
 
@@ -258,7 +343,9 @@ class XEP_0198(BasePlugin):
     def _handle_ack(self, ack):
         """Process a server ack by freeing acked stanzas from the queue.
 
-        Raises a :term:`stanza_acked` event for each acked stanza.
+        Raises a single :term:`stanzas_acked` event with the list of
+        serialized stanzas covered by the ack, and a :term:`stanza_acked`
+        event for each acked stanza if that event has handlers.
         """
         if ack['h'] == self.last_ack:
             return
@@ -274,10 +361,42 @@ class XEP_0198(BasePlugin):
                 num_unacked,
                 num_acked,
                 num_unacked - num_acked)
-            for x in range(num_acked):
-                seq, stanza = self.unacked_queue.popleft()
-                self.xmpp.event('stanza_acked', stanza)
+            batch = self.xmpp.event_handled('stanzas_acked') > 0
+            single = self.xmpp.event_handled('stanza_acked') > 0
+            acked = self.unacked_queue.pop(num_acked, batch or single)
             self.last_ack = ack['h']
+            self._update_rtt(ack['h'])
+        if acked and batch:
+            self.xmpp.event('stanzas_acked', acked)
+        if acked and single:
+            for data in acked:
+                self.xmpp.event('stanza_acked', self._load_stanza(data))
+
+    def _load_stanza(self, data):
+        """Rebuild a stanza object from its serialized text."""
+        xml = '<stream xmlns="%s">%s</stream>' % (self.xmpp.default_ns, data)
+        if not isinstance(xml, bytes):
+            xml = xml.encode('utf-8')
+        return self.xmpp._build_stanza(ET.fromstring(xml)[0])
+
+    def _update_rtt(self, h):
+        """Measure the round trip time of ack requests covered by an ack."""
+        now = _clock()
+        stats = self.ack_stats
+        stats['unacked'] = len(self.unacked_queue)
+        while self._ack_requests:
+            seq, sent = self._ack_requests[0]
+            if (h - seq) % MAX_SEQ >= MAX_SEQ // 2:
+                break
+            self._ack_requests.popleft()
+            rtt = now - sent
+            stats['acks'] += 1
+            stats['rtt'] = rtt
+            if stats['rtt_avg'] is None:
+                stats['rtt_avg'] = rtt
+            else:
+                stats['rtt_avg'] += self.rtt_alpha * (rtt - stats['rtt_avg'])
+            stats['rtt_max'] = max(rtt, stats['rtt_max'] or 0)
 
     def _handle_request_ack(self, req):
         """Handle an ack request by sending an ack."""
@@ -289,26 +408,33 @@ class XEP_0198(BasePlugin):
             return stanza
 
         if isinstance(stanza, (Message, Presence, Iq)):
-            with self.handled_lock:
-                # Sequence numbers are mod 2^32
-                self.handled = (self.handled + 1) % MAX_SEQ
+            # Sequence numbers are mod 2^32
+            self.handled = (self.handled + 1) % MAX_SEQ
         return stanza
 
-    def _handle_outgoing(self, stanza):
-        """Store outgoing stanzas in a queue to be acked."""
+    def _handle_outgoing(self, stanza, data):
+        """Store outgoing stanzas in a queue to be acked.
+
+        Runs in send order on the serialized stanza text, so that
+        sequence numbers match the order seen by the server.
+        """
         if not self.enabled.is_set():
-            return stanza
+            return data
 
         if isinstance(stanza, (Message, Presence, Iq)):
-            seq = None
-            with self.seq_lock:
-                # Sequence numbers are mod 2^32
-                self.seq = (self.seq + 1) % MAX_SEQ
-                seq = self.seq
-            self.unacked_queue.append((seq, stanza))
-            with self.window_counter_lock:
-                self.window_counter -= 1
-                if self.window_counter == 0:
-                    self.window_counter = self.window
-                    self.request_ack()
-        return stanza
+            # Sequence numbers are mod 2^32
+            self.seq = (self.seq + 1) % MAX_SEQ
+            seq = self.seq
+            self.unacked_queue.append(seq, data)
+
+            # The ack request is sent along with the stanza so
+            # that it can not be queued ahead of it.
+            self._since_request += 1
+            if self._since_request >= self.window:
+                data += self._make_request_ack()
+            elif self.window_time and not self._ack_timer:
+                self._ack_timer = True
+                self.xmpp.schedule('SM Ack Request',
+                                   self.window_time,
+                                   self._handle_ack_timer)
+        return data
@@ -142,6 +142,9 @@ class XEP_0199(BasePlugin):
         iq['to'] = jid
         iq['from'] = ifrom
         iq.enable('ping')
+        # Keep pings from queueing behind bulk data, since a late
+        # pong would look like a dead connection.
+        iq.lane = 'control'
 
         return iq.send(block=block, timeout=timeout, callback=callback)
 
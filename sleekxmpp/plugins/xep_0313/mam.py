@@ -8,6 +8,8 @@
 """
 
 import logging
+import threading
+import collections
 
 import sleekxmpp
 from sleekxmpp.stanza import Message, Iq
@@ -152,6 +154,102 @@ class Archive_Query:
 
 
 
+class Archive_Stream(object):
+
+    """
+    Iterate over the messages matching an archive query as they arrive.
+
+    Results are requested one page at a time, and the next page is
+    only requested once the previous one has been consumed, so at most
+    one page of messages is held in memory regardless of the size of
+    the archive.
+
+    If a ``checkpoint`` name is given, the RSM id of the last message
+    of each consumed page is saved with the plugin's
+    ``set_checkpoint`` API, and a later stream with the same
+    checkpoint name resumes after it.
+    """
+
+    def __init__(self, plugin, start=None, end=None, with_jid=None,
+                 jid=None, checkpoint=None, page_size=None, timeout=None):
+        self._plugin = plugin
+        self._xmpp = plugin.xmpp
+        self.start = start
+        self.end = end
+        self.with_jid = with_jid
+        self.jid = jid
+        self.checkpoint = checkpoint
+        self.page_size = page_size or plugin.page_size
+        self.timeout = timeout
+
+        #: The RSM id of the last consumed message.
+        self.last_id = None
+        if checkpoint:
+            self.last_id = plugin.api['get_checkpoint'](jid, checkpoint)
+
+        #: The number of messages consumed so far.
+        self.count = 0
+        self.complete = False
+
+    def __iter__(self):
+        while not self.complete:
+            page, last_id = self._fetch()
+            while page:
+                self.count += 1
+                yield page.popleft()
+            if last_id:
+                self.last_id = last_id
+                if self.checkpoint:
+                    self._plugin.api['set_checkpoint'](
+                            self.jid, self.checkpoint, None, last_id)
+
+    def _fetch(self):
+        """Request the next page of results.
+
+        Returns the received messages, and the RSM id of the last one.
+        """
+        iq = self._xmpp.Iq()
+        iq['type'] = 'set'
+        if self.jid:
+            iq['to'] = self.jid
+        query_id = iq['id']
+        iq['mam']['queryid'] = query_id
+        if self.start:
+            iq['mam']['start'] = self.start
+        if self.end:
+            iq['mam']['end'] = self.end
+        if self.with_jid:
+            iq['mam']['with'] = self.with_jid
+        iq['mam']['rsm']['max'] = str(self.page_size)
+        if self.last_id:
+            iq['mam']['rsm']['after'] = self.last_id
+
+        # Results are collected while being read from the stream, so
+        # that all of them have arrived by the time the final answer
+        # is received.
+        page = collections.deque()
+        name = 'MAM_Stream_%s' % query_id
+        self._xmpp.register_handler(Callback(
+            name,
+            StanzaPath('message/mam_result@queryid=%s' % query_id),
+            page.append,
+            instream=True))
+        try:
+            response = iq.send(block=True, timeout=self.timeout)
+        finally:
+            self._xmpp.remove_handler(name)
+
+        answer = response['mam_answer']
+        last_id = answer['rsm']['last']
+        if not last_id and page:
+            last_id = page[-1]['mam_result']['id']
+        # The complete flag is an attribute of <fin/>, rather than the
+        # child element the stanza interface looks for.
+        complete = answer.xml.get('complete') in ('true', '1')
+        self.complete = complete or answer['complete'] or not page
+        return page, last_id
+
+
 class XEP_0313(BasePlugin):
 
     """
@@ -167,6 +265,13 @@ class XEP_0313(BasePlugin):
          'xep_0059',
          'xep_0297'])
     stanza = stanza
+    default_config = {
+        #: The number of messages requested per page when streaming.
+        'page_size': 50,
+        #: The maximum number of time ranges retrieved at once by
+        #: :meth:`retrieve_ranges`.
+        'max_parallel': 4
+    }
 
     def plugin_init(self):
         register_stanza_plugin(Iq, stanza.MAM)
@@ -183,6 +288,17 @@ class XEP_0313(BasePlugin):
             self.xmpp['xep_0297'].stanza.Forwarded)
 
         self._open_queries = {}
+        self._checkpoints = {}
+
+        self.api.register(self._default_get_checkpoint,
+                'get_checkpoint',
+                default=True)
+        self.api.register(self._default_set_checkpoint,
+                'set_checkpoint',
+                default=True)
+        self.api.register(self._default_del_checkpoint,
+                'del_checkpoint',
+                default=True)
 
     def retrieve(
         self, start=None, end=None, with_jid=None, continue_after=None,
@@ -217,6 +333,119 @@ class XEP_0313(BasePlugin):
 
     def __cleanup_callback(self, query):
         del self._open_queries[query.get_id()]
+
+    def stream(self, start=None, end=None, with_jid=None, jid=None,
+               checkpoint=None, page_size=None, timeout=None):
+        """
+        Return an iterator over the archived messages matching a query.
+
+        Messages are fetched one page at a time as the iterator is
+        consumed; see :class:`Archive_Stream`.
+
+        Arguments:
+            start      -- Optional datetime of the oldest message.
+            end        -- Optional datetime of the newest message.
+            with_jid   -- Optional JID of the conversation partner.
+            jid        -- Optional JID of the archive to query.
+            checkpoint -- Optional name under which to save progress,
+                          and from which to resume.
+            page_size  -- The number of messages to request at once.
+            timeout    -- The time to wait for each page.
+        """
+        return Archive_Stream(self, start, end, with_jid, jid,
+                              checkpoint, page_size, timeout)
+
+    def sync(self, callback, **kwargs):
+        """
+        Pass each archived message matching a query to a callback.
+
+        Accepts the same keyword arguments as :meth:`stream`, and
+        returns the number of messages retrieved.
+
+        Arguments:
+            callback -- Function accepting a result message.
+        """
+        results = self.stream(**kwargs)
+        for msg in results:
+            callback(msg)
+        return results.count
+
+    def retrieve_ranges(self, ranges, callback, checkpoint=None,
+                        max_parallel=None, **kwargs):
+        """
+        Retrieve several disjoint time ranges of an archive at once.
+
+        Each range is streamed separately, with up to ``max_parallel``
+        ranges in progress at once. The callback is called from several
+        threads and must be thread safe. Accepts the same keyword
+        arguments as :meth:`stream`, and returns the number of messages
+        retrieved.
+
+        Arguments:
+            ranges       -- A list of (start, end) datetime pairs, such
+                            as produced by :meth:`split_range`.
+            callback     -- Function accepting a result message.
+            checkpoint   -- Optional name under which to save the
+                            progress of each range.
+            max_parallel -- The maximum number of concurrent queries.
+        """
+        if max_parallel is None:
+            max_parallel = self.max_parallel
+        pending = collections.deque(ranges)
+        lock = threading.Lock()
+        errors = []
+        counts = []
+
+        def worker():
+            while not errors:
+                with lock:
+                    if not pending:
+                        return
+                    start, end = pending.popleft()
+                name = None
+                if checkpoint:
+                    name = '%s/%s/%s' % (checkpoint, start, end)
+                try:
+                    counts.append(self.sync(callback, start=start, end=end,
+                                            checkpoint=name, **kwargs))
+                except Exception as e:
+                    errors.append(e)
+
+        threads = []
+        for x in range(max(1, min(max_parallel, len(pending)))):
+            thread = threading.Thread(name='MAM range %s' % x, target=worker)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        return sum(counts)
+
+    @staticmethod
+    def split_range(start, end, parts):
+        """
+        Divide a time range into equal, consecutive ranges.
+
+        Arguments:
+            start -- The datetime at which the first range starts.
+            end   -- The datetime at which the last range ends.
+            parts -- The number of ranges to produce.
+        """
+        step = (end - start) / parts
+        bounds = [start + step * x for x in range(parts)] + [end]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _default_get_checkpoint(self, jid, node, ifrom, data):
+        return self._checkpoints.get((jid, node), None)
+
+    def _default_set_checkpoint(self, jid, node, ifrom, data):
+        self._checkpoints[(jid, node)] = data
+
+    def _default_del_checkpoint(self, jid, node, ifrom, data):
+        self._checkpoints.pop((jid, node), None)
         
 
 
@@ -79,7 +79,9 @@ class Device(object):
                                "done"   - Indicates that the readout is complete. May contain
                                           readout data.
                 timestamp_block -- [optional] Only applies when result != "error"
-                               The readout data. Structured as a dictionary:
+                               The readout data, or a list of readout data blocks
+                               to report many timestamps at once.
+                               Each block is structured as a dictionary:
                   {
                     timestamp:     timestamp for this datablock,
                     fields:        list of field dictionary (one per readout field).
@@ -143,6 +145,7 @@ class Device(object):
         from_flag = self._datetime_flag_parser(flags, 'from')
         to_flag = self._datetime_flag_parser(flags, 'to')
 
+        ts_blocks = []
         for ts in sorted(self.timestamp_data.keys()):
             tsdt = datetime.datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S")
             if not from_flag is None:
@@ -168,7 +171,10 @@ class Device(object):
 
             ts_block["timestamp"] = ts
             ts_block["fields"] = field_block
-            callback(session, result="fields", nodeId=self.nodeId, timestamp_block=ts_block)
+            ts_blocks.append(ts_block)
+
+        if ts_blocks:
+            callback(session, result="fields", nodeId=self.nodeId, timestamp_block=ts_blocks)
         callback(session, result="done", nodeId=self.nodeId, timestamp_block=None)
 
     def _datetime_flag_parser(self, flags, flagname):
@@ -231,6 +237,24 @@ class Device(object):
         self.timestamp_data[timestamp][name] = {"value": value, "flags": flags}
         return True
 
+    def _add_field_values(self, name, values, flags=None):
+        """
+        Adds a series of timestamped data to a field
+
+        Arguments:
+            name      -- Name of the field
+            values    -- Iterable of (timestamp, value) pairs, with timestamps
+                         as strings
+            flags     -- [optional] data classifier flags for the values, e.g. historical
+                         Formatted as a dictionary like { "flag name": "flag value" ... }
+        """
+        if not name in self.fields:
+            return False
+        for timestamp, value in values:
+            block = self.timestamp_data.setdefault(timestamp, {})
+            block[name] = {"value": value, "flags": flags}
+        return True
+
     def _add_field_momentary_data(self, name, value, flags=None):
         """
         Sets momentary data to a field
@@ -11,10 +11,9 @@
 import logging
 import time
 import datetime
-from threading import Thread, Lock, Timer
-
-from sleekxmpp.plugins.xep_0323.timerreset import TimerReset
+from threading import Lock, RLock
 
+from sleekxmpp.util import WorkerPool
 from sleekxmpp.xmlstream.handler import Callback
 from sleekxmpp.xmlstream.matcher import StanzaPath
 from sleekxmpp.plugins.base import BasePlugin
@@ -41,6 +40,14 @@ class XEP_0323(BasePlugin):
     Configuration Values:
         threaded -- Indicates if communication with sensors should be threaded.
                     Defaults to True.
+        max_workers -- The maximum number of threads used for device
+                    readouts when threaded. Defaults to 8.
+        batch_latency -- If set, readout data from all nodes of a request
+                    is collected for up to this many seconds and sent in
+                    a single fields message, instead of one message per
+                    device callback. Defaults to 0 (disabled).
+        batch_max_fields -- The maximum number of field values in a
+                    batched fields message. Defaults to 1000.
 
     Events:
         Sensor side
@@ -106,7 +113,10 @@ class XEP_0323(BasePlugin):
 
 
     default_config = {
-        'threaded': True
+        'threaded': True,
+        'max_workers': 8,
+        'batch_latency': 0,
+        'batch_max_fields': 1000
     }
 
     def plugin_init(self):
@@ -159,6 +169,13 @@ class XEP_0323(BasePlugin):
         self.last_seqnr = 0
         self.seqnr_lock = Lock()
 
+        # Readouts share a bounded pool of threads, and timeouts are
+        # kept by the stream's scheduler, instead of one thread each.
+        self.workers = WorkerPool(self.max_workers, name='xep_0323')
+
+        # Guards readout data queued for batched fields messages.
+        self.batch_lock = RLock()
+
         ## For testing only
         self.test_authenticated_from = ""
 
@@ -180,7 +197,10 @@ class XEP_0323(BasePlugin):
 
     def plugin_end(self):
         """ Stop the XEP-0323 plugin """
+        for session in list(self.sessions):
+            self._cancel_timers(session)
         self.sessions.clear()
+        self.workers.shutdown()
         self.xmpp.remove_handler('Sensordata Event:Req')
         self.xmpp.remove_handler('Sensordata Event:Accepted')
         self.xmpp.remove_handler('Sensordata Event:Rejected')
@@ -309,16 +329,12 @@ class XEP_0323(BasePlugin):
 
             if not request_delay_sec is None:
                 # Delay request to requested time
-                timer = Timer(request_delay_sec, self._event_delayed_req, args=(session, process_fields, req_flags))
-                self.sessions[session]["commTimers"]["delaytimer"] = timer
-                timer.start()
+                self._start_timer(session, "delaytimer", request_delay_sec,
+                                  self._event_delayed_req,
+                                  (session, process_fields, req_flags))
                 return
 
-            if self.threaded:
-                tr_req = Thread(target=self._threaded_node_request, args=(session, process_fields, req_flags))
-                tr_req.start()
-            else:
-                self._threaded_node_request(session, process_fields, req_flags)
+            self._node_request(session, process_fields, req_flags)
 
         else:
             iq.reply()
@@ -341,9 +357,10 @@ class XEP_0323(BasePlugin):
             self.sessions[session]["nodeDone"][node] = False
 
         for node in self.sessions[session]["node_list"]:
-            timer = TimerReset(self.nodes[node]['commTimeout'], self._event_comm_timeout, args=(session, node))
-            self.sessions[session]["commTimers"][node] = timer
-            timer.start()
+            if not session in self.sessions:
+                # Cancelled, or timed out, while starting the readouts.
+                return
+            self._reset_timer(session, node)
             self.nodes[node]['device'].request_fields(process_fields, flags=flags, session=session, callback=self._device_field_request_callback)
 
     def _event_comm_timeout(self, session, nodeId):
@@ -356,6 +373,10 @@ class XEP_0323(BasePlugin):
             session         -- The request session id
             nodeId          -- The id of the device which timed out
         """
+        if not session in self.sessions:
+            return
+        self._flush_batch(session)
+
         msg = self.xmpp.Message()
         msg['from'] = self.sessions[session]['to']
         msg['to'] = self.sessions[session]['from']
@@ -370,6 +391,7 @@ class XEP_0323(BasePlugin):
             msg['failure']['done'] = 'true'
         msg.send()
         # The session is complete, delete it
+        self._cancel_timers(session)
         del self.sessions[session]
 
     def _event_delayed_req(self, session, process_fields, req_flags):
@@ -382,17 +404,66 @@ class XEP_0323(BasePlugin):
             flags           -- [optional] flags to pass to the devices, e.g. momentary
                                Formatted as a dictionary like { "flag name": "flag value" ... }
         """
+        if not session in self.sessions:
+            return
+        self.sessions[session]["commTimers"].pop("delaytimer", None)
+
         msg = self.xmpp.Message()
         msg['from'] = self.sessions[session]['to']
         msg['to'] = self.sessions[session]['from']
         msg['started']['seqnr'] = self.sessions[session]['seqnr']
         msg.send()
 
+        self._node_request(session, process_fields, req_flags)
+
+    def _node_request(self, session, process_fields, flags):
+        """
+        Start the device readouts, in the worker pool if threaded.
+
+        Arguments:
+            session         -- The request session id
+            process_fields  -- The fields to request from the devices
+            flags           -- [optional] flags to pass to the devices, e.g. momentary
+                               Formatted as a dictionary like { "flag name": "flag value" ... }
+        """
         if self.threaded:
-            tr_req = Thread(target=self._threaded_node_request, args=(session, process_fields, req_flags))
-            tr_req.start()
+            self.workers.submit(self._threaded_node_request, session, process_fields, flags)
         else:
-            self._threaded_node_request(session, process_fields, req_flags)
+            self._threaded_node_request(session, process_fields, flags)
+
+    def _start_timer(self, session, name, seconds, callback, args):
+        """
+        Schedule a session timer, replacing any running timer of the
+        same name.
+
+        Arguments:
+            session         -- The request session id
+            name            -- The node id, or "delaytimer"
+            seconds         -- The time in seconds until the timer fires
+            callback        -- The function to execute
+            args            -- The arguments to pass to the callback
+        """
+        task = 'xep_0323 %s %s' % (session, name)
+        self.xmpp.scheduler.remove(task)
+        self.xmpp.schedule(task, seconds, callback, args)
+        self.sessions[session]["commTimers"][name] = task
+
+    def _reset_timer(self, session, nodeId):
+        """ Restart the communication timeout for a node. """
+        self._start_timer(session, nodeId, self.nodes[nodeId]['commTimeout'],
+                          self._event_comm_timeout, (session, nodeId))
+
+    def _cancel_timer(self, session, name):
+        """ Stop a session timer without firing it. """
+        task = self.sessions[session]["commTimers"].pop(name, None)
+        if task is not None:
+            self.xmpp.scheduler.remove(task)
+
+    def _cancel_timers(self, session):
+        """ Stop all of a session's timers. """
+        for task in self.sessions[session]["commTimers"].values():
+            self.xmpp.scheduler.remove(task)
+        self.sessions[session]["commTimers"].clear()
 
     def _all_nodes_done(self, session):
         """
@@ -444,7 +515,8 @@ class XEP_0323(BasePlugin):
             return
 
         if result == "error":
-            self.sessions[session]["commTimers"][nodeId].cancel()
+            self._cancel_timer(session, nodeId)
+            self._flush_batch(session)
 
             msg = self.xmpp.Message()
             msg['from'] = self.sessions[session]['to']
@@ -462,36 +534,137 @@ class XEP_0323(BasePlugin):
                 del self.sessions[session]
             msg.send()
         else:
-            msg = self.xmpp.Message()
-            msg['from'] = self.sessions[session]['to']
-            msg['to'] = self.sessions[session]['from']
-            msg['fields']['seqnr'] = self.sessions[session]['seqnr']
-
-            if timestamp_block is not None and len(timestamp_block) > 0:
-                node = msg['fields'].add_node(nodeId)
-                ts = node.add_timestamp(timestamp_block["timestamp"])
-
-                for f in timestamp_block["fields"]:
-                    data = ts.add_data( typename=f['type'],
-                                        name=f['name'],
-                                        value=f['value'],
-                                        unit=f['unit'],
-                                        dataType=f['dataType'],
-                                        flags=f['flags'])
-
-            if result == "done":
-                self.sessions[session]["commTimers"][nodeId].cancel()
+            if timestamp_block is None or len(timestamp_block) == 0:
+                blocks = []
+            elif isinstance(timestamp_block, dict):
+                blocks = [timestamp_block]
+            else:
+                blocks = list(timestamp_block)
+            done = result == "done"
+
+            if done:
+                self._cancel_timer(session, nodeId)
                 self.sessions[session]["nodeDone"][nodeId] = True
-                if (self._all_nodes_done(session)):
-                    # The session is complete, delete it
-                    del self.sessions[session]
-                    msg['fields']['done'] = 'true'
             else:
                 # Restart comm timer
-                self.sessions[session]["commTimers"][nodeId].reset()
+                self._reset_timer(session, nodeId)
+
+            if self.batch_latency:
+                self._batch_fields(session, nodeId, blocks)
+                return
 
+            # One message per timestamp block, the last one carrying
+            # the done flag when the readout is complete.
+            for block in blocks[:-1]:
+                self._fields_message(session, [(nodeId, block)]).send()
+            msg = self._fields_message(session, [(nodeId, b) for b in blocks[-1:]])
+            if done and self._all_nodes_done(session):
+                # The session is complete, delete it
+                del self.sessions[session]
+                msg['fields']['done'] = 'true'
             msg.send()
 
+    def _fields_message(self, session, blocks):
+        """
+        Compose a fields message from readout data.
+
+        Arguments:
+            session         -- The request session id
+            blocks          -- List of (nodeId, timestamp_block) tuples, see
+                               _device_field_request_callback
+        """
+        msg = self.xmpp.Message()
+        msg['from'] = self.sessions[session]['to']
+        msg['to'] = self.sessions[session]['from']
+        fields = msg['fields']
+        fields['seqnr'] = self.sessions[session]['seqnr']
+
+        nodes = {}
+        timestamps = {}
+        for nodeId, block in blocks:
+            key = (nodeId, block["timestamp"])
+            ts = timestamps.get(key)
+            if ts is None:
+                node = nodes.get(nodeId)
+                if node is None:
+                    node = nodes[nodeId] = fields.add_node(nodeId)
+                ts = timestamps[key] = node.add_timestamp(block["timestamp"])
+
+            for f in block["fields"]:
+                ts.add_data(typename=f['type'],
+                            name=f['name'],
+                            value=f['value'],
+                            unit=f['unit'],
+                            dataType=f['dataType'],
+                            flags=f['flags'])
+        return msg
+
+    def _batch_fields(self, session, nodeId, blocks):
+        """
+        Queue readout data to be sent in a combined fields message.
+
+        The queued data is sent once batch_latency seconds have passed
+        since the first block was queued, once it holds batch_max_fields
+        field values, or once all nodes are done.
+
+        Arguments:
+            session         -- The request session id
+            nodeId          -- The device id which supplied the data
+            blocks          -- List of timestamp blocks
+        """
+        with self.batch_lock:
+            if not session in self.sessions:
+                return
+            batch = self.sessions[session].setdefault("batch", [])
+            for block in blocks:
+                batch.append((nodeId, block))
+                self.sessions[session]["batch_fields"] = \
+                        self.sessions[session].get("batch_fields", 0) + \
+                        len(block["fields"])
+                if self.sessions[session]["batch_fields"] >= self.batch_max_fields:
+                    self._send_batch(session)
+                    batch = self.sessions[session]["batch"]
+
+            if self._all_nodes_done(session):
+                self._send_batch(session, done=True)
+                # The session is complete, delete it
+                self._cancel_timers(session)
+                del self.sessions[session]
+            elif batch and not "batch" in self.sessions[session]["commTimers"]:
+                self._start_timer(session, "batch", self.batch_latency,
+                                  self._flush_batch, (session,))
+
+    def _flush_batch(self, session):
+        """
+        Send any queued readout data for a session.
+
+        Arguments:
+            session         -- The request session id
+        """
+        with self.batch_lock:
+            if not session in self.sessions:
+                return
+            self._cancel_timer(session, "batch")
+            if self.sessions[session].get("batch"):
+                self._send_batch(session)
+
+    def _send_batch(self, session, done=False):
+        """
+        Send the queued readout data for a session. The batch lock
+        must be held.
+
+        Arguments:
+            session         -- The request session id
+            done            -- Mark the message as the last one of the readout
+        """
+        self._cancel_timer(session, "batch")
+        msg = self._fields_message(session, self.sessions[session].get("batch", []))
+        self.sessions[session]["batch"] = []
+        self.sessions[session]["batch_fields"] = 0
+        if done:
+            msg['fields']['done'] = 'true'
+        msg.send()
+
     def _handle_event_cancel(self, iq):
         """ Received Iq with cancel - this is a cancel request.
         Delete the session and confirm. """
@@ -501,8 +674,7 @@ class XEP_0323(BasePlugin):
         for s in self.sessions:
             if self.sessions[s]['from'] == iq['from'] and self.sessions[s]['to'] == iq['to'] and self.sessions[s]['seqnr'] == seqnr:
                 # found it. Cancel all timers
-                for n in self.sessions[s]["commTimers"]:
-                    self.sessions[s]["commTimers"][n].cancel()
+                self._cancel_timers(s)
 
                 # Confirm
                 iq.reply()
@@ -609,7 +609,10 @@ class Timestamp(ElementBase):
             dataObj['stringIds'] = stringIds
 
             if flags is not None:
-                dataObj._set_flags(flags)
+                # The element is new, so only the given flags need setting.
+                for f in flags:
+                    if f in dataObj._flags:
+                        dataObj[f] = flags[f]
 
             self._datas.add(name)
             self.iterables.append(dataObj)
@@ -10,8 +10,9 @@
 
 import logging
 import time
-from threading import Thread, Timer, Lock
+from threading import Lock
 
+from sleekxmpp.util import WorkerPool
 from sleekxmpp.xmlstream.handler import Callback
 from sleekxmpp.xmlstream.matcher import StanzaPath
 from sleekxmpp.plugins.base import BasePlugin
@@ -42,6 +43,8 @@ class XEP_0325(BasePlugin):
     Configuration Values:
         threaded -- Indicates if communication with sensors should be threaded.
                     Defaults to True.
+        max_workers -- The maximum number of threads used for device
+                    commands when threaded. Defaults to 8.
 
     Events:
         Sensor side
@@ -106,7 +109,8 @@ class XEP_0325(BasePlugin):
 
 
     default_config = {
-        'threaded': True
+        'threaded': True,
+        'max_workers': 8
 #        'session_db': None
     }
 
@@ -140,6 +144,10 @@ class XEP_0325(BasePlugin):
         self.last_seqnr = 0
         self.seqnr_lock = Lock()
 
+        # Commands share a bounded pool of threads, and timeouts are
+        # kept by the stream's scheduler, instead of one thread each.
+        self.workers = WorkerPool(self.max_workers, name='xep_0325')
+
         ## For testning only
         self.test_authenticated_from = ""
 
@@ -155,7 +163,10 @@ class XEP_0325(BasePlugin):
 
     def plugin_end(self):
         """ Stop the XEP-0325 plugin """
+        for session in list(self.sessions):
+            self._cancel_timers(session)
         self.sessions.clear()
+        self.workers.shutdown()
         self.xmpp.remove_handler('Control Event:DirectSet')
         self.xmpp.remove_handler('Control Event:SetReq')
         self.xmpp.remove_handler('Control Event:SetResponse')
@@ -262,13 +273,7 @@ class XEP_0325(BasePlugin):
             self.sessions[session]["reply"] = True
 
             self.sessions[session]["node_list"] = process_nodes
-            if self.threaded:
-                #print("starting thread")
-                tr_req = Thread(target=self._threaded_node_request, args=(session, process_fields))
-                tr_req.start()
-                #print("started thread")
-            else:
-                self._threaded_node_request(session, process_fields)
+            self._node_request(session, process_fields)
 
         else:
             iq.reply()
@@ -329,14 +334,34 @@ class XEP_0325(BasePlugin):
             self.sessions[session]["reply"] = False
 
             self.sessions[session]["node_list"] = process_nodes
-            if self.threaded:
-                #print("starting thread")
-                tr_req = Thread(target=self._threaded_node_request, args=(session, process_fields))
-                tr_req.start()
-                #print("started thread")
-            else:
-                self._threaded_node_request(session, process_fields)
+            self._node_request(session, process_fields)
+
+
+    def _node_request(self, session, process_fields):
+        """
+        Start the device commands, in the worker pool if threaded.
+
+        Arguments:
+            session         -- The request session id
+            process_fields  -- The fields to set in the devices. List of tuple format:
+                               (name, datatype, value)
+        """
+        if self.threaded:
+            self.workers.submit(self._threaded_node_request, session, process_fields)
+        else:
+            self._threaded_node_request(session, process_fields)
 
+    def _cancel_timer(self, session, nodeId):
+        """ Stop a node's communication timeout without firing it. """
+        task = self.sessions[session]["commTimers"].pop(nodeId, None)
+        if task is not None:
+            self.xmpp.scheduler.remove(task)
+
+    def _cancel_timers(self, session):
+        """ Stop all of a session's communication timeouts. """
+        for task in self.sessions[session]["commTimers"].values():
+            self.xmpp.scheduler.remove(task)
+        self.sessions[session]["commTimers"].clear()
 
     def _threaded_node_request(self, session, process_fields):
         """
@@ -351,9 +376,13 @@ class XEP_0325(BasePlugin):
             self.sessions[session]["nodeDone"][node] = False
 
         for node in self.sessions[session]["node_list"]:
-            timer = Timer(self.nodes[node]['commTimeout'], self._event_comm_timeout, args=(session, node))
-            self.sessions[session]["commTimers"][node] = timer
-            timer.start()
+            if not session in self.sessions:
+                # Timed out while starting the commands.
+                return
+            task = 'xep_0325 %s %s' % (session, node)
+            self.xmpp.schedule(task, self.nodes[node]['commTimeout'],
+                               self._event_comm_timeout, (session, node))
+            self.sessions[session]["commTimers"][node] = task
             self.nodes[node]['device'].set_control_fields(process_fields, session=session, callback=self._device_set_command_callback)
 
     def _event_comm_timeout(self, session, nodeId):
@@ -367,6 +396,9 @@ class XEP_0325(BasePlugin):
             session         -- The request session id
             nodeId          -- The id of the device which timed out
         """
+        if not session in self.sessions:
+            return
+        self.sessions[session]["commTimers"].pop(nodeId, None)
 
         if self.sessions[session]["reply"]:
             # Reply is exected when we are done
@@ -425,7 +457,7 @@ class XEP_0325(BasePlugin):
             return
 
         if result == "error":
-            self.sessions[session]["commTimers"][nodeId].cancel()
+            self._cancel_timer(session, nodeId)
 
             if self.sessions[session]["reply"]:
                 # Reply is exected when we are done
@@ -448,7 +480,7 @@ class XEP_0325(BasePlugin):
                     # The session is complete, delete it
                     del self.sessions[session]
         else:
-            self.sessions[session]["commTimers"][nodeId].cancel()
+            self._cancel_timer(session, nodeId)
 
             self.sessions[session]["nodeDone"][nodeId] = True
             if (self._all_nodes_done(session)):
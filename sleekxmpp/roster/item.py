@@ -6,6 +6,8 @@
     See the file LICENSE for copying permission.
 """
 
+from sleekxmpp.xmlstream import JID
+
 
 class RosterItem(object):
 
@@ -104,6 +106,9 @@ class RosterItem(object):
         handle_probe        -- Handle a presence probe query.
     """
 
+    #: State fields which are tracked by the roster node's indexes.
+    indexed_fields = ('groups', 'from', 'to', 'pending_in', 'pending_out')
+
     def __init__(self, xmpp, jid, owner=None,
                  state=None, db=None, roster=None):
         """
@@ -138,6 +143,13 @@ class RosterItem(object):
         self._db_state = {}
         self.load()
 
+    @property
+    def _key(self):
+        """Return the bare JID used to store this item in its roster."""
+        if isinstance(self.jid, JID):
+            return self.jid.bare
+        return self.jid
+
     def set_backend(self, db=None, save=True):
         """
         Set the datastore interface object for the roster item.
@@ -217,6 +229,8 @@ class RosterItem(object):
             else:
                 value = str(value).lower()
                 self._state[key] = value in ('true', '1', 'on', 'yes')
+            if key in self.indexed_fields and self.roster is not None:
+                self.roster._index(self._key)
         else:
             raise KeyError
 
@@ -358,6 +372,8 @@ class RosterItem(object):
         old_show = self.resources[resource].get('show', None)
         self.resources[resource].update(data)
         if got_online:
+            if self.roster is not None:
+                self.roster._set_available(self._key, True)
             self.xmpp.event('got_online', presence)
         if old_show != presence['show'] or old_status != presence['status']:
             self.xmpp.event('changed_status', presence)
@@ -370,6 +386,8 @@ class RosterItem(object):
             del self.resources[resource]
         self.xmpp.event('changed_status', presence)
         if not self.resources:
+            if self.roster is not None:
+                self.roster._set_available(self._key, False)
             self.xmpp.event('got_offline', presence)
 
     def handle_subscribe(self, presence):
@@ -492,6 +510,8 @@ class RosterItem(object):
         a roster reset request.
         """
         self.resources = {}
+        if self.roster is not None:
+            self.roster._set_available(self._key, False)
 
     def __repr__(self):
         return repr(self._state)
@@ -35,15 +35,31 @@ class RosterNode(object):
                           to all contact JIDs.
 
     Methods:
-        add           -- Add a JID to the roster.
-        update        -- Update a JID's subscription information.
-        subscribe     -- Subscribe to a JID.
-        unsubscribe   -- Unsubscribe from a JID.
-        remove        -- Remove a JID from the roster.
-        presence      -- Return presence information for a JID's resources.
-        send_presence -- Shortcut for sending a presence stanza.
+        add             -- Add a JID to the roster.
+        update          -- Update a JID's subscription information.
+        subscribe       -- Subscribe to a JID.
+        unsubscribe     -- Unsubscribe from a JID.
+        remove          -- Remove a JID from the roster.
+        presence        -- Return presence information for a JID's resources.
+        send_presence   -- Shortcut for sending a presence stanza.
+        by_group        -- Return the JIDs in a roster group.
+        by_subscription -- Return the JIDs with a given subscription state.
+        available       -- Return the JIDs with at least one online resource.
+
+    The group, subscription and availability queries are answered from
+    indexes that are kept up to date as roster items change, instead
+    of walking every item in the roster.
     """
 
+    #: Subscription states tracked by the subscription index, in
+    #: addition to the values returned by RosterItem['subscription'].
+    pending_states = ('pending_in', 'pending_out')
+
+    #: Presence types which are only ever sent to a single recipient,
+    #: and are never broadcast to subscribed contacts.
+    directed_types = ('subscribe', 'subscribed', 'unsubscribe',
+                      'unsubscribed', 'probe', 'error')
+
     def __init__(self, xmpp, jid, db=None):
         """
         Create a roster node for a JID.
@@ -63,6 +79,12 @@ class RosterNode(object):
         self._jids = {}
         self._last_status_lock = threading.Lock()
 
+        self._index_lock = threading.Lock()
+        self._indexed = {}
+        self._groups = {}
+        self._subscriptions = {}
+        self._available = set()
+
         if self.db:
             if hasattr(self.db, 'version'):
                 self._version = self.db.version(self.jid)
@@ -111,6 +133,7 @@ class RosterNode(object):
         key = key.bare
         if key in self._jids:
             del self._jids[key]
+            self._unindex(key)
 
     def __len__(self):
         """Return the number of JIDs referenced by the roster."""
@@ -126,18 +149,110 @@ class RosterNode(object):
 
     def groups(self):
         """Return a dictionary mapping group names to JIDs."""
-        result = {}
-        for jid in self._jids:
-            groups = self._jids[jid]['groups']
-            if not groups:
-                if '' not in result:
-                    result[''] = []
-                result[''].append(jid)
+        with self._index_lock:
+            return dict((group, list(jids)) for group, jids
+                        in self._groups.items())
+
+    def by_group(self, group):
+        """
+        Return a list of the JIDs that belong to a roster group.
+
+        JIDs which are not in any group are listed under the
+        empty group name ''.
+
+        Arguments:
+            group -- The name of the roster group.
+        """
+        with self._index_lock:
+            return list(self._groups.get(group, ()))
+
+    def by_subscription(self, *states):
+        """
+        Return a list of the JIDs that have any of the given
+        subscription states.
+
+        Arguments:
+            states -- One or more of: 'none', 'to', 'from', 'both',
+                      'pending_in', or 'pending_out'.
+        """
+        result = set()
+        with self._index_lock:
+            for state in states:
+                result.update(self._subscriptions.get(state, ()))
+        return list(result)
+
+    def available(self):
+        """Return a list of the JIDs with at least one online resource."""
+        with self._index_lock:
+            return list(self._available)
+
+    def _index(self, key):
+        """
+        Add or refresh a roster item's entries in the group and
+        subscription indexes.
+
+        Arguments:
+            key -- The bare JID used to store the roster item.
+        """
+        item = self._jids.get(key, None)
+        if item is None:
+            return
+        groups = tuple(item['groups']) or ('',)
+        states = [item['subscription']]
+        for state in self.pending_states:
+            if item[state]:
+                states.append(state)
+        entry = (groups, tuple(states))
+
+        with self._index_lock:
+            if self._indexed.get(key) == entry:
+                return
+            self._drop_index(key)
+            self._indexed[key] = entry
             for group in groups:
-                if group not in result:
-                    result[group] = []
-                result[group].append(jid)
-        return result
+                self._groups.setdefault(group, set()).add(key)
+            for state in states:
+                self._subscriptions.setdefault(state, set()).add(key)
+
+    def _unindex(self, key):
+        """
+        Remove a roster item from all indexes.
+
+        Arguments:
+            key -- The bare JID used to store the roster item.
+        """
+        with self._index_lock:
+            self._drop_index(key)
+            self._available.discard(key)
+
+    def _drop_index(self, key):
+        """Remove a key from the group and subscription indexes.
+
+        The caller must hold self._index_lock.
+        """
+        groups, states = self._indexed.pop(key, ((), ()))
+        for index, values in ((self._groups, groups),
+                              (self._subscriptions, states)):
+            for value in values:
+                jids = index.get(value)
+                if jids is not None:
+                    jids.discard(key)
+                    if not jids:
+                        del index[value]
+
+    def _set_available(self, key, available):
+        """
+        Mark a roster item as having online resources, or not.
+
+        Arguments:
+            key       -- The bare JID used to store the roster item.
+            available -- True if the JID has at least one resource online.
+        """
+        with self._index_lock:
+            if available and key in self._jids:
+                self._available.add(key)
+            else:
+                self._available.discard(key)
 
     def __iter__(self):
         """Iterate over the roster items."""
@@ -194,6 +309,9 @@ class RosterNode(object):
         else:
             key = jid
 
+        if key in self._jids:
+            self._unindex(key)
+
         state = {'name': name,
                  'groups': groups or [],
                  'from': afrom,
@@ -205,6 +323,7 @@ class RosterNode(object):
         self._jids[key] = RosterItem(self.xmpp, jid, self.jid,
                                      state=state, db=self.db,
                                      roster=self)
+        self._index(key)
         if save:
             self._jids[key].save()
 
@@ -304,6 +423,8 @@ class RosterNode(object):
         """
         for jid in self:
             self[jid].reset()
+        with self._index_lock:
+            self._available.clear()
 
     def send_presence(self, **kwargs):
         """
@@ -313,6 +434,10 @@ class RosterNode(object):
         Otherwise, forward the send request to the recipient's roster
         entry for processing.
 
+        Components do not have their presence broadcast by the server,
+        so a presence without a recipient is sent directly to each
+        contact with a 'from' or 'both' subscription instead.
+
         Arguments:
             pshow     -- The presence's show value.
             pstatus   -- The presence's status message.
@@ -325,6 +450,12 @@ class RosterNode(object):
         """
         if self.xmpp.is_component and not kwargs.get('pfrom', ''):
             kwargs['pfrom'] = self.jid
+        if self.xmpp.is_component and not kwargs.get('pto', '') and \
+           kwargs.get('ptype', None) not in self.directed_types:
+            for jid in self.by_subscription('from', 'both'):
+                kwargs['pto'] = jid
+                self.xmpp.send_presence(**kwargs)
+            return
         self.xmpp.send_presence(**kwargs)
 
     def send_last_presence(self):
@@ -10,7 +10,7 @@ from sleekxmpp.stanza.rootstanza import RootStanza
 from sleekxmpp.xmlstream import StanzaBase, ET
 from sleekxmpp.xmlstream.handler import Waiter, Callback
 from sleekxmpp.xmlstream.matcher import MatchIDSender, MatcherId
-from sleekxmpp.exceptions import IqTimeout, IqError
+from sleekxmpp.exceptions import IqTimeout, IqError, RateLimited
 
 
 class Iq(RootStanza):
@@ -190,6 +190,9 @@ class Iq(RootStanza):
                         response has been received with the originally-sent IQ
                         stanza.  Only called if there is a callback parameter
                         (and therefore are in async mode).
+
+        When a callback is given, returns the name of its handler, or
+        False if the stanza was dropped by the stream's rate limits.
         """
         if timeout is None:
             timeout = self.stream.response_timeout
@@ -222,12 +225,29 @@ class Iq(RootStanza):
                                    callback,
                                    once=True)
             self.stream.register_handler(handler)
-            StanzaBase.send(self, now=now)
+            try:
+                sent = StanzaBase.send(self, now=now)
+            except RateLimited:
+                self._cancel_response(handler_name)
+                raise
+            if sent is False:
+                # Dropped by the rate limits, so no reply will come.
+                self._cancel_response(handler_name)
+                if timeout_callback:
+                    self.timeout_callback(self)
+                return False
             return handler_name
         elif block and self['type'] in ('get', 'set'):
             waitfor = Waiter('IqWait_%s' % self['id'], matcher)
             self.stream.register_handler(waitfor)
-            StanzaBase.send(self, now=now)
+            try:
+                sent = StanzaBase.send(self, now=now)
+            except RateLimited:
+                self.stream.remove_handler(waitfor.name)
+                raise
+            if sent is False:
+                self.stream.remove_handler(waitfor.name)
+                raise IqTimeout(self)
             result = waitfor.wait(timeout)
             if not result:
                 raise IqTimeout(self)
@@ -237,6 +257,11 @@ class Iq(RootStanza):
         else:
             return StanzaBase.send(self, now=now)
 
+    def _cancel_response(self, handler_name):
+        """Remove the response handler of an Iq which was not sent."""
+        self.stream.remove_handler(handler_name)
+        self.stream.scheduler.remove('IqTimeout_%s' % self['id'])
+
     def _handle_result(self, iq):
         # we got the IQ, so don't fire the timeout
         self.stream.scheduler.remove('IqTimeout_%s' % self['id'])
@@ -8,7 +8,8 @@
 
 import logging
 
-from sleekxmpp.exceptions import XMPPError, IqError, IqTimeout
+from sleekxmpp.exceptions import XMPPError, IqError, IqTimeout, \
+                                 RateLimited
 from sleekxmpp.stanza import Error
 from sleekxmpp.xmlstream import ET, StanzaBase, register_stanza_plugin
 
@@ -41,7 +42,11 @@ class RootStanza(StanzaBase):
         Arguments:
             e -- Exception object
         """
-        if isinstance(e, IqError):
+        if isinstance(e, RateLimited):
+            # The failure was local, and a reply would only be
+            # held back by the same rate limits.
+            log.warning('You should catch RateLimited exceptions')
+        elif isinstance(e, IqError):
             # We received an Iq error reply, but it wasn't caught
             # locally. Using the condition/text from that error
             # response could leak too much information, so we'll
@@ -0,0 +1,95 @@
+"""
+    SleekXMPP: The Sleek XMPP Library
+    Copyright (C) 2010 Nathanael C. Fritz, Lance J.T. Stout
+    This file is part of SleekXMPP.
+
+    See the file LICENSE for copying permission.
+"""
+
+import os
+import sys
+import subprocess
+
+
+def measure_imports(module='sleekxmpp', python=None, runs=3):
+    """
+    Measure the import time of a module and everything it imports,
+    using a fresh interpreter started with ``-X importtime``.
+
+    Requires Python 3.7 or later. The first run only warms the
+    bytecode cache; of the remaining runs, the fastest time for
+    each module is kept.
+
+    Arguments:
+        module -- The name of the module to import.
+        python -- The interpreter to use. Defaults to the current one.
+        runs   -- The number of timed imports.
+
+    Returns a dictionary mapping module names to tuples of the time
+    spent importing the module itself and the cumulative time
+    including its own imports, in microseconds.
+    """
+    if python is None:
+        python = sys.executable
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    subprocess.check_call([python, '-c', 'import %s' % module], env=env)
+
+    costs = {}
+    for run in range(runs):
+        proc = subprocess.Popen([python, '-X', 'importtime',
+                                 '-c', 'import %s' % module],
+                                env=env, stderr=subprocess.PIPE)
+        _, err = proc.communicate()
+        for line in err.decode('utf-8').splitlines():
+            if not line.startswith('import time:'):
+                continue
+            fields = line[len('import time:'):].split('|')
+            try:
+                own, cumulative = int(fields[0]), int(fields[1])
+            except ValueError:
+                # The column headers.
+                continue
+            name = fields[2].strip()
+            if name in costs:
+                own = min(own, costs[name][0])
+                cumulative = min(cumulative, costs[name][1])
+            costs[name] = (own, cumulative)
+    return costs
+
+
+def audit_imports(budgets, module='sleekxmpp', python=None, runs=3):
+    """
+    Check the cumulative import times of modules against budgets.
+
+    Arguments:
+        budgets -- A dictionary mapping module names to the largest
+                   allowed cumulative import time in microseconds.
+                   A budget of ``0`` means that the module must not
+                   be imported at all.
+        module  -- The name of the module to import.
+        python  -- The interpreter to use. Defaults to the current one.
+        runs    -- The number of timed imports.
+
+    Returns a list of (name, time, budget) tuples for each module
+    that exceeded its budget.
+    """
+    costs = measure_imports(module, python, runs)
+    over = []
+    for name, budget in sorted(budgets.items()):
+        if name not in costs:
+            continue
+        cumulative = costs[name][1]
+        if budget == 0 or cumulative > budget:
+            over.append((name, cumulative, budget))
+    return over
+
+
+if __name__ == '__main__':
+    module = sys.argv[1] if len(sys.argv) > 1 else 'sleekxmpp'
+    costs = measure_imports(module)
+    print('%10s %10s  %s' % ('self [us]', 'cumul [us]', 'module'))
+    for name, (own, cumulative) in sorted(costs.items(),
+                                          key=lambda item: item[1][1]):
+        print('%10d %10d  %s' % (own, cumulative, name))
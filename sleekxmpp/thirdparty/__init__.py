@@ -1,10 +1,46 @@
+import sys
 from collections import OrderedDict
+from importlib import import_module
 
-try:
-    from gnupg import GPG
-except:
-    from sleekxmpp.thirdparty.gnupg import GPG
-
-from sleekxmpp.thirdparty import socks
-from sleekxmpp.thirdparty.mini_dateutil import tzutc, tzoffset, parse_iso
 from sleekxmpp.thirdparty.orderedset import OrderedSet
+
+
+def _load_gpg():
+    try:
+        from gnupg import GPG
+    except:
+        from sleekxmpp.thirdparty.gnupg import GPG
+    return GPG
+
+
+def _load_socks():
+    return import_module('sleekxmpp.thirdparty.socks')
+
+
+def _load_dateutil(name):
+    return getattr(import_module('sleekxmpp.thirdparty.mini_dateutil'), name)
+
+
+#: Names which are only imported when first used, since few
+#: applications need them and they are slow to import.
+_DEFERRED = {
+    'GPG': _load_gpg,
+    'socks': _load_socks,
+    'tzutc': lambda: _load_dateutil('tzutc'),
+    'tzoffset': lambda: _load_dateutil('tzoffset'),
+    'parse_iso': lambda: _load_dateutil('parse_iso'),
+}
+
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _DEFERRED:
+            raise AttributeError(
+                    "module %r has no attribute %r" % (__name__, name))
+        value = _DEFERRED[name]()
+        globals()[name] = value
+        return value
+else:
+    GPG = _load_gpg()
+    socks = _load_socks()
+    from sleekxmpp.thirdparty.mini_dateutil import tzutc, tzoffset, parse_iso
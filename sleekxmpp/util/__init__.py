@@ -13,6 +13,7 @@
 from sleekxmpp.util.misc_ops import bytes, unicode, hashes, hash, \
                                     num_to_bytes, bytes_to_num, quote, \
                                     XOR, safedict
+from sleekxmpp.util.pool import WorkerPool
 
 
 # =====================================================================
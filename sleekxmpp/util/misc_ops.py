@@ -1,5 +1,4 @@
 import sys
-import hashlib
 
 
 def unicode(text):
@@ -35,8 +34,8 @@ def bytes(text):
         if isinstance(text, builtins.bytes):
             # We already have bytes, so do nothing
             return text
-        if isinstance(text, list):
-            # Convert a list of integers to bytes
+        if isinstance(text, (list, bytearray)):
+            # Convert a list or bytearray of integers to bytes
             return builtins.bytes(text)
         else:
             # Convert UTF-8 text to bytes
@@ -89,13 +88,8 @@ def XOR(x, y):
     :param bytes y: A byte string
     :rtype: bytes
     """
-    result = b''
-    for a, b in zip(x, y):
-        if sys.version_info < (3, 0):
-            result += chr((ord(a) ^ ord(b)))
-        else:
-            result += bytes([a ^ b])
-    return result
+    result = bytearray(a ^ b for a, b in zip(bytearray(x), bytearray(y)))
+    return bytes(result)
 
 
 def hash(name):
@@ -107,6 +101,7 @@ def hash(name):
 
     :rtype: function
     """
+    import hashlib
     name = name.lower()
     if name.startswith('sha-'):
         name = 'sha' + name[4:]
@@ -121,6 +116,7 @@ def hashes():
 
     :rtype: list of strings
     """
+    import hashlib
     t = []
     if 'md5' in dir(hashlib):
         t = ['MD5']
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+    sleekxmpp.util.pool
+    ~~~~~~~~~~~~~~~~~~~
+
+    Part of SleekXMPP: The Sleek XMPP Library
+
+    :copyright: (c) 2012 Nathanael C. Fritz, Lance J.T. Stout
+    :license: MIT, see LICENSE for more details
+"""
+
+import logging
+import threading
+import collections
+
+
+log = logging.getLogger(__name__)
+
+
+class WorkerPool(object):
+
+    """
+    A bounded pool of daemon threads for running blocking jobs.
+
+    Threads are started on demand, up to ``size`` of them, and exit
+    after ``idle_timeout`` seconds without work. Jobs submitted while
+    every thread is busy wait in a FIFO queue.
+
+    :param int size: The maximum number of worker threads.
+    :param string name: A prefix for the worker thread names.
+    :param idle_timeout: Seconds an idle worker waits before exiting.
+    """
+
+    def __init__(self, size=8, name='worker', idle_timeout=5.0):
+        self.size = max(1, size)
+        self.name = name
+        self.idle_timeout = idle_timeout
+
+        self._jobs = collections.deque()
+        self._cond = threading.Condition()
+        self._threads = set()
+        self._idle = 0
+        self._count = 0
+        self._closed = False
+
+    def __len__(self):
+        """The number of jobs waiting for a worker."""
+        return len(self._jobs)
+
+    @property
+    def threads(self):
+        """The number of running worker threads."""
+        return len(self._threads)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue a call to ``func`` with the given arguments.
+
+        :param func: The function to run in a worker thread.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Worker pool %s is shut down' % self.name)
+            self._jobs.append((func, args, kwargs))
+            if self._idle:
+                self._cond.notify()
+            # Idle workers which were notified but have not woken up
+            # yet are still counted, so start a new worker whenever
+            # they can not take every queued job.
+            if len(self._jobs) > self._idle and \
+                    len(self._threads) < self.size:
+                self._count += 1
+                thread = threading.Thread(
+                        name='%s_%s' % (self.name, self._count),
+                        target=self._work)
+                thread.daemon = True
+                self._threads.add(thread)
+                thread.start()
+
+    def shutdown(self, cancel=True):
+        """
+        Stop accepting jobs and let the worker threads exit.
+
+        :param bool cancel: If ``True``, queued jobs which have not
+                            started yet are discarded.
+        """
+        with self._cond:
+            self._closed = True
+            if cancel:
+                self._jobs.clear()
+            self._cond.notify_all()
+
+    def _work(self):
+        thread = threading.current_thread()
+        while True:
+            with self._cond:
+                if not self._jobs and not self._closed:
+                    self._idle += 1
+                    self._cond.wait(self.idle_timeout)
+                    self._idle -= 1
+                if not self._jobs:
+                    self._threads.discard(thread)
+                    return
+                func, args, kwargs = self._jobs.popleft()
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                log.exception('Error in %s job', self.name)
@@ -18,6 +18,8 @@
 import sys
 import hmac
 import random
+import hashlib
+import threading
 
 from base64 import b64encode, b64decode
 
@@ -189,6 +191,20 @@ class SCRAM(Mech):
     optional_credentials = set(['authzid', 'channel_binding'])
     security = set(['encrypted', 'unencrypted_scram'])
 
+    #: Derived SCRAM keys, shared by all SCRAM instances so that
+    #: reconnecting with the same credentials skips the expensive
+    #: PBKDF2 key derivation. Maps (hash name, password digest, salt,
+    #: iteration count) to (SaltedPassword, ClientKey, ServerKey).
+    key_cache = {}
+    key_cache_size = 1024
+    _key_cache_lock = threading.Lock()
+
+    @classmethod
+    def clear_key_cache(cls):
+        """Forget all cached SCRAM keys."""
+        with cls._key_cache_lock:
+            cls.key_cache.clear()
+
     def setup(self, name):
         self.use_channel_binding = False
         if name[-5:] == '-PLUS':
@@ -212,6 +228,9 @@ class SCRAM(Mech):
 
     def Hi(self, text, salt, iterations):
         text = bytes(text)
+        if hasattr(hashlib, 'pbkdf2_hmac'):
+            return hashlib.pbkdf2_hmac(self.hash().name, text,
+                                       salt, iterations)
         ui1 = self.HMAC(text, salt + b'\0\0\0\01')
         ui = ui1
         for i in range(iterations - 1):
@@ -219,6 +238,26 @@ class SCRAM(Mech):
             ui = XOR(ui, ui1)
         return ui
 
+    def derive_keys(self, password, salt, iterations):
+        """
+        Return the SaltedPassword, ClientKey, and ServerKey values
+        for a password, reusing previously derived values if the
+        same salt and iteration count have been seen before.
+        """
+        password = bytes(password)
+        key = (self.hash_name, self.H(password), salt, iterations)
+        keys = self.key_cache.get(key, None)
+        if keys is None:
+            salted_password = self.Hi(password, salt, iterations)
+            keys = (salted_password,
+                    self.HMAC(salted_password, b'Client Key'),
+                    self.HMAC(salted_password, b'Server Key'))
+            with self._key_cache_lock:
+                if len(self.key_cache) >= self.key_cache_size:
+                    self.key_cache.clear()
+                self.key_cache[key] = keys
+        return keys
+
     def H(self, text):
         return self.hash(text).digest()
 
@@ -295,17 +334,16 @@ class SCRAM(Mech):
         client_final_message_without_proof = channel_binding + b',' + \
                                              b'r=' + nonce
 
-        salted_password = self.Hi(self.credentials['password'],
-                                       salt,
-                                       iteration_count)
-        client_key = self.HMAC(salted_password, b'Client Key')
+        salted_password, client_key, server_key = self.derive_keys(
+                self.credentials['password'],
+                salt,
+                iteration_count)
         stored_key = self.H(client_key)
         auth_message = self.client_first_message_bare + b',' + \
                        challenge + b',' + \
                        client_final_message_without_proof
         client_signature = self.HMAC(stored_key, auth_message)
         client_proof = XOR(client_key, client_signature)
-        server_key = self.HMAC(salted_password, b'Server Key')
 
         self.server_signature = self.HMAC(server_key, auth_message)
 
@@ -1,4 +1,6 @@
+import hashlib
 import logging
+import threading
 from datetime import datetime, timedelta
 
 # Make a call to strptime before starting threads to
@@ -43,6 +45,15 @@ except ImportError:
 log = logging.getLogger(__name__)
 
 
+#: The maximum number of successful verifications to remember.
+VERIFY_CACHE_SIZE = 256
+
+#: Successful verifications, keyed by the expected name and certificate
+#: digest, mapped to the certificate's expiration date.
+_verified = {}
+_verified_lock = threading.Lock()
+
+
 class CertificateError(Exception):
     pass
 
@@ -156,11 +167,25 @@ def verify(expected, raw_cert):
                     "SSL certificate COULD NOT BE VERIFIED.")
         return
 
+    key = (expected, hashlib.sha256(raw_cert).digest())
+    now = datetime.utcnow()
+    with _verified_lock:
+        expires = _verified.get(key)
+    if expires is not None and expires > now:
+        return True
+
+    not_after = _verify(expected, raw_cert, now)
+    with _verified_lock:
+        if len(_verified) >= VERIFY_CACHE_SIZE:
+            _verified.clear()
+        _verified[key] = not_after
+    return True
+
+
+def _verify(expected, raw_cert, now):
     not_before, not_after = extract_dates(raw_cert)
     cert_names = extract_names(raw_cert)
 
-    now = datetime.utcnow()
-
     if not_before > now:
         raise CertificateError(
                 'Certificate has not entered its valid date range.')
@@ -177,26 +202,26 @@ def verify(expected, raw_cert):
 
     for name in cert_names['XMPPAddr']:
         if name == expected:
-            return True
+            return not_after
     for name in cert_names['SRV']:
         if name == expected_srv or name == expected:
-            return True
+            return not_after
     for name in cert_names['DNS']:
         if name == expected:
-            return True
+            return not_after
         if name.startswith('*'):
             if '.' in name:
                 name_wild = name[name.index('.'):]
             else:
                 name_wild = name
             if expected_wild == name_wild:
-                return True
+                return not_after
     for name in cert_names['URI']:
         if name == expected:
-            return True
+            return not_after
     for name in cert_names['CN']:
         if name == expected:
-            return True
+            return not_after
 
     raise CertificateError(
             'Could not match certificate against hostname: %s' % expected)
@@ -11,6 +11,8 @@
 import socket
 import logging
 import random
+import threading
+import time
 
 
 log = logging.getLogger(__name__)
@@ -41,6 +43,181 @@ except ImportError as e:
               "Not all features will be available")
 
 
+class DNSCache(object):
+
+    """A thread-safe cache of DNS query results.
+
+    Answers are kept for the TTL given by the DNS server, or for
+    :attr:`default_ttl` seconds when the TTL is not known, such as
+    when using the built-in :mod:`socket` resolver, which may cache
+    answers itself. Empty answers are kept for :attr:`negative_ttl`
+    seconds. Answers from different resolvers are cached separately.
+
+    Concurrent queries for the same record are coalesced so that only
+    one of them reaches the DNS server, and if a query fails, an
+    expired answer will be used for up to :attr:`stale_ttl` seconds
+    past its expiration.
+
+    Records listed in :attr:`overrides` are returned without
+    consulting the cache or DNS, which is useful for testing. Keys
+    are ``(rdtype, name)`` tuples, such as ``('A', 'example.com')``
+    or ``('SRV', '_xmpp-client._tcp.example.com')``. Values are lists
+    of address literals for A and AAAA records, and lists of
+    ``(host, port)`` pairs in connection order for SRV records.
+
+    :param int default_ttl: Seconds to keep answers without a TTL.
+    :param int negative_ttl: Seconds to keep empty answers.
+    :param int stale_ttl: Seconds past expiration that an answer may
+                          be used if DNS queries fail.
+    :param int max_entries: The maximum number of cached answers.
+    """
+
+    def __init__(self, default_ttl=30, negative_ttl=30, stale_ttl=3600,
+                 max_entries=1024):
+        #: If set to ``False``, every lookup is sent to DNS.
+        self.enabled = True
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+        #: Static answers which take precedence over DNS.
+        self.overrides = {}
+
+        #: The number of lookups answered from the cache, sent to DNS,
+        #: answered by a concurrent query for the same record, and
+        #: answered with an expired record after a failed query.
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pending = {}
+
+    def stats(self):
+        """Return a dictionary of the cache hit and miss counters."""
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'coalesced': self.coalesced,
+                    'stale': self.stale,
+                    'entries': len(self._entries)}
+
+    def override(self, rdtype, name, records):
+        """Set a static answer for a record.
+
+        :param rdtype: The record type: ``'A'``, ``'AAAA'``, or ``'SRV'``.
+        :param name: The queried name. SRV names include the
+                     service and protocol labels.
+        :param records: The answer to return, or ``None`` to remove
+                        the override.
+        """
+        key = (rdtype, name.lower())
+        if records is None:
+            self.overrides.pop(key, None)
+        else:
+            self.overrides[key] = list(records)
+
+    def clear(self):
+        """Discard all cached answers and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.coalesced = self.stale = 0
+
+    def lookup(self, rdtype, name, query, source=None):
+        """Return the answer for a record, querying DNS if needed.
+
+        :param rdtype: The record type.
+        :param name: The queried name.
+        :param query: A callable performing the DNS query, which
+                      returns a ``(records, ttl)`` tuple, where ``ttl``
+                      may be ``None`` if not known, or returns ``None``
+                      if the query failed.
+        :param source: The resolver answering the query, such as a
+                       :class:`dns.resolver.Resolver` object, or
+                       ``None`` for the built-in :mod:`socket` resolver.
+        """
+        if (rdtype, name.lower()) in self.overrides:
+            return list(self.overrides[(rdtype, name.lower())])
+        key = (rdtype, name.lower(), source)
+
+        if not self.enabled:
+            result = query()
+            return [] if result is None else result[0]
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self.hits += 1
+                return list(entry[0])
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _PendingQuery()
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            pending.done.wait()
+            return list(pending.records)
+
+        result = None
+        try:
+            result = query()
+        finally:
+            with self._lock:
+                now = time.time()
+                if result is None:
+                    entry = self._entries.get(key)
+                    if entry is not None and \
+                       entry[1] + self.stale_ttl > now:
+                        log.debug("DNS: Using expired %s records for %s",
+                                  rdtype, name)
+                        self.stale += 1
+                        records = entry[0]
+                    else:
+                        records = []
+                else:
+                    records, ttl = result
+                    if ttl is None:
+                        ttl = self.default_ttl
+                    if not records:
+                        ttl = min(ttl, self.negative_ttl)
+                    self._store(key, records, now + ttl)
+                pending.records = records
+                del self._pending[key]
+                pending.done.set()
+        return list(records)
+
+    def _store(self, key, records, expires):
+        self._entries[key] = (records, expires)
+        if len(self._entries) <= self.max_entries:
+            return
+        now = time.time()
+        for old, (_, old_expires) in list(self._entries.items()):
+            if old_expires + self.stale_ttl <= now:
+                del self._entries[old]
+        while len(self._entries) > self.max_entries:
+            oldest = min(self._entries, key=lambda k: self._entries[k][1])
+            del self._entries[oldest]
+
+
+class _PendingQuery(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.records = []
+
+
+#: The process-wide DNS cache used by :func:`get_A`, :func:`get_AAAA`
+#: and :func:`get_SRV`.
+cache = DNSCache()
+
+
 def default_resolver():
     """Return a basic DNS resolver object.
 
@@ -173,6 +350,19 @@ def get_A(host, resolver=None, use_dnspython=True):
 
     :return: A list of IPv4 literals.
     """
+    return cache.lookup('A', host,
+                        lambda: _query_A(host, resolver, use_dnspython),
+                        _source(resolver, use_dnspython))
+
+
+def _source(resolver, use_dnspython):
+    """Return the cache source of queries using the given settings."""
+    if resolver is None or not use_dnspython:
+        return None
+    return resolver
+
+
+def _query_A(host, resolver, use_dnspython):
     log.debug("DNS: Querying %s for A records." % host)
 
     # If not using dnspython, attempt lookup using the OS level
@@ -181,25 +371,25 @@ def get_A(host, resolver=None, use_dnspython=True):
         try:
             recs = socket.getaddrinfo(host, None, socket.AF_INET,
                                                   socket.SOCK_STREAM)
-            return [rec[4][0] for rec in recs]
+            return [rec[4][0] for rec in recs], None
         except socket.gaierror:
             log.debug("DNS: Error retreiving A address info for %s." % host)
-            return []
+            return None
 
     # Using dnspython:
     try:
         recs = resolver.query(host, dns.rdatatype.A)
-        return [rec.to_text() for rec in recs]
+        return [rec.to_text() for rec in recs], recs.rrset.ttl
     except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
         log.debug("DNS: No A records for %s" % host)
-        return []
+        return [], None
     except dns.exception.Timeout:
         log.debug("DNS: A record resolution timed out for %s" % host)
-        return []
+        return None
     except dns.exception.DNSException as e:
         log.debug("DNS: Error querying A records for %s" % host)
         log.exception(e)
-        return []
+        return None
 
 
 def get_AAAA(host, resolver=None, use_dnspython=True):
@@ -220,37 +410,43 @@ def get_AAAA(host, resolver=None, use_dnspython=True):
 
     :return: A list of IPv6 literals.
     """
+    if (resolver is None or not use_dnspython) and not socket.has_ipv6:
+        log.debug("Unable to query %s for AAAA records: IPv6 is not supported", host)
+        return []
+    return cache.lookup('AAAA', host,
+                        lambda: _query_AAAA(host, resolver, use_dnspython),
+                        _source(resolver, use_dnspython))
+
+
+def _query_AAAA(host, resolver, use_dnspython):
     log.debug("DNS: Querying %s for AAAA records." % host)
 
     # If not using dnspython, attempt lookup using the OS level
     # getaddrinfo() method.
     if resolver is None or not use_dnspython:
-        if not socket.has_ipv6:
-            log.debug("Unable to query %s for AAAA records: IPv6 is not supported", host)
-            return []
         try:
             recs = socket.getaddrinfo(host, None, socket.AF_INET6,
                                                   socket.SOCK_STREAM)
-            return [rec[4][0] for rec in recs]
+            return [rec[4][0] for rec in recs], None
         except (OSError, socket.gaierror):
             log.debug("DNS: Error retreiving AAAA address " + \
                       "info for %s." % host)
-            return []
+            return None
 
     # Using dnspython:
     try:
         recs = resolver.query(host, dns.rdatatype.AAAA)
-        return [rec.to_text() for rec in recs]
+        return [rec.to_text() for rec in recs], recs.rrset.ttl
     except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
         log.debug("DNS: No AAAA records for %s" % host)
-        return []
+        return [], None
     except dns.exception.Timeout:
         log.debug("DNS: AAAA record resolution timed out for %s" % host)
-        return []
+        return None
     except dns.exception.DNSException as e:
         log.debug("DNS: Error querying AAAA records for %s" % host)
         log.exception(e)
-        return []
+        return None
 
 
 def get_SRV(host, port, service, proto='tcp', resolver=None, use_dnspython=True):
@@ -279,36 +475,29 @@ def get_SRV(host, port, service, proto='tcp', resolver=None, use_dnspython=True)
     :return: A list of hostname, port pairs in the order dictacted
              by SRV priorities and weights.
     """
+    name = '_%s._%s.%s' % (service, proto, host)
+    if ('SRV', name.lower()) in cache.overrides:
+        return cache.lookup('SRV', name, None)
+
     if resolver is None or not use_dnspython:
         log.warning("DNS: dnspython not found. Can not use SRV lookup.")
         return [(host, port)]
 
-    log.debug("DNS: Querying SRV records for %s" % host)
-    try:
-        recs = resolver.query('_%s._%s.%s' % (service, proto, host),
-                              dns.rdatatype.SRV)
-    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
-        log.debug("DNS: No SRV records for %s." % host)
-        return [(host, port)]
-    except dns.exception.Timeout:
-        log.debug("DNS: SRV record resolution timed out for %s." % host)
-        return [(host, port)]
-    except dns.exception.DNSException as e:
-        log.debug("DNS: Error querying SRV records for %s." % host)
-        log.exception(e)
-        return [(host, port)]
-
-    if len(recs) == 1 and recs[0].target == '.':
+    recs = cache.lookup('SRV', name,
+                        lambda: _query_SRV(host, name, resolver),
+                        resolver)
+    if not recs:
         return [(host, port)]
 
     answers = {}
     for rec in recs:
-        if rec.priority not in answers:
-            answers[rec.priority] = []
-        if rec.weight == 0:
-            answers[rec.priority].insert(0, rec)
+        priority, weight, target, rec_port = rec
+        if priority not in answers:
+            answers[priority] = []
+        if weight == 0:
+            answers[priority].insert(0, rec)
         else:
-            answers[rec.priority].append(rec)
+            answers[priority].append(rec)
 
     sorted_recs = []
     for priority in sorted(answers.keys()):
@@ -316,18 +505,46 @@ def get_SRV(host, port, service, proto='tcp', resolver=None, use_dnspython=True)
             running_sum = 0
             sums = {}
             for rec in answers[priority]:
-                running_sum += rec.weight
+                running_sum += rec[1]
                 sums[running_sum] = rec
 
             selected = random.randint(0, running_sum + 1)
             for running_sum in sums:
                 if running_sum >= selected:
                     rec = sums[running_sum]
-                    host = rec.target.to_text()
-                    if host.endswith('.'):
-                        host = host[:-1]
-                    sorted_recs.append((host, rec.port))
+                    sorted_recs.append((rec[2], rec[3]))
                     answers[priority].remove(rec)
                     break
 
     return sorted_recs
+
+
+def _query_SRV(host, name, resolver):
+    """Query SRV records, returning (priority, weight, target, port) tuples.
+
+    An empty list means the service is not available over SRV.
+    """
+    log.debug("DNS: Querying SRV records for %s" % host)
+    try:
+        recs = resolver.query(name, dns.rdatatype.SRV)
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+        log.debug("DNS: No SRV records for %s." % host)
+        return [], None
+    except dns.exception.Timeout:
+        log.debug("DNS: SRV record resolution timed out for %s." % host)
+        return None
+    except dns.exception.DNSException as e:
+        log.debug("DNS: Error querying SRV records for %s." % host)
+        log.exception(e)
+        return None
+
+    if len(recs) == 1 and recs[0].target == '.':
+        return [], recs.rrset.ttl
+
+    results = []
+    for rec in recs:
+        target = rec.target.to_text()
+        if target.endswith('.'):
+            target = target[:-1]
+        results.append((rec.priority, rec.weight, target, rec.port))
+    return results, recs.rrset.ttl
@@ -13,12 +13,11 @@
 """
 
 import time
+import heapq
 import threading
 import logging
 import itertools
 
-from sleekxmpp.util import Queue, QueueEmpty
-
 
 #: The time in seconds to wait for events from the event queue, and also the
 #: time between checks for the process stop signal.
@@ -98,6 +97,12 @@ class Scheduler(object):
     A threaded scheduler that allows for updates mid-execution unlike the
     scheduler in the standard library.
 
+    Tasks are kept in a heap ordered by execution time, with an index
+    by name, so that adding and removing a task costs O(log n) and O(1)
+    respectively regardless of how many timers are pending. Removed
+    tasks are discarded lazily once they reach the front of the heap,
+    or when they make up the majority of it.
+
     Based on: http://docs.python.org/library/sched.html#module-sched
 
     :param parentstop: An :class:`~threading.Event` to signal stopping
@@ -105,12 +110,13 @@ class Scheduler(object):
     """
 
     def __init__(self, parentstop=None):
-        #: A queue for storing tasks
-        self.addq = Queue()
-
-        #: A list of tasks in order of execution time.
+        #: A heap of ``(next, sequence, task)`` entries in order of
+        #: execution time.
         self.schedule = []
 
+        #: The pending tasks, indexed by name.
+        self.tasks = {}
+
         #: If running in threaded mode, this will be the thread processing
         #: the schedule.
         self.thread = None
@@ -125,10 +131,19 @@ class Scheduler(object):
         #: Lock for accessing the task queue.
         self.schedule_lock = threading.RLock()
 
+        #: Signalled when a task is added, so that an earlier deadline
+        #: is noticed without waiting for the current one.
+        self.schedule_cond = threading.Condition(self.schedule_lock)
+
         #: The time in seconds to wait for events from the event queue,
         #: and also the time between checks for the process stop signal.
         self.wait_timeout = WAIT_TIMEOUT
 
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.tasks)
+
     def process(self, threaded=True, daemon=False):
         """Begin accepting and processing scheduled tasks.
 
@@ -148,57 +163,52 @@ class Scheduler(object):
         self.run = True
         try:
             while self.run and not self.stop.is_set():
-                updated = False
-                if self.schedule:
-                    wait = self.schedule[0].next - time.time()
-                else:
-                    wait = self.wait_timeout
-                try:
-                    if wait <= 0.0:
-                        newtask = self.addq.get(False)
-                    else:
-                        newtask = None
-                        while self.run and \
-                              not self.stop.is_set() and \
-                              newtask is None and \
-                              wait > 0:
-                            try:
-                                newtask = self.addq.get(True, min(wait, self.wait_timeout))
-                            except QueueEmpty:          # Nothing to add, nothing to do. Check run flags and continue waiting.
-                                wait -= self.wait_timeout
-                except QueueEmpty:                      # Time to run some tasks, and no new tasks to add.
-                    self.schedule_lock.acquire()
-                    # select only those tasks which are to be executed now
-                    relevant = itertools.takewhile(
-                        lambda task: time.time() >= task.next, self.schedule)
-                    # run the tasks and keep the return value in a tuple
-                    status = map(lambda task: (task, task.run()), relevant)
-                    # remove non-repeating tasks
-                    for task, doRepeat in status:
-                        if not doRepeat:
-                            try:
-                                self.schedule.remove(task)
-                            except ValueError:
-                                pass
+                with self.schedule_cond:
+                    due = self._pop_due(time.time())
+                    if not due:
+                        if self.schedule:
+                            wait = self.schedule[0][0] - time.time()
+                            wait = min(wait, self.wait_timeout)
                         else:
-                            # only need to resort tasks if a repeated task has
-                            # been kept in the list.
-                            updated = True
-                else:                                   # Add new task
-                    self.schedule_lock.acquire()
-                    if newtask is not None:
-                        self.schedule.append(newtask)
-                        updated = True
-                finally:
-                    if updated:
-                        self.schedule.sort(key=lambda task: task.next)
-                    self.schedule_lock.release()
+                            wait = self.wait_timeout
+                        if wait > 0:
+                            self.schedule_cond.wait(wait)
+                        continue
+
+                for task in due:
+                    with self.schedule_lock:
+                        if self.tasks.get(task.name) is not task:
+                            # Removed or replaced since it was due.
+                            continue
+                        if not task.repeat:
+                            # Free the name before running, so that the
+                            # callback may schedule it again.
+                            del self.tasks[task.name]
+                    if task.run():
+                        with self.schedule_lock:
+                            if self.tasks.get(task.name) is task:
+                                self._push(task)
         except KeyboardInterrupt:
             self.run = False
         except SystemExit:
             self.run = False
         log.debug("Quitting Scheduler thread")
 
+    def _pop_due(self, now):
+        """Remove and return the live tasks whose time has come.
+
+        Must be called while holding the schedule lock.
+        """
+        due = []
+        while self.schedule and self.schedule[0][0] <= now:
+            task = heapq.heappop(self.schedule)[2]
+            if self.tasks.get(task.name) is task:
+                due.append(task)
+        return due
+
+    def _push(self, task):
+        heapq.heappush(self.schedule, (task.next, next(self._sequence), task))
+
     def add(self, name, seconds, callback, args=None,
             kwargs=None, repeat=False, qpointer=None):
         """Schedule a new task.
@@ -213,18 +223,15 @@ class Scheduler(object):
         :param pointer: A pointer to an event queue for queuing callback
                         execution instead of executing immediately.
         """
-        try:
-            self.schedule_lock.acquire()
-            for task in self.schedule:
-                if task.name == name:
-                    raise ValueError("Key %s already exists" % name)
-
-            self.addq.put(Task(name, seconds, callback, args,
-                               kwargs, repeat, qpointer))
-        except:
-            raise
-        finally:
-            self.schedule_lock.release()
+        with self.schedule_cond:
+            if name in self.tasks:
+                raise ValueError("Key %s already exists" % name)
+            task = Task(name, seconds, callback, args,
+                        kwargs, repeat, qpointer)
+            self.tasks[name] = task
+            self._push(task)
+            if self.schedule[0][2] is task:
+                self.schedule_cond.notify()
 
     def remove(self, name):
         """Remove a scheduled task ahead of schedule, and without
@@ -232,19 +239,16 @@ class Scheduler(object):
 
         :param string name: The name of the task to remove.
         """
-        try:
-            self.schedule_lock.acquire()
-            the_task = None
-            for task in self.schedule:
-                if task.name == name:
-                    the_task = task
-            if the_task is not None:
-                self.schedule.remove(the_task)
-        except:
-            raise
-        finally:
-            self.schedule_lock.release()
+        with self.schedule_lock:
+            if self.tasks.pop(name, None) is None:
+                return
+            if len(self.schedule) > 2 * len(self.tasks) + 64:
+                self.schedule = [entry for entry in self.schedule
+                                 if self.tasks.get(entry[2].name) is entry[2]]
+                heapq.heapify(self.schedule)
 
     def quit(self):
         """Shutdown the scheduler."""
         self.run = False
+        with self.schedule_cond:
+            self.schedule_cond.notify()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+    sleekxmpp.xmlstream.sendqueue
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    This module provides the outgoing data queue, which is split into
+    lanes of different priority.
+
+    Part of SleekXMPP: The Sleek XMPP Library
+
+    :copyright: (c) 2011 Nathanael C. Fritz
+    :license: MIT, see LICENSE for more details
+"""
+
+import time
+import threading
+import collections
+
+from sleekxmpp.util import QueueEmpty
+
+
+#: The outbound lanes, in the order they are served within a round.
+LANES = ('control', 'interactive', 'bulk')
+
+
+class SendQueue(object):
+
+    """
+    A queue of outgoing data, split into lanes which are drained
+    with weighted round robin.
+
+    Within each round, every non-empty lane may yield up to its
+    weight in items, with lanes visited in the order given by
+    :data:`LANES`. Control data, such as Iq results and stream
+    management acks, thus waits behind at most a few items from
+    the other lanes, no matter how many bulk items are queued.
+
+    Adding items never blocks. Instead, producers which should be
+    held back when a lane is full call :meth:`wait_for_space`
+    first, so that data which must be queued in a particular order
+    may be added while holding a lock.
+
+    :param weights: Optional mapping of lane names to the number of
+                    items taken from that lane per round.
+    :param maxsizes: Optional mapping of lane names to the number
+                     of items at which the lane is considered full.
+                     A size of ``0`` means no limit.
+    """
+
+    def __init__(self, weights=None, maxsizes=None):
+        #: The number of items taken from each lane per round.
+        self.weights = {'control': 8, 'interactive': 4, 'bulk': 1}
+        self.weights.update(weights or {})
+
+        #: The number of items at which each lane is full.
+        self.maxsizes = {'control': 0, 'interactive': 256, 'bulk': 256}
+        self.maxsizes.update(maxsizes or {})
+
+        #: Counters per lane of the items sent, and the total and
+        #: largest time in seconds that they spent waiting.
+        self.stats = dict((lane, {'sent': 0, 'wait': 0.0, 'max_wait': 0.0})
+                          for lane in LANES)
+
+        self._lanes = dict((lane, collections.deque()) for lane in LANES)
+        self._credit = dict(self.weights)
+        self._size = 0
+        self._unfinished = 0
+        self._cond = threading.Condition()
+        self._space = threading.Condition(self._cond)
+        self._done = threading.Condition(self._cond)
+
+    def qsize(self, lane=None):
+        """Return the number of queued items, in a lane or in total."""
+        if lane is None:
+            return self._size
+        return len(self._lanes[lane])
+
+    def empty(self):
+        return self._size == 0
+
+    def full(self, lane):
+        """Return ``True`` if a lane holds its maximum number of items."""
+        maxsize = self.maxsizes.get(lane, 0)
+        return maxsize > 0 and len(self._lanes[lane]) >= maxsize
+
+    def wait_for_space(self, lane, timeout=None):
+        """Block until a lane is not full.
+
+        :param string lane: The lane name.
+        :param timeout: The time in seconds to wait, or ``None``
+                        to wait indefinitely.
+        :returns: ``True`` if the lane has room.
+        """
+        with self._cond:
+            if timeout is None:
+                while self.full(lane):
+                    self._space.wait()
+                return True
+            end = time.time() + timeout
+            while self.full(lane):
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return False
+                self._space.wait(remaining)
+            return True
+
+    def put(self, item, lane='interactive'):
+        """Add an item to the end of a lane.
+
+        A ``None`` item wakes the consumer without being counted
+        as unfinished work.
+
+        :param item: The data to send.
+        :param string lane: The lane name.
+        """
+        with self._cond:
+            self._lanes[lane].append((time.time(), item))
+            self._size += 1
+            if item is not None:
+                self._unfinished += 1
+            self._cond.notify()
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the next item to send.
+
+        :raises QueueEmpty: If no item is available in time.
+        """
+        with self._cond:
+            if not block:
+                if not self._size:
+                    raise QueueEmpty
+            elif timeout is None:
+                while not self._size:
+                    self._cond.wait()
+            else:
+                end = time.time() + timeout
+                while not self._size:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        raise QueueEmpty
+                    self._cond.wait(remaining)
+
+            lane = self._next_lane()
+            queued, item = self._lanes[lane].popleft()
+            self._size -= 1
+            self._credit[lane] -= 1
+
+            wait = time.time() - queued
+            stats = self.stats[lane]
+            stats['sent'] += 1
+            stats['wait'] += wait
+            stats['max_wait'] = max(stats['max_wait'], wait)
+
+            self._space.notify_all()
+            return item
+
+    def _next_lane(self):
+        """Pick the lane to take the next item from.
+
+        Must be called while holding the lock, with items queued.
+        """
+        for x in range(2):
+            for lane in LANES:
+                if self._lanes[lane] and self._credit[lane] > 0:
+                    return lane
+            # Every lane with items has used its share of this round.
+            self._credit.update(self.weights)
+        for lane in LANES:
+            if self._lanes[lane]:
+                return lane
+
+    def task_done(self):
+        """Mark an item returned by :meth:`get` as sent."""
+        with self._cond:
+            self._unfinished -= 1
+            if self._unfinished <= 0:
+                self._unfinished = 0
+                self._done.notify_all()
+
+    def join(self):
+        """Block until every queued item has been sent."""
+        with self._cond:
+            while self._unfinished:
+                self._done.wait()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+    sleekxmpp.xmlstream.shaper
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    This module provides token bucket rate shaping for outgoing
+    stanzas, so that a stream can stay within a server's karma
+    limits instead of being throttled or disconnected.
+
+    Part of SleekXMPP: The Sleek XMPP Library
+
+    :copyright: (c) 2011 Nathanael C. Fritz
+    :license: MIT, see LICENSE for more details
+"""
+
+import time
+import threading
+
+
+#: The ways of handling a stanza which exceeds the rate limits.
+SHAPING_MODES = ('wait', 'drop', 'fail')
+
+
+class TokenBucket(object):
+
+    """
+    A bucket of tokens which refills at a constant rate.
+
+    Tokens may be taken beyond what the bucket holds, leaving it in
+    debt until enough time has passed to pay it off.
+
+    :param rate: The number of tokens added per second.
+    :param burst: The largest number of tokens the bucket holds.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.time()
+
+    def refill(self, now):
+        if now > self.stamp:
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+
+    def delay(self, amount, now):
+        """Return the seconds until ``amount`` tokens are available."""
+        self.refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / float(self.rate)
+
+    def take(self, amount, now):
+        self.refill(now)
+        self.tokens -= amount
+
+    @property
+    def idle(self):
+        return self.tokens >= self.burst
+
+
+class RateShaper(object):
+
+    """
+    Limits the rate of outgoing stanzas and bytes, both for the
+    stream as a whole and per destination JID.
+
+    Every limit is optional, and the shaper does nothing until at
+    least one of them is set. A stanza is admitted once a stanza
+    token is available and no byte bucket is in debt; its serialized
+    size is charged afterwards with :meth:`charge`, since the size
+    is not known until then.
+
+    A stanza which can not be admitted right away is handled
+    according to the shaping mode:
+
+    ``'wait'``
+        Block the sender until the stanza fits, shedding it instead
+        if that would take longer than :attr:`max_delay`.
+    ``'drop'``
+        Shed the stanza.
+    ``'fail'``
+        Shed the stanza, and let the sender raise an error.
+
+    :param bytes_per_sec: The stream's outbound bytes per second.
+    :param stanzas_per_sec: The stream's outbound stanzas per second.
+    :param jid_bytes_per_sec: Bytes per second to any single JID.
+    :param jid_stanzas_per_sec: Stanzas per second to any single JID.
+    :param burst: The seconds worth of traffic which may be sent at
+                  once after being idle.
+    :param mode: The default shaping mode.
+    :param max_delay: The longest time in seconds to hold a stanza
+                      in ``'wait'`` mode, or ``None`` for no limit.
+    """
+
+    def __init__(self, bytes_per_sec=None, stanzas_per_sec=None,
+                 jid_bytes_per_sec=None, jid_stanzas_per_sec=None,
+                 burst=1.0, mode='wait', max_delay=None):
+        self.bytes_per_sec = bytes_per_sec
+        self.stanzas_per_sec = stanzas_per_sec
+        self.jid_bytes_per_sec = jid_bytes_per_sec
+        self.jid_stanzas_per_sec = jid_stanzas_per_sec
+        self.burst = burst
+        self.mode = mode
+        self.max_delay = max_delay
+
+        #: The maximum number of per JID buckets kept before idle
+        #: ones are discarded.
+        self.max_jids = 1024
+
+        #: Counters of the stanzas admitted, how many of them were
+        #: delayed and for how long in total and at most, and how
+        #: many were dropped or failed.
+        self.stats = {'sent': 0, 'delayed': 0,
+                      'delay': 0.0, 'max_delay': 0.0,
+                      'dropped': 0, 'failed': 0}
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return any((self.bytes_per_sec, self.stanzas_per_sec,
+                    self.jid_bytes_per_sec, self.jid_stanzas_per_sec))
+
+    def _bucket(self, key, rate):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_jids:
+                now = time.time()
+                for old_key, old in list(self._buckets.items()):
+                    old.refill(now)
+                    if old.idle:
+                        del self._buckets[old_key]
+            bucket = TokenBucket(rate, rate * self.burst)
+            self._buckets[key] = bucket
+        else:
+            bucket.rate = rate
+            bucket.burst = rate * self.burst
+        return bucket
+
+    def _limits(self, jid):
+        """Yield the active buckets and their kind for a JID."""
+        for key, rate, kind in ((('stanzas', None), self.stanzas_per_sec, 's'),
+                                (('bytes', None), self.bytes_per_sec, 'b'),
+                                (('stanzas', jid), self.jid_stanzas_per_sec, 's'),
+                                (('bytes', jid), self.jid_bytes_per_sec, 'b')):
+            if rate and (jid or key[1] is None):
+                yield self._bucket(key, rate), kind
+
+    def _try(self, jid, now):
+        """Admit a stanza if possible, or return the required delay.
+
+        Must be called while holding the lock.
+        """
+        delay = 0.0
+        buckets = list(self._limits(jid))
+        for bucket, kind in buckets:
+            delay = max(delay, bucket.delay(1 if kind == 's' else 0, now))
+        if delay <= 0:
+            for bucket, kind in buckets:
+                if kind == 's':
+                    bucket.take(1, now)
+        return delay
+
+    def admit(self, jid, mode=None, stop=None):
+        """Wait for, or refuse, permission to send a stanza.
+
+        :param string jid: The destination JID, or ``None``.
+        :param string mode: The shaping mode, instead of :attr:`mode`.
+        :param stop: An optional :class:`threading.Event` which ends
+                     any waiting when set.
+        :returns: ``None`` if the stanza may be sent, otherwise the
+                  delay in seconds after which it could have been.
+        """
+        mode = mode or self.mode
+        start = time.time()
+        while True:
+            with self._lock:
+                now = time.time()
+                delay = self._try(jid, now)
+                if delay <= 0:
+                    waited = now - start
+                    self.stats['sent'] += 1
+                    if waited > 0.001:
+                        self.stats['delayed'] += 1
+                        self.stats['delay'] += waited
+                        self.stats['max_delay'] = max(
+                                self.stats['max_delay'], waited)
+                    return None
+                waited = now - start
+                if mode != 'wait' or (self.max_delay is not None and
+                                      waited + delay > self.max_delay):
+                    if mode == 'fail':
+                        self.stats['failed'] += 1
+                    else:
+                        self.stats['dropped'] += 1
+                    return delay
+            if stop is None:
+                time.sleep(delay)
+            elif stop.wait(delay):
+                with self._lock:
+                    self.stats['dropped'] += 1
+                return delay
+
+    def charge(self, jid, size):
+        """Charge the serialized size of an admitted stanza.
+
+        :param string jid: The destination JID, or ``None``.
+        :param int size: The number of bytes sent.
+        """
+        with self._lock:
+            now = time.time()
+            for bucket, kind in self._limits(jid):
+                if kind == 'b':
+                    bucket.take(size, now)
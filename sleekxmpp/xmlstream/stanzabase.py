@@ -1457,6 +1457,11 @@ class StanzaBase(ElementBase):
     #: A basic set of allowed values for the ``'type'`` interface.
     types = set(('get', 'set', 'error', None, 'unavailable', 'normal', 'chat'))
 
+    #: An optional hint for the send queue lane used for this stanza,
+    #: one of ``'control'``, ``'interactive'`` or ``'bulk'``. See
+    #: :meth:`~sleekxmpp.xmlstream.xmlstream.XMLStream.send_lane`.
+    lane = None
+
     def __init__(self, stream=None, xml=None, stype=None,
                  sto=None, sfrom=None, sid=None, parent=None):
         self.stream = stream
@@ -1579,8 +1584,10 @@ class StanzaBase(ElementBase):
         :param bool now: Indicates if the queue should be skipped and the
                          stanza sent immediately. Useful for stream
                          initialization. Defaults to ``False``.
+        :returns: ``False`` if the stanza was dropped by the stream's
+                  rate limits.
         """
-        self.stream.send(self, now=now)
+        return self.stream.send(self, now=now)
 
     def __copy__(self):
         """Return a copy of the stanza object that does not share the
@@ -15,6 +15,7 @@
 from __future__ import with_statement, unicode_literals
 
 import base64
+import binascii
 import copy
 import logging
 import signal
@@ -24,20 +25,24 @@ import sys
 import threading
 import time
 import random
+import select
 import weakref
-import uuid
 import errno
+import os
 
 from xml.parsers.expat import ExpatError
 
 import sleekxmpp
 from sleekxmpp.util import Queue, QueueEmpty, safedict
 from sleekxmpp.thirdparty.statemachine import StateMachine
-from sleekxmpp.xmlstream import Scheduler, tostring, cert
+from sleekxmpp.xmlstream import Scheduler, tostring
 from sleekxmpp.xmlstream.stanzabase import StanzaBase, ET, ElementBase
 from sleekxmpp.xmlstream.handler import Waiter, XMLCallback
 from sleekxmpp.xmlstream.matcher import MatchXMLMask
 from sleekxmpp.xmlstream.resolver import resolve, default_resolver
+from sleekxmpp.xmlstream.sendqueue import SendQueue
+from sleekxmpp.xmlstream.shaper import RateShaper
+from sleekxmpp.exceptions import RateLimited
 
 # In Python 2.x, file socket objects are broken. A patched socket
 # wrapper is provided for this case in filesocket.py.
@@ -76,10 +81,20 @@ RECONNECT_MAX_DELAY = 600
 #: reconnections. Defaults to ``None``.
 RECONNECT_MAX_ATTEMPTS = None
 
+#: The maximum number of TLS sessions kept for resumption.
+SSL_SESSION_CACHE_SIZE = 256
+
 
 log = logging.getLogger(__name__)
 
 
+#: SSL contexts shared by all streams using the same TLS settings,
+#: and the TLS sessions which may be resumed with each of them.
+_ssl_contexts = {}
+_ssl_sessions = {}
+_ssl_lock = threading.Lock()
+
+
 class RestartStream(Exception):
     """
     Exception to restart stream processing, including
@@ -157,6 +172,15 @@ class XMLStream(object):
         self.keyfile = keyfile
 
         self._der_cert = None
+        self._ssl_socket = None
+
+        #: If set to ``True``, TLS sessions are resumed when reconnecting
+        #: to the same server, avoiding a full handshake.
+        self.use_tls_resumption = True
+
+        #: The number of ``'full'`` and ``'resumed'`` TLS handshakes
+        #: made by this stream.
+        self.tls_stats = {'full': 0, 'resumed': 0}
 
         #: The time in seconds to wait for events from the event queue,
         #: and also the time between checks for the process stop signal.
@@ -233,6 +257,24 @@ class XMLStream(object):
         #: If set to ``True``, attempt to use IPv6.
         self.use_ipv6 = True
 
+        #: If set to ``True``, connection attempts to the addresses
+        #: found through DNS are started in parallel, staggered by
+        #: :attr:`connection_attempt_delay`, and the first to
+        #: connect is used (RFC 8305 "Happy Eyeballs").
+        self.use_connection_racing = True
+
+        #: The time in seconds to wait for a connection attempt to
+        #: complete before starting an attempt to the next address.
+        self.connection_attempt_delay = 0.25
+
+        #: The time in seconds before giving up on a connection attempt.
+        self.connect_timeout = 30
+
+        #: The time in seconds it took to connect to each (address, port)
+        #: pair which has been tried, or ``None`` if the last attempt
+        #: failed. Addresses which connected quickly are tried first.
+        self.connect_latency = {}
+
         #: If set to ``True``, allow using the ``dnspython`` DNS library
         #: if available. If set to ``False``, the builtin DNS resolver
         #: will be used, even if ``dnspython`` is installed.
@@ -299,11 +341,31 @@ class XMLStream(object):
         #: A queue of stream, custom, and scheduled events to be processed.
         self.event_queue = Queue()
 
-        #: A queue of string data to be sent over the stream.
-        self.send_queue = Queue(maxsize=256)
+        #: A queue of string data to be sent over the stream, split
+        #: into ``'control'``, ``'interactive'`` and ``'bulk'`` lanes.
+        #: Lane weights and sizes may be adjusted through its
+        #: ``weights`` and ``maxsizes`` attributes.
+        self.send_queue = SendQueue()
+
+        #: Outbound rate limits for stanzas, disabled until one of
+        #: its ``bytes_per_sec``, ``stanzas_per_sec``,
+        #: ``jid_bytes_per_sec`` or ``jid_stanzas_per_sec`` limits
+        #: is set. Stanzas which exceed the limits are delayed or
+        #: shed, raising the ``rate_limited`` event.
+        self.shaper = RateShaper()
         self.send_queue_lock = threading.Lock()
         self.send_lock = threading.RLock()
 
+        #: Held while a serialized stanza is handed to the send queue.
+        #: Stanzas are serialized in parallel by the sending threads,
+        #: and are then queued in the order in which :meth:`send`
+        #: reserved a place for them while holding
+        #: :attr:`send_queue_lock`. Stanzas in different lanes of the
+        #: send queue may still be sent in a different order.
+        self.send_order = threading.Condition()
+        self._send_reserved = 0
+        self._send_committed = 0
+
         #: A :class:`~sleekxmpp.xmlstream.scheduler.Scheduler` instance for
         #: executing callbacks in the future based on time delays.
         self.scheduler = Scheduler(self.stop)
@@ -312,12 +374,18 @@ class XMLStream(object):
         #: A mapping of XML namespaces to well-known prefixes.
         self.namespace_map = {StanzaBase.xml_ns: 'xml'}
 
+        #: Give each handler of an event its own shallow copy of the
+        #: event data. When ``False``, every handler receives the same
+        #: object, which handlers must then treat as read only.
+        self.copy_event_data = True
+
         self.__thread = {}
         self.__root_stanza = []
         self.__handlers = []
         self.__event_handlers = {}
         self.__event_handlers_lock = threading.Lock()
-        self.__filters = {'in': [], 'out': [], 'out_sync': []}
+        self.__filters = {'in': [], 'out': [], 'out_sync': [],
+                          'out_ordered': []}
         self.__thread_count = 0
         self.__thread_cond = threading.Condition()
         self.__active_threads = set()
@@ -328,7 +396,7 @@ class XMLStream(object):
         self._id_lock = threading.Lock()
 
         #: We use an ID prefix to ensure that all ID values are unique.
-        self._id_prefix = '%s-' % uuid.uuid4()
+        self._id_prefix = '%s-' % binascii.hexlify(os.urandom(16)).decode()
 
         #: The :attr:`auto_reconnnect` setting controls whether or not
         #: the stream will be restarted in the event of an error.
@@ -416,6 +484,83 @@ class XMLStream(object):
         return "%s%X" % (self._id_prefix, self._id)
 
     def _create_secure_socket(self):
+        """Wrap the socket for TLS, resuming a previous session if possible.
+
+        The SSL context is shared by all streams using the same TLS
+        settings, so that sessions from earlier connections may be
+        resumed.
+        """
+        key = (self.ssl_version, self.ciphers, self.ca_certs,
+               self.certfile, self.keyfile)
+        with _ssl_lock:
+            ctx = _ssl_contexts.get(key)
+        if ctx is None:
+            ctx, ssl_args = self._create_ssl_context()
+            if ctx is None:
+                self._ssl_socket = ssl.wrap_socket(self.socket, **ssl_args)
+                return self._ssl_socket
+            with _ssl_lock:
+                ctx = _ssl_contexts.setdefault(key, ctx)
+
+        session = None
+        if self.use_tls_resumption:
+            with _ssl_lock:
+                session = _ssl_sessions.get((ctx, self.address))
+        if session is not None:
+            try:
+                self._ssl_socket = ctx.wrap_socket(
+                        self.socket,
+                        do_handshake_on_connect=False,
+                        session=session)
+                return self._ssl_socket
+            except ValueError:
+                log.debug('TLS: Could not reuse session for %s:%s',
+                          *self.address)
+        self._ssl_socket = ctx.wrap_socket(self.socket,
+                                           do_handshake_on_connect=False)
+        return self._ssl_socket
+
+    def _tls_established(self):
+        """Record a completed TLS handshake."""
+        if getattr(self._ssl_socket, 'session_reused', False):
+            log.debug('TLS: Resumed session with %s:%s', *self.address)
+            self.tls_stats['resumed'] += 1
+        else:
+            self.tls_stats['full'] += 1
+        self._save_tls_session()
+
+    def _save_tls_session(self, discard=False):
+        """Keep the current TLS session for resuming later connections.
+
+        :param discard: If ``True``, forget any stored session for the
+                        current server instead.
+        """
+        ssl_socket = self._ssl_socket
+        ctx = getattr(ssl_socket, 'context', None)
+        if ctx is None:
+            return
+        key = (ctx, self.address)
+        with _ssl_lock:
+            if discard:
+                _ssl_sessions.pop(key, None)
+                return
+            try:
+                session = ssl_socket.session
+            except (AttributeError, ValueError):
+                return
+            if session is None:
+                return
+            if key not in _ssl_sessions and \
+               len(_ssl_sessions) >= SSL_SESSION_CACHE_SIZE:
+                _ssl_sessions.pop(next(iter(_ssl_sessions)))
+            _ssl_sessions[key] = session
+
+    def _create_ssl_context(self):
+        """Create an SSL context for the configured TLS settings.
+
+        Returns a tuple of the context, and the arguments to use with
+        :func:`ssl.wrap_socket` when contexts are not supported.
+        """
         _CIPHERS_SSL = (
             'ECDH+AESGCM:DH+AESGCM:ECDH+AES256:DH+AES256:ECDH+AES128:DH+AES:ECDH+HIGH:'
             'DH+HIGH:ECDH+3DES:DH+3DES:RSA+AESGCM:RSA+AES:RSA+HIGH:RSA+3DES:!aNULL:'
@@ -459,7 +604,7 @@ class XMLStream(object):
                 # Good, create_default_context() is supported, which consists
                 # recommended security settings by default.
                 ctx = ssl.create_default_context()
-                if self.ssl_version == ssl.PROTOCOL_SSLv3:
+                if self.ssl_version == getattr(ssl, 'PROTOCOL_SSLv3', None):
                     # But if the user specifies insecure SSLv3, do a favor.
                     ctx.options &= ~ssl.OP_NO_SSLv3  # UNSET NO_SSLv3, or set SSLv3
                     ctx.set_ciphers(_CIPHERS_SSL)  # _CIPHERS_SSL is weaker
@@ -473,7 +618,7 @@ class XMLStream(object):
                     ctx.load_verify_locations(cafile=self.ca_certs)
             else:
                 # Oops, create_default_context() is not supported.
-                if self.ssl_version == ssl.PROTOCOL_SSLv3:
+                if self.ssl_version == getattr(ssl, 'PROTOCOL_SSLv3', None):
                     # First, if the user specifies insecure SSLv3, do a favor.
                     ctx = ssl.SSLContext(ssl.PROTOCOL_SSLv3)
                     ctx.set_ciphers(_CIPHERS_SSL)
@@ -497,7 +642,7 @@ class XMLStream(object):
         elif sys.version_info >= (2, 7, 9):
             # Good, create_default_context() is supported, do the same as Python 3.4.
             ctx = ssl.create_default_context()
-            if self.ssl_version == ssl.PROTOCOL_SSLv3:
+            if self.ssl_version == getattr(ssl, 'PROTOCOL_SSLv3', None):
                 # If the user specifies insecure SSLv3, do a favor.
                 ctx.options &= ~ssl.OP_NO_SSLv3
                 ctx.set_ciphers(_CIPHERS_SSL)
@@ -508,7 +653,7 @@ class XMLStream(object):
             elif cert_policy == ssl.CERT_REQUIRED:
                 ctx.load_verify_locations(cafile=self.ca_certs)
         else:
-            if self.ssl_version == ssl.PROTOCOL_SSLv3:
+            if self.ssl_version == getattr(ssl, 'PROTOCOL_SSLv3', None):
                 ssl_args['ssl_version'] = ssl.PROTOCOL_SSLv3
             else:
                 ssl_args['ssl_version'] = ssl.PROTOCOL_TLSv1
@@ -517,11 +662,9 @@ class XMLStream(object):
         if ctx:
             if self.ciphers:
                 ctx.set_ciphers(self.ciphers)
-            return ctx.wrap_socket(self.socket, do_handshake_on_connect=False)
-        else:
-            if self.ciphers and sys.version_info >= (2, 7):
-                ssl_args['ciphers'] = self.ciphers
-            return ssl.wrap_socket(self.socket, **ssl_args)
+        elif self.ciphers and sys.version_info >= (2, 7):
+            ssl_args['ciphers'] = self.ciphers
+        return ctx, ssl_args
 
     def connect(self, host='', port=0, use_ssl=False,
                 use_tls=True, reattempt=True):
@@ -585,11 +728,8 @@ class XMLStream(object):
             delay = min(self.reconnect_delay * 2, self.reconnect_max_delay)
             delay = random.normalvariate(delay, delay * 0.1)
             log.debug('Waiting %s seconds before connecting.', delay)
-            elapsed = 0
             try:
-                while elapsed < delay and not self.stop.is_set():
-                    time.sleep(0.1)
-                    elapsed += 0.1
+                self.stop.wait(max(delay, 0))
             except KeyboardInterrupt:
                 self.set_stop()
                 return False
@@ -597,7 +737,21 @@ class XMLStream(object):
                 self.set_stop()
                 return False
 
-        if self.default_domain:
+        racing = self.use_connection_racing and self.default_domain and \
+                 not self.use_proxy
+        if racing:
+            answers = self.get_dns_records(self.default_domain,
+                                           self.address[1])
+            result = self._race_connect(answers)
+            if result is None:
+                log.debug("Could not connect to any DNS records.")
+                if reattempt:
+                    self.reconnect_delay = delay
+                return False
+            self.socket, host, address, port = result
+            self.address = (address, port)
+            self._service_name = host
+        elif self.default_domain:
             try:
                 host, address, port = self.pick_dns_answer(self.default_domain,
                                                            self.address[1])
@@ -610,16 +764,17 @@ class XMLStream(object):
                     self.reconnect_delay = delay
                 return False
 
-        af = Socket.AF_INET
-        proto = 'IPv4'
-        if ':' in self.address[0]:
-            af = Socket.AF_INET6
-            proto = 'IPv6'
-        try:
-            self.socket = self.socket_class(af, Socket.SOCK_STREAM)
-        except Socket.error:
-            log.debug("Could not connect using %s", proto)
-            return False
+        if not racing:
+            af = Socket.AF_INET
+            proto = 'IPv4'
+            if ':' in self.address[0]:
+                af = Socket.AF_INET6
+                proto = 'IPv6'
+            try:
+                self.socket = self.socket_class(af, Socket.SOCK_STREAM)
+            except Socket.error:
+                log.debug("Could not connect using %s", proto)
+                return False
 
         self.configure_socket()
 
@@ -645,14 +800,16 @@ class XMLStream(object):
                 domain = self.address[0]
                 if ':' in domain:
                     domain = '[%s]' % domain
-                log.debug("Connecting to %s:%s", domain, self.address[1])
-                self.socket.connect(self.address)
+                if not racing:
+                    log.debug("Connecting to %s:%s", domain, self.address[1])
+                    self.socket.connect(self.address)
 
                 if self.use_ssl:
                     try:
                         self.socket.do_handshake()
                     except (Socket.error, ssl.SSLError):
                         log.error('CERT: Invalid certificate trust chain.')
+                        self._save_tls_session(discard=True)
                         if not self.event_handled('ssl_invalid_chain'):
                             self.disconnect(self.auto_reconnect,
                                             send_close=False)
@@ -660,14 +817,17 @@ class XMLStream(object):
                             self.event('ssl_invalid_chain', direct=True)
                         return False
 
+                    self._tls_established()
                     self._der_cert = self.socket.getpeercert(binary_form=True)
                     pem_cert = ssl.DER_cert_to_PEM_cert(self._der_cert)
                     log.debug('CERT: %s', pem_cert)
 
                     self.event('ssl_cert', pem_cert, direct=True)
+                    from sleekxmpp.xmlstream import cert
                     try:
                         cert.verify(self._expected_server_name, self._der_cert)
                     except cert.CertificateError as err:
+                        self._save_tls_session(discard=True)
                         if not self.event_handled('ssl_invalid_cert'):
                             log.error(err)
                             self.disconnect(send_close=False)
@@ -690,6 +850,124 @@ class XMLStream(object):
                                  serr.errno, serr.strerror)
             return False
 
+    def _race_connect(self, answers):
+        """Connect to the first responsive address from DNS answers.
+
+        A new connection attempt is started every
+        :attr:`connection_attempt_delay` seconds, or as soon as an
+        attempt fails, until one of them connects. Addresses which
+        connected quickly in the past are tried first, and addresses
+        which failed are tried last.
+
+        Returns a tuple of the connected socket, host name, address,
+        and port, or ``None`` if no connection could be made.
+
+        :param answers: An iterable of (host, address, port) tuples.
+        """
+        latency = self.connect_latency
+        unknown = self.connect_timeout
+        failed = self.connect_timeout * 2
+
+        def preference(answer):
+            known = latency.get((answer[1], answer[2]), unknown)
+            return failed if known is None else known
+
+        # The sort is stable, so DNS order is kept for unknown addresses.
+        answers = iter(sorted(answers, key=preference))
+
+        pending = {}
+        next_attempt = 0
+        exhausted = False
+        try:
+            while not self.stop.is_set():
+                now = time.time()
+                if not exhausted and (now >= next_attempt or not pending):
+                    try:
+                        host, address, port = next(answers)
+                    except StopIteration:
+                        exhausted = True
+                    else:
+                        sock = self._start_connect(address, port)
+                        if sock is not None:
+                            pending[sock] = (host, address, port, now)
+                            next_attempt = now + \
+                                           self.connection_attempt_delay
+                        continue
+
+                if not pending:
+                    return None
+
+                wait = 0.1
+                if not exhausted:
+                    wait = min(wait, max(next_attempt - now, 0))
+                for sock in self._wait_connect(list(pending), wait):
+                    host, address, port, started = pending.pop(sock)
+                    error = sock.getsockopt(Socket.SOL_SOCKET,
+                                            Socket.SO_ERROR)
+                    if error:
+                        log.debug("Could not connect to %s:%s: %s",
+                                  address, port, errno.errorcode.get(error))
+                        latency[(address, port)] = None
+                        sock.close()
+                        next_attempt = 0
+                        continue
+                    latency[(address, port)] = time.time() - started
+                    log.debug("Connected to %s:%s in %.3f seconds",
+                              address, port, latency[(address, port)])
+                    sock.setblocking(1)
+                    return sock, host, address, port
+
+                now = time.time()
+                for sock, (host, address, port, started) in \
+                        list(pending.items()):
+                    if now - started > self.connect_timeout:
+                        log.debug("Connecting to %s:%s timed out",
+                                  address, port)
+                        latency[(address, port)] = None
+                        del pending[sock]
+                        sock.close()
+        finally:
+            for sock in pending:
+                sock.close()
+        return None
+
+    def _start_connect(self, address, port):
+        """Start a non-blocking connection attempt.
+
+        Returns the connecting socket, or ``None`` if the attempt
+        failed immediately.
+        """
+        af = Socket.AF_INET6 if ':' in address else Socket.AF_INET
+        try:
+            sock = self.socket_class(af, Socket.SOCK_STREAM)
+        except Socket.error:
+            log.debug("Could not connect using %s",
+                      'IPv6' if af == Socket.AF_INET6 else 'IPv4')
+            return None
+        sock.setblocking(0)
+        log.debug("Connecting to %s:%s", address, port)
+        error = sock.connect_ex((address, port))
+        if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK,
+                         errno.EALREADY):
+            log.debug("Could not connect to %s:%s: %s",
+                      address, port, errno.errorcode.get(error))
+            self.connect_latency[(address, port)] = None
+            sock.close()
+            return None
+        return sock
+
+    def _wait_connect(self, socks, timeout):
+        """Return the sockets whose connection attempts have finished."""
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+            fds = {}
+            for sock in socks:
+                fds[sock.fileno()] = sock
+                poller.register(sock, select.POLLOUT)
+            return [fds[fd] for fd, event in poller.poll(timeout * 1000)]
+        _, writable, errored = select.select([], socks, socks, timeout)
+        return list(set(writable) | set(errored))
+
     def _connect_proxy(self):
         """Attempt to connect using an HTTP Proxy."""
 
@@ -829,6 +1107,7 @@ class XMLStream(object):
             if self._disconnect_wait_for_threads:
                 self._wait_for_threads()
 
+        self._save_tls_session()
         try:
             self.socket.shutdown(Socket.SHUT_RDWR)
             self.socket.close()
@@ -845,6 +1124,7 @@ class XMLStream(object):
         self.set_stop()
         if self._disconnect_wait_for_threads:
             self._wait_for_threads()
+        self._save_tls_session()
         try:
             self.socket.shutdown(Socket.SHUT_RDWR)
             self.socket.close()
@@ -949,6 +1229,7 @@ class XMLStream(object):
             self.socket.do_handshake()
         except (Socket.error, ssl.SSLError):
             log.error('CERT: Invalid certificate trust chain.')
+            self._save_tls_session(discard=True)
             if not self.event_handled('ssl_invalid_chain'):
                 self.disconnect(self.auto_reconnect, send_close=False)
             else:
@@ -956,14 +1237,17 @@ class XMLStream(object):
                 self.event('ssl_invalid_chain', direct=True)
             return False
 
+        self._tls_established()
         self._der_cert = self.socket.getpeercert(binary_form=True)
         pem_cert = ssl.DER_cert_to_PEM_cert(self._der_cert)
         log.debug('CERT: %s', pem_cert)
         self.event('ssl_cert', pem_cert, direct=True)
 
+        from sleekxmpp.xmlstream import cert
         try:
             cert.verify(self._expected_server_name, self._der_cert)
         except cert.CertificateError as err:
+            self._save_tls_session(discard=True)
             if not self.event_handled('ssl_invalid_cert'):
                 log.error(err)
                 self.disconnect(self.auto_reconnect, send_close=False)
@@ -991,6 +1275,7 @@ class XMLStream(object):
                 pem_cert = ssl.DER_cert_to_PEM_cert(self._der_cert)
                 self.event('ssl_expired_cert', pem_cert)
 
+        from sleekxmpp.xmlstream import cert
         cert_ttl = cert.get_ttl(self._der_cert)
         if cert_ttl is None:
             return
@@ -1084,7 +1369,21 @@ class XMLStream(object):
         ``None``, then the stanza will be dropped from being
         processed for events or from being sent.
 
-        :param mode: One of ``'in'`` or ``'out'``.
+        Filters added with the ``'out_sync'`` mode are run while
+        holding the send queue lock, and may also return the
+        serialized stanza text, in which case no further
+        filters are applied. Since every sending thread waits
+        for that lock, these filters should be cheap.
+
+        Filters added with the ``'out_ordered'`` mode are run after
+        the stanza has been serialized, in the order in which stanzas
+        are written to the stream, while holding :attr:`send_lock`
+        until the stanza has been written.
+        They accept the stanza and its serialized text, and return
+        the text to send or ``None`` to drop the stanza.
+
+        :param mode: One of ``'in'``, ``'out'``, ``'out_sync'``,
+                     or ``'out_ordered'``.
         :param handler: The filter function.
         :param int order: The position to insert the filter in
                           the list of active filters.
@@ -1203,9 +1502,12 @@ class XMLStream(object):
         :param disposable: If set to ``True``, the handler will be
                            discarded after one use. Defaults to ``False``.
         """
-        if not name in self.__event_handlers:
-            self.__event_handlers[name] = []
-        self.__event_handlers[name].append((pointer, threaded, disposable))
+        # Handler lists are replaced rather than modified, so that
+        # events may be dispatched from a snapshot without locking.
+        with self.__event_handlers_lock:
+            handlers = self.__event_handlers.get(name, ())
+            self.__event_handlers[name] = handlers + \
+                    ((pointer, threaded, disposable),)
 
     def del_event_handler(self, name, pointer):
         """Remove a function as a handler for an event.
@@ -1213,24 +1515,19 @@ class XMLStream(object):
         :param name: The name of the event.
         :param pointer: The function to remove as a handler.
         """
-        if not name in self.__event_handlers:
-            return
-
-        # Need to keep handlers that do not use
-        # the given function pointer
-        def filter_pointers(handler):
-            return handler[0] != pointer
-
-        self.__event_handlers[name] = list(filter(
-            filter_pointers,
-            self.__event_handlers[name]))
+        with self.__event_handlers_lock:
+            if not name in self.__event_handlers:
+                return
+            self.__event_handlers[name] = tuple(
+                    handler for handler in self.__event_handlers[name]
+                    if handler[0] != pointer)
 
     def event_handled(self, name):
         """Returns the number of registered handlers for an event.
 
         :param name: The name of the event to check.
         """
-        return len(self.__event_handlers.get(name, []))
+        return len(self.__event_handlers.get(name, ()))
 
     def event(self, name, data=None, direct=False):
         """Manually trigger a custom event.
@@ -1246,15 +1543,17 @@ class XMLStream(object):
         if not data:
             data = {}
 
-        log.debug("Event triggered: " + name)
+        log.debug("Event triggered: %s", name)
 
-        handlers = self.__event_handlers.get(name, [])
+        handlers = self.__event_handlers.get(name, ())
+        copy_data = self.copy_event_data and len(handlers) > 1
+        old_exception = getattr(data, 'exception', None)
         for handler in handlers:
-            #TODO:  Data should not be copied, but should be read only,
-            #       but this might break current code so it's left for future.
+            if handler[2] and not self._dispose_handler(name, handler):
+                # Another thread has already used this handler.
+                continue
 
-            out_data = copy.copy(data) if len(handlers) > 1 else data
-            old_exception = getattr(data, 'exception', None)
+            out_data = copy.copy(data) if copy_data else data
             if direct:
                 try:
                     handler[0](out_data)
@@ -1267,16 +1566,20 @@ class XMLStream(object):
                         self.exception(e)
             else:
                 self.event_queue.put(('event', handler, out_data))
-            if handler[2]:
-                # If the handler is disposable, we will go ahead and
-                # remove it now instead of waiting for it to be
-                # processed in the queue.
-                with self.__event_handlers_lock:
-                    try:
-                        h_index = self.__event_handlers[name].index(handler)
-                        self.__event_handlers[name].pop(h_index)
-                    except:
-                        pass
+
+    def _dispose_handler(self, name, handler):
+        """Remove a disposable handler before it is run.
+
+        :returns: ``True`` if the handler was still registered.
+        """
+        with self.__event_handlers_lock:
+            handlers = self.__event_handlers.get(name, ())
+            for index, registered in enumerate(handlers):
+                if registered is handler:
+                    self.__event_handlers[name] = handlers[:index] + \
+                                                  handlers[index + 1:]
+                    return True
+        return False
 
     def schedule(self, name, seconds, callback, args=None,
                  kwargs=None, repeat=False):
@@ -1304,7 +1607,8 @@ class XMLStream(object):
         """
         return xml
 
-    def send(self, data, mask=None, timeout=None, now=False, use_filters=True):
+    def send(self, data, mask=None, timeout=None, now=False,
+             use_filters=True, lane=None, shaping=None):
         """A wrapper for :meth:`send_raw()` for sending stanza objects.
 
         May optionally block until an expected response is received.
@@ -1326,6 +1630,18 @@ class XMLStream(object):
                                  applied to the given stanza data. Disabling
                                  filters is useful when resending stanzas.
                                  Defaults to ``True``.
+        :param string lane: The send queue lane, one of ``'control'``,
+                            ``'interactive'`` or ``'bulk'``. Defaults to
+                            the stanza's ``lane`` hint, or a lane chosen
+                            by :meth:`send_lane`.
+        :param string shaping: How to handle a stanza which exceeds
+                               the rate limits of :attr:`shaper`:
+                               ``'wait'``, ``'drop'`` or ``'fail'``.
+                               Defaults to the shaper's ``mode``.
+        :raises RateLimited: If the stanza exceeds the rate limits
+                             in ``'fail'`` mode.
+        :returns: ``False`` if the stanza was dropped by the rate
+                  limits, otherwise any response to ``mask``.
         """
         if timeout is None:
             timeout = self.response_timeout
@@ -1339,6 +1655,19 @@ class XMLStream(object):
                     if data is None:
                         return
 
+        if lane is None:
+            lane = self.send_lane(data)
+
+        # Shape before registering the mask waiter, so that a dropped
+        # or failed stanza leaves no handler behind.
+        shaped, jid = False, None
+        if isinstance(data, ElementBase) and not now:
+            self._wait_for_lane(lane)
+            if isinstance(data, StanzaBase) and self.shaper.enabled:
+                shaped, jid = True, data['to'].full or None
+                if not self._shape(data, jid, shaping):
+                    return False
+
         if mask is not None:
             log.warning("Use of send mask waiters is deprecated.")
             wait_for = Waiter("SendWait_%s" % self.new_id(),
@@ -1346,21 +1675,131 @@ class XMLStream(object):
             self.register_handler(wait_for)
 
         if isinstance(data, ElementBase):
+            stanza = data
             with self.send_queue_lock:
                 if use_filters:
                     for filter in self.__filters['out_sync']:
                         data = filter(data)
                         if data is None:
                             return
-                str_data = tostring(data.xml, xmlns=self.default_ns,
+                        if not isinstance(data, ElementBase):
+                            break
+                ticket = self._send_reserved
+                self._send_reserved += 1
+
+            # Serialize outside of the lock so that sending threads
+            # do not wait on each other, then queue the result in
+            # the order reserved above.
+            text = None
+            try:
+                # Synchronous filters may have already serialized
+                # the stanza, e.g. to keep a copy for resending.
+                if isinstance(data, ElementBase):
+                    text = tostring(data.xml, xmlns=self.default_ns,
                                               stream=self,
                                               top_level=True)
-                self.send_raw(str_data, now)
+                else:
+                    text = data
+                if shaped:
+                    if not isinstance(text, bytes):
+                        size = len(text.encode('utf-8'))
+                    else:
+                        size = len(text)
+                    self.shaper.charge(jid, size)
+            finally:
+                self._send_ordered(ticket, stanza, text, now,
+                                   use_filters, lane)
         else:
-            self.send_raw(data, now)
+            self.send_raw(data, now, lane=lane)
         if mask is not None:
             return wait_for.wait(timeout)
 
+    def send_lane(self, data):
+        """Return the send queue lane for outgoing data.
+
+        A stanza's ``lane`` hint is used if set. Otherwise Iq results
+        and errors, and stream level elements, are sent in the
+        ``'control'`` lane, and other stanzas in the
+        ``'interactive'`` lane.
+
+        :param data: The stanza, or string data, to send.
+        """
+        lane = getattr(data, 'lane', None)
+        if lane is not None:
+            return lane
+        if not isinstance(data, ElementBase):
+            return 'interactive'
+        if not isinstance(data, StanzaBase):
+            return 'control'
+        if data.name == 'iq' and data['type'] in ('result', 'error'):
+            return 'control'
+        return 'interactive'
+
+    def _shape(self, stanza, jid, mode):
+        """Apply the outbound rate limits to a stanza.
+
+        :returns: ``True`` if the stanza may be sent.
+        """
+        mode = mode or self.shaper.mode
+        delay = self.shaper.admit(jid, mode, self.stop)
+        if delay is None:
+            return True
+        action = 'fail' if mode == 'fail' else 'drop'
+        log.debug("Rate limited stanza to %s (%s, %.3fs)", jid, action, delay)
+        self.event('rate_limited', {'stanza': stanza,
+                                    'jid': jid,
+                                    'delay': delay,
+                                    'action': action})
+        if mode == 'fail':
+            raise RateLimited(stanza, delay)
+        return False
+
+    def _wait_for_lane(self, lane):
+        """Wait while a send queue lane is full and being drained."""
+        while not self.send_queue.wait_for_space(lane, self.wait_timeout):
+            if self.stop.is_set() or \
+               not self.session_started_event.is_set():
+                break
+
+    def _send_ordered(self, ticket, stanza, data, now, use_filters, lane):
+        """Queue serialized stanza text once all stanzas with earlier
+        tickets have been queued.
+
+        :param int ticket: The place reserved by :meth:`send`.
+        :param stanza: The stanza object which was serialized.
+        :param data: The serialized stanza text, or ``None`` if
+                     serialization failed.
+        """
+        with self.send_order:
+            while self._send_committed != ticket:
+                self.send_order.wait()
+            try:
+                if data is None:
+                    pass
+                elif now:
+                    with self.send_lock:
+                        if use_filters:
+                            data = self._filter_ordered(stanza, data)
+                        if data is not None:
+                            self.send_raw(data, now)
+                elif use_filters:
+                    # Ordered filters are applied by the send thread.
+                    self.send_queue.put((stanza, data), lane)
+                else:
+                    self.send_queue.put(data, lane)
+            finally:
+                self._send_committed += 1
+                self.send_order.notify_all()
+
+    def _filter_ordered(self, stanza, data):
+        """Apply ``'out_ordered'`` filters to serialized stanza text."""
+        with self.send_lock:
+            for filter in self.__filters['out_ordered']:
+                data = filter(stanza, data)
+                if data is None:
+                    break
+        return data
+
     def send_xml(self, data, mask=None, timeout=None, now=False):
         """Send an XML object on the stream, and optionally wait
         for a response.
@@ -1383,7 +1822,7 @@ class XMLStream(object):
             timeout = self.response_timeout
         return self.send(tostring(data), mask, timeout, now)
 
-    def send_raw(self, data, now=False, reconnect=None):
+    def send_raw(self, data, now=False, reconnect=None, lane='interactive'):
         """Send raw data across the stream.
 
         :param string data: Any string value.
@@ -1391,6 +1830,8 @@ class XMLStream(object):
                                restarted if there is an error sending
                                the stanza. Used mainly for testing.
                                Defaults to :attr:`auto_reconnect`.
+        :param string lane: The send queue lane to use.
+                            Defaults to ``'interactive'``.
         """
         if now:
             log.debug("SEND (IMMED): %s", data)
@@ -1432,7 +1873,7 @@ class XMLStream(object):
                 if not self.stop.is_set():
                     self.disconnect(reconnect, send_close=False)
         else:
-            self.send_queue.put(data)
+            self.send_queue.put(data, lane)
         return True
 
     def _start_thread(self, name, target, track=True):
@@ -1475,7 +1916,7 @@ class XMLStream(object):
 
         # Unlock queues
         self.event_queue.put(None)
-        self.send_queue.put(None)
+        self.send_queue.put(None, 'control')
 
     def _wait_for_threads(self):
         with self.__thread_cond:
@@ -1636,6 +2077,10 @@ class XMLStream(object):
                 elif depth == 1:
                     # We only raise events for stanzas that are direct
                     # children of the root element.
+                    # The parser sets the element's tail once it reads
+                    # past it, which would add an attribute to an
+                    # element that event handlers may be copying.
+                    xml.tail = None
                     try:
                         self.__spawn_event(xml)
                     except RestartStream:
@@ -1755,7 +2200,10 @@ class XMLStream(object):
 
                 etype, handler = event[0:2]
                 args = event[2:]
-                orig = copy.copy(args[0])
+                if etype == 'event' and not self.copy_event_data:
+                    orig = args[0]
+                else:
+                    orig = copy.copy(args[0])
 
                 if etype == 'stanza':
                     try:
@@ -1818,14 +2266,22 @@ class XMLStream(object):
                     data = self.send_queue.get()                                            # Wait for data to send
                     if data is None:
                         continue
-                log.debug("SEND: %s", data)
-                enc_data = data.encode('utf-8')
-                total = len(enc_data)
                 sent = 0
                 count = 0
                 tries = 0
                 try:
+                    # Ordered filters and the write share one hold of
+                    # the send lock, so that nothing sent with now=True
+                    # can be written in between.
                     with self.send_lock:
+                        if isinstance(data, tuple):
+                            data = self._filter_ordered(*data)
+                            if data is None:
+                                self.send_queue.task_done()
+                                continue
+                        log.debug("SEND: %s", data)
+                        enc_data = data.encode('utf-8')
+                        total = len(enc_data)
                         while sent < total and not self.stop.is_set() and \
                               self.session_started_event.is_set():
                             try:
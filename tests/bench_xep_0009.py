@@ -0,0 +1,128 @@
+# -*- encoding:utf-8 -*-
+
+"""
+    SleekXMPP: The Sleek XMPP Library
+    Copyright (C) 2011 Nathanael C. Fritz, Dann Martens (TOMOTON).
+    This file is part of SleekXMPP.
+
+    See the file LICENSE for copying permission.
+
+    Compare the speed of the Jabber-RPC codec with the tag by tag
+    implementation it replaced. Not part of the test suite; run with:
+
+        python -m tests.bench_xep_0009
+"""
+
+from __future__ import print_function, unicode_literals
+
+import sys
+import time
+
+from sleekxmpp.plugins.xep_0009.binding import py2xml, xml2py
+from sleekxmpp.xmlstream import ET
+
+
+if sys.version_info > (3, 0):
+    unicode = str
+
+
+NS = 'jabber:iq:rpc'
+
+
+def legacy_py2xml(x):
+    """The tag by tag encoder replaced by the dispatch table codec,
+    kept as a baseline."""
+    val = ET.Element("{%s}value" % NS)
+    if type(x) is int:
+        i4 = ET.Element("{%s}i4" % NS)
+        i4.text = str(x)
+        val.append(i4)
+    elif type(x) is bool:
+        boolean = ET.Element("{%s}boolean" % NS)
+        boolean.text = str(int(x))
+        val.append(boolean)
+    elif type(x) in (str, unicode):
+        string = ET.Element("{%s}string" % NS)
+        string.text = x
+        val.append(string)
+    elif type(x) is float:
+        double = ET.Element("{%s}double" % NS)
+        double.text = str(x)
+        val.append(double)
+    elif type(x) in (list, tuple):
+        array = ET.Element("{%s}array" % NS)
+        data = ET.Element("{%s}data" % NS)
+        for y in x:
+            data.append(legacy_py2xml(y))
+        array.append(data)
+        val.append(array)
+    elif type(x) is dict:
+        struct = ET.Element("{%s}struct" % NS)
+        for y in x.keys():
+            member = ET.Element("{%s}member" % NS)
+            name = ET.Element("{%s}name" % NS)
+            name.text = y
+            member.append(name)
+            member.append(legacy_py2xml(x[y]))
+            struct.append(member)
+        val.append(struct)
+    return val
+
+
+def legacy_xml2py(value):
+    """The tag by tag decoder replaced by the dispatch table codec,
+    kept as a baseline."""
+    for tag, convert in (('nil', lambda text: None),
+                         ('i4', int),
+                         ('int', int),
+                         ('boolean', lambda text: bool(int(text))),
+                         ('string', lambda text: text),
+                         ('double', float),
+                         ('base64', None),
+                         ('Base64', None),
+                         ('dateTime.iso8601', None)):
+        if value.find('{%s}%s' % (NS, tag)) is not None:
+            return convert(value.find('{%s}%s' % (NS, tag)).text)
+    if value.find('{%s}struct' % NS) is not None:
+        struct = {}
+        for member in value.find('{%s}struct' % NS).findall('{%s}member' % NS):
+            struct[member.find('{%s}name' % NS).text] = \
+                    legacy_xml2py(member.find('{%s}value' % NS))
+        return struct
+    if value.find('{%s}array' % NS) is not None:
+        array = []
+        for val in value.find('{%s}array' % NS).find(
+                '{%s}data' % NS).findall('{%s}value' % NS):
+            array.append(legacy_xml2py(val))
+        return array
+    raise ValueError()
+
+
+def main(count=2000):
+    params = [[{'id': x, 'name': 'item %s' % x, 'price': x * 1.5,
+                'tags': ['a', 'b'], 'active': True}
+               for x in range(count)]]
+
+    start = time.time()
+    legacy = ET.Element('{%s}params' % NS)
+    ET.SubElement(legacy, '{%s}param' % NS).append(legacy_py2xml(params[0]))
+    legacy_encode = time.time() - start
+    start = time.time()
+    params_xml = py2xml(*params)
+    encode = time.time() - start
+    assert ET.tostring(legacy) == ET.tostring(params_xml)
+
+    value = params_xml.find('{%s}param/{%s}value' % (NS, NS))
+    start = time.time()
+    expected = legacy_xml2py(value)
+    legacy_decode = time.time() - start
+    start = time.time()
+    assert xml2py(params_xml) == [expected]
+    decode = time.time() - start
+
+    print('%s structs: encode %.3fs (was %.3fs), decode %.3fs (was %.3fs)' % (
+          count, encode, legacy_encode, decode, legacy_decode))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+    SleekXMPP: The Sleek XMPP Library
+    Copyright (C) 2012 Nathanael C. Fritz, Lance J.T. Stout
+    This file is part of SleekXMPP.
+
+    See the file LICENSE for copying permission.
+
+    Measure in-band bytestream throughput between two streams joined
+    by a local socket pair, with a fixed window of one block, a larger
+    fixed window, and an adaptive window. Not part of the test suite;
+    run with:
+
+        python -m tests.bench_xep_0047 [megabytes]
+"""
+
+from __future__ import print_function
+
+import socket
+import sys
+import threading
+import time
+
+from sleekxmpp import ClientXMPP
+
+
+def make_stream(jid, sock):
+    """Start a stream over one end of the socket pair, skipping
+    stream negotiation."""
+    xmpp = ClientXMPP(jid, 'secret')
+    xmpp.register_plugin('xep_0030')
+    xmpp.register_plugin('xep_0047', {'auto_accept': True})
+    xmpp.auto_reconnect = False
+    xmpp.set_socket(sock)
+    xmpp.process(threaded=True)
+    xmpp.session_bind_event.set()
+    xmpp.session_started_event.set()
+    return xmpp
+
+
+def transfer(sender, receiver, data, window, max_window):
+    started = []
+    ready = threading.Event()
+
+    def stream_start(stream):
+        started.append(stream)
+        ready.set()
+
+    receiver.add_event_handler('ibb_stream_start', stream_start)
+    stream = sender['xep_0047'].open_stream(receiver.boundjid,
+                                            window=window,
+                                            max_window=max_window,
+                                            timeout=10)
+    ready.wait(10)
+    receiver.del_event_handler('ibb_stream_start', stream_start)
+
+    received = [0]
+
+    def read():
+        reader = started[0].as_file()
+        while received[0] < len(data):
+            chunk = reader.read(65536)
+            if not chunk:
+                break
+            received[0] += len(chunk)
+
+    t = threading.Thread(target=read)
+    t.start()
+    start = time.time()
+    stream.sendall(data)
+    t.join()
+    elapsed = time.time() - start
+    stream.close()
+    assert received[0] == len(data)
+    return elapsed, stream.window_size
+
+
+def main(megabytes=4):
+    local, remote = socket.socketpair()
+    sender = make_stream('sender@localhost/bench', local)
+    receiver = make_stream('receiver@localhost/bench', remote)
+    data = memoryview(b'x' * (megabytes << 20))
+
+    try:
+        for window, max_window in ((1, None), (8, None), (1, 32)):
+            elapsed, final = transfer(sender, receiver, data,
+                                      window, max_window)
+            print('window %s (max %s): %s MiB in %.3fs, %.2f MiB/s, '
+                  'final window %s' % (window, max_window or window,
+                                       megabytes, elapsed,
+                                       megabytes / elapsed, final))
+    finally:
+        sender.disconnect(wait=False)
+        receiver.disconnect(wait=False)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
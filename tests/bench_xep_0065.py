@@ -0,0 +1,195 @@
+"""
+    SleekXMPP: The Sleek XMPP Library
+    Copyright (C) 2012 Nathanael C. Fritz, Lance J.T. Stout
+    This file is part of SleekXMPP.
+
+    See the file LICENSE for copying permission.
+
+    Measure SOCKS5 bytestream throughput through a local stand-in for
+    a bytestream proxy, comparing send_file() and recv_file() with a
+    plain recv() and send() loop. Not part of the test suite; run with:
+
+        python -m tests.bench_xep_0065 [megabytes]
+
+    The stand-in relays data in Python, so it also bounds the rates
+    measured; the comparison between the two ways of transferring is
+    what matters.
+"""
+
+from __future__ import print_function
+
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+from sleekxmpp import ClientXMPP
+
+
+CHUNK = 1 << 20
+
+
+def recvall(sock, count):
+    data = b''
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise socket.error('Connection closed during handshake')
+        data += chunk
+    return data
+
+
+class Socks5Relay(object):
+
+    """
+    A local stand-in for a SOCKS5 bytestream proxy, which joins the
+    two connections made for the same destination address.
+    """
+
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(4)
+        self.port = self.server.getsockname()[1]
+        self._pending = {}
+        self._lock = threading.Lock()
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, addr = self.server.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(target=self._handshake, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _handshake(self, conn):
+        ver, nmethods = struct.unpack('BB', recvall(conn, 2))
+        recvall(conn, nmethods)
+        conn.sendall(struct.pack('BB', 5, 0))
+        ver, cmd, rsv, atyp = struct.unpack('BBBB', recvall(conn, 4))
+        length = struct.unpack('B', recvall(conn, 1))[0]
+        dest = recvall(conn, length)
+        recvall(conn, 2)
+        conn.sendall(struct.pack('>BBBBIH', 5, 0, 0, 1, 0, 0))
+
+        with self._lock:
+            peer = self._pending.pop(dest, None)
+            if peer is None:
+                self._pending[dest] = conn
+                return
+        for src, dst in ((conn, peer), (peer, conn)):
+            thread = threading.Thread(target=self._relay, args=(src, dst))
+            thread.daemon = True
+            thread.start()
+
+    def _relay(self, src, dst):
+        buf = memoryview(bytearray(CHUNK))
+        while True:
+            size = src.recv_into(buf)
+            if not size:
+                break
+            dst.sendall(buf[:size])
+        try:
+            dst.shutdown(socket.SHUT_WR)
+        except socket.error:
+            pass
+
+    def close(self):
+        self.server.close()
+
+
+def plain_send(sock, f, size):
+    while True:
+        data = f.read(65536)
+        if not data:
+            break
+        sock.sendall(data)
+
+
+def plain_recv(sock, f, size):
+    received = 0
+    while received < size:
+        data = sock.recv(65536)
+        if not data:
+            break
+        f.write(data)
+        received += len(data)
+
+
+def transfer(relay, sender, receiver, f, size, sid, plain):
+    requester = sender.boundjid
+    target = receiver.boundjid
+    out_sock = sender['xep_0065']._connect_proxy(
+            sid, requester, target, '127.0.0.1', relay.port, peer=target)
+    in_sock = receiver['xep_0065']._connect_proxy(
+            sid, requester, target, '127.0.0.1', relay.port, peer=requester)
+    sender['xep_0065']._sessions[sid] = out_sock
+    receiver['xep_0065']._sessions[sid] = in_sock
+
+    def send():
+        if plain:
+            plain_send(out_sock, f, size)
+        else:
+            sender['xep_0065'].send_file(sid, f)
+        out_sock.shutdown(socket.SHUT_WR)
+
+    f.seek(0)
+    thread = threading.Thread(target=send)
+    start = time.time()
+    thread.start()
+    with open(os.devnull, 'wb') as sink:
+        if plain:
+            plain_recv(in_sock, sink, size)
+        else:
+            receiver['xep_0065'].recv_file(sid, sink, count=size)
+    thread.join()
+    elapsed = time.time() - start
+    out_sock.close()
+    in_sock.close()
+    return elapsed
+
+
+def main(megabytes=1024):
+    sender = ClientXMPP('sender@localhost/bench', 'secret')
+    sender.register_plugin('xep_0065')
+    receiver = ClientXMPP('receiver@localhost/bench', 'secret')
+    receiver.register_plugin('xep_0065')
+    relay = Socks5Relay()
+
+    size = megabytes * CHUNK
+    chunk = os.urandom(CHUNK)
+    with tempfile.TemporaryFile() as f:
+        for _ in range(megabytes):
+            f.write(chunk)
+        f.flush()
+
+        try:
+            elapsed = transfer(relay, sender, receiver, f, size,
+                               'plain', plain=True)
+            print('recv/send loop:        %s MiB in %.3fs, %.1f MiB/s' % (
+                  megabytes, elapsed, megabytes / elapsed))
+
+            elapsed = transfer(relay, sender, receiver, f, size,
+                               'file', plain=False)
+            sent = sender['xep_0065'].get_stats('file')
+            received = receiver['xep_0065'].get_stats('file')
+            print('send_file/recv_file:   %s MiB in %.3fs, %.1f MiB/s' % (
+                  megabytes, elapsed, megabytes / elapsed))
+            print('  sender %.1f MiB/s, receiver %.1f MiB/s' % (
+                  sent['throughput'] / CHUNK,
+                  received['throughput'] / CHUNK))
+            assert received['bytes_received'] == size
+        finally:
+            relay.close()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
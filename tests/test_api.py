@@ -0,0 +1,107 @@
+import threading
+import unittest
+from sleekxmpp.test import SleekTest
+
+
+class TestAPIRegistry(SleekTest):
+    """
+    Test resolving and running API handlers.
+    """
+
+    def setUp(self):
+        self.stream_start(mode='client', plugins=[])
+        self.api = self.xmpp.api
+
+    def tearDown(self):
+        self.stream_close()
+
+    def testSpecificity(self):
+        """Test that the most specific handler is run."""
+        self.api.register(lambda *a: 'global', 'test', 'get')
+        self.api.register(lambda *a: 'jid', 'test', 'get',
+                          jid='user@localhost/a')
+        self.api.register(lambda *a: 'node', 'test', 'get',
+                          jid='user@localhost/a', node='n')
+
+        self.assertEqual(self.api.run('test', 'get'), 'global')
+        self.assertEqual(self.api.run('test', 'get', 'user@localhost/a'),
+                         'jid')
+        self.assertEqual(self.api.run('test', 'get', 'user@localhost/a', 'n'),
+                         'node')
+
+    def testCache(self):
+        """Test that resolved handlers are cached until changed."""
+        self.api.register(lambda *a: 'global', 'test', 'get')
+        self.api.run('test', 'get', 'user@localhost')
+        self.api.run('test', 'get', 'user@localhost')
+        self.assertEqual(self.api.stats['test']['calls'], 2)
+        self.assertEqual(self.api.stats['test']['hits'], 1)
+
+        self.api.register(lambda *a: 'jid', 'test', 'get',
+                          jid='user@localhost')
+        self.assertEqual(self.api.run('test', 'get', 'user@localhost'), 'jid')
+
+        self.api.unregister('test', 'get', jid='user@localhost')
+        self.assertEqual(self.api.run('test', 'get', 'user@localhost'),
+                         'global')
+
+    def testRestoreDefault(self):
+        """Test that restoring a default handler clears the cache."""
+        self.api.register(lambda *a: 'default', 'test', 'get', default=True)
+        self.api.register(lambda *a: 'custom', 'test', 'get')
+        self.assertEqual(self.api.run('test', 'get'), 'custom')
+        self.api.restore_default('test', 'get')
+        self.assertEqual(self.api.run('test', 'get'), 'default')
+
+    def testBareSetting(self):
+        """Test that changing the bare JID setting takes effect."""
+        jids = []
+        self.api.register(lambda jid, node, ifrom, args: jids.append(jid),
+                          'test', 'get')
+        self.api.run('test', 'get', 'user@localhost/a')
+        self.api.settings['test']['client_bare'] = True
+        self.api.run('test', 'get', 'user@localhost/a')
+        self.assertEqual([j.full for j in jids],
+                         ['user@localhost/a', 'user@localhost'])
+
+    def testHistogram(self):
+        """Test that handler latencies are recorded."""
+        self.api.register(lambda *a: None, 'test', 'get')
+        for _ in range(5):
+            self.api.run('test', 'get')
+        stats = self.api.stats['test']
+        self.assertEqual(sum(stats['histogram']), 5)
+        self.assertTrue(stats['time'] >= 0)
+
+    def testJIDCopies(self):
+        """Test that handlers can not change the cached JID."""
+        def handler(jid, node, ifrom, args):
+            jid.resource = 'changed'
+            return jid.full
+
+        self.api.register(handler, 'test', 'get')
+        self.assertEqual(self.api.run('test', 'get', 'user@localhost/a'),
+                         'user@localhost/changed')
+        jid, node, cached = list(self.api._cache['test'].values())[0]
+        self.assertEqual(jid.full, 'user@localhost/a')
+
+    def testConcurrentRegister(self):
+        """Test that the latest handler is run after concurrent changes."""
+        def make_handler(value):
+            return lambda *args: value
+
+        def run():
+            for _ in range(200):
+                self.api.run('test', 'get', 'user@localhost')
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for x in range(200):
+            self.api.register(make_handler(x), 'test', 'get')
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.api.run('test', 'get', 'user@localhost'), 199)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestAPIRegistry)
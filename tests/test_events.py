@@ -92,5 +92,39 @@ class TestEvents(SleekTest):
         msg = "Event was not triggered the correct number of times: %s"
         self.failUnless(happened == [True], msg % happened)
 
+    def testSharedEventData(self):
+        """Test passing the same event data to every handler."""
+        received = []
+
+        self.xmpp.add_event_handler("test_event", received.append)
+        self.xmpp.add_event_handler("test_event", received.append)
+
+        data = {'a': 1}
+        self.xmpp.event("test_event", data, direct=True)
+        self.failUnless(received[0] is not data)
+
+        self.xmpp.copy_event_data = False
+        del received[:]
+        self.xmpp.event("test_event", data, direct=True)
+        self.failUnless(received[0] is data and received[1] is data,
+                        "Event data was copied")
+
+    def testHandlerAddedDuringEvent(self):
+        """Test that handlers added while dispatching wait for the next event."""
+        happened = []
+
+        def handleadd(event):
+            happened.append('add')
+            self.xmpp.add_event_handler("test_event",
+                                        lambda e: happened.append('new'))
+
+        self.xmpp.add_event_handler("test_event", handleadd,
+                                    disposable=True)
+        self.xmpp.event("test_event", direct=True)
+        self.xmpp.event("test_event", direct=True)
+
+        msg = "Event was not triggered the correct number of times: %s"
+        self.failUnless(happened == ['add', 'new'], msg % happened)
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestEvents)
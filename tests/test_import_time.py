@@ -0,0 +1,40 @@
+import sys
+import unittest
+from sleekxmpp.test.importaudit import audit_imports
+
+
+#: Cumulative import time budgets in microseconds. Modules with a
+#: budget of 0 are rarely needed, and must only be imported on use.
+BUDGETS = {
+    'sleekxmpp': 1000000,
+    'sleekxmpp.thirdparty': 20000,
+    'sleekxmpp.thirdparty.gnupg': 0,
+    'sleekxmpp.thirdparty.socks': 0,
+    'sleekxmpp.thirdparty.mini_dateutil': 0,
+    'sleekxmpp.xmlstream.cert': 0,
+    'pyasn1': 0,
+    'hashlib': 0,
+    'uuid': 0,
+}
+
+
+class TestImportTime(unittest.TestCase):
+    """
+    Test the cost of importing the package.
+    """
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'requires -X importtime')
+    def testBudgets(self):
+        """Test that imports stay within their time budgets."""
+        over = audit_imports(BUDGETS)
+        self.assertEqual(over, [], 'Import budgets exceeded: %s' % over)
+
+    def testDeferred(self):
+        """Test that deferred names are imported when first used."""
+        from sleekxmpp.thirdparty import tzutc, socks
+        from sleekxmpp.thirdparty.mini_dateutil import tzutc as mini_tzutc
+        self.assertTrue(tzutc is mini_tzutc)
+        self.assertTrue(hasattr(socks, 'socksocket'))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestImportTime)
@@ -0,0 +1,133 @@
+import time
+import threading
+import unittest
+from sleekxmpp.test import SleekTest
+from sleekxmpp.xmlstream import resolver
+from sleekxmpp.xmlstream.resolver import DNSCache
+
+
+class TestDNSCache(SleekTest):
+    """
+    Test caching of DNS answers.
+    """
+
+    def setUp(self):
+        self.cache = DNSCache()
+        self.queries = []
+
+    def query(self, result):
+        def _query():
+            self.queries.append(result)
+            return result
+        return _query
+
+    def testCacheHit(self):
+        """Test that answers are cached until their TTL expires."""
+        records = self.cache.lookup('A', 'example.com',
+                                    self.query((['10.0.0.1'], 60)))
+        self.assertEqual(records, ['10.0.0.1'])
+
+        records = self.cache.lookup('A', 'EXAMPLE.com',
+                                    self.query((['10.0.0.2'], 60)))
+        self.assertEqual(records, ['10.0.0.1'])
+        self.assertEqual(len(self.queries), 1)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def testExpiry(self):
+        """Test that expired answers are queried again."""
+        self.cache.lookup('A', 'example.com', self.query((['10.0.0.1'], 0)))
+        records = self.cache.lookup('A', 'example.com',
+                                    self.query((['10.0.0.2'], 0)))
+        self.assertEqual(records, ['10.0.0.2'])
+        self.assertEqual(len(self.queries), 2)
+
+    def testNegativeTTL(self):
+        """Test that empty answers are kept for at most negative_ttl."""
+        self.cache.negative_ttl = 0
+        self.cache.lookup('A', 'example.com', self.query(([], 3600)))
+        self.cache.lookup('A', 'example.com', self.query(([], 3600)))
+        self.assertEqual(len(self.queries), 2)
+
+    def testStaleOnFailure(self):
+        """Test that expired answers are used when a query fails."""
+        self.cache.lookup('A', 'example.com', self.query((['10.0.0.1'], 0)))
+        records = self.cache.lookup('A', 'example.com', self.query(None))
+        self.assertEqual(records, ['10.0.0.1'])
+        self.assertEqual(self.cache.stats()['stale'], 1)
+
+        self.cache.stale_ttl = 0
+        records = self.cache.lookup('A', 'example.com', self.query(None))
+        self.assertEqual(records, [])
+
+    def testCoalesce(self):
+        """Test that concurrent queries for a record are coalesced."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_query():
+            self.queries.append(1)
+            started.set()
+            release.wait()
+            return ['10.0.0.1'], 60
+
+        results = []
+
+        def lookup():
+            results.append(self.cache.lookup('A', 'example.com', slow_query))
+
+        threads = [threading.Thread(target=lookup) for x in range(5)]
+        threads[0].start()
+        started.wait(1)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(1)
+
+        self.assertEqual(len(self.queries), 1)
+        self.assertEqual(results, [['10.0.0.1']] * 5)
+        self.assertEqual(self.cache.stats()['coalesced'], 4)
+
+    def testMaxEntries(self):
+        """Test that the cache does not grow past max_entries."""
+        self.cache.max_entries = 2
+        for x in range(5):
+            self.cache.lookup('A', 'host%s' % x,
+                              self.query((['10.0.0.%s' % x], 60 + x)))
+        self.assertEqual(self.cache.stats()['entries'], 2)
+
+    def testSources(self):
+        """Test that answers from different resolvers are kept apart."""
+        self.cache.lookup('A', 'example.com', self.query((['10.0.0.1'], 60)))
+        records = self.cache.lookup('A', 'example.com',
+                                    self.query((['10.0.0.2'], 60)),
+                                    source='custom')
+        self.assertEqual(records, ['10.0.0.2'])
+        self.assertEqual(len(self.queries), 2)
+
+    def testDefaultTTL(self):
+        """Test that answers without a TTL are only kept briefly."""
+        self.cache.lookup('A', 'example.com', self.query((['10.0.0.1'], None)))
+        expires = list(self.cache._entries.values())[0][1]
+        self.assertTrue(expires <= time.time() + 30)
+
+    def testOverrides(self):
+        """Test that static overrides bypass DNS."""
+        cache = resolver.cache
+        cache.override('A', 'example.test', ['192.0.2.1'])
+        cache.override('SRV', '_xmpp-client._tcp.example.test',
+                       [('xmpp.example.test', 5223)])
+        try:
+            self.assertEqual(resolver.get_A('example.test'), ['192.0.2.1'])
+            self.assertEqual(resolver.get_SRV('example.test', 5222,
+                                              'xmpp-client'),
+                             [('xmpp.example.test', 5223)])
+        finally:
+            cache.override('A', 'example.test', None)
+            cache.override('SRV', '_xmpp-client._tcp.example.test', None)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestDNSCache)
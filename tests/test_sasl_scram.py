@@ -0,0 +1,68 @@
+import unittest
+
+from sleekxmpp.test import SleekTest
+from sleekxmpp.util import XOR
+from sleekxmpp.util.sasl.mechanisms import SCRAM
+
+
+class TestSCRAM(SleekTest):
+    """
+    Test the SCRAM SASL mechanism using the RFC 5802 example exchange.
+    """
+
+    def setUp(self):
+        SCRAM.clear_key_cache()
+
+    def tearDown(self):
+        SCRAM.clear_key_cache()
+
+    def start_exchange(self):
+        credentials = {'username': b'user',
+                       'password': b'pencil',
+                       'authzid': b'',
+                       'channel_binding': b''}
+        mech = SCRAM('SCRAM-SHA-1', credentials, {'encrypted': True})
+        mech.process()
+        mech.cnonce = b'fyko+d2lbbFgONRv9qkxdawL'
+        mech.client_first_message_bare = b'n=user,r=' + mech.cnonce
+        return mech
+
+    def testExchange(self):
+        """Test computing the client proof and server signature."""
+        mech = self.start_exchange()
+        result = mech.process(b'r=fyko+d2lbbFgONRv9qkxdawL3rfcNHYJY1ZVvWVs7j,'
+                              b's=QSXCR+Q6sek8bf92,i=4096')
+        self.assertEqual(result,
+                b'c=biws,r=fyko+d2lbbFgONRv9qkxdawL3rfcNHYJY1ZVvWVs7j,'
+                b'p=v0X8v3Bz2T0CJGbJQyF0X+HI4Ts=')
+        mech.process(b'v=rmF9pqV8S7suAoZWja4dJRkFsKQ=')
+
+    def testKeyCache(self):
+        """Test that derived keys are reused for the same salt."""
+        mech = self.start_exchange()
+        mech.process(b'r=fyko+d2lbbFgONRv9qkxdawL3rfcNHYJY1ZVvWVs7j,'
+                     b's=QSXCR+Q6sek8bf92,i=4096')
+        self.assertEqual(len(SCRAM.key_cache), 1)
+
+        calls = []
+        mech = self.start_exchange()
+        mech.Hi = lambda *args: calls.append(args)
+        result = mech.process(b'r=fyko+d2lbbFgONRv9qkxdawL3rfcNHYJY1ZVvWVs7j,'
+                              b's=QSXCR+Q6sek8bf92,i=4096')
+        self.assertEqual(calls, [])
+        self.assertTrue(result.endswith(b'p=v0X8v3Bz2T0CJGbJQyF0X+HI4Ts='))
+
+    def testHiFallback(self):
+        """Test that PBKDF2 matches the pure Python implementation."""
+        mech = self.start_exchange()
+        expected = mech.Hi(b'pencil', b'salt', 64)
+
+        ui1 = mech.HMAC(b'pencil', b'salt' + b'\0\0\0\01')
+        ui = ui1
+        for i in range(63):
+            ui1 = mech.HMAC(b'pencil', ui1)
+            ui = XOR(ui, ui1)
+        self.assertEqual(expected, ui)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSCRAM)
@@ -0,0 +1,62 @@
+import time
+import threading
+import unittest
+from sleekxmpp.test import SleekTest
+from sleekxmpp.xmlstream.scheduler import Scheduler
+
+
+class TestScheduler(SleekTest):
+
+    """
+    Test running scheduled tasks.
+    """
+
+    def setUp(self):
+        self.stop = threading.Event()
+        self.scheduler = Scheduler(self.stop)
+        self.scheduler.wait_timeout = 0.1
+        self.scheduler.process(threaded=True, daemon=True)
+
+    def tearDown(self):
+        self.stop.set()
+        self.scheduler.quit()
+        self.scheduler.thread.join(2)
+
+    def testReschedule(self):
+        """Test that a task may schedule its own name when it runs."""
+        runs = []
+        errors = []
+
+        def callback():
+            runs.append(True)
+            if len(runs) < 3:
+                try:
+                    self.scheduler.add('task', 0, callback)
+                except ValueError as e:
+                    errors.append(e)
+
+        self.scheduler.add('task', 0, callback)
+        for _ in range(20):
+            if len(runs) == 3:
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(runs), 3)
+        self.assertTrue(self.scheduler.thread.is_alive())
+
+    def testRepeat(self):
+        """Test that a repeating task runs until removed."""
+        runs = []
+        self.scheduler.add('task', 0.01, lambda: runs.append(True),
+                           repeat=True)
+        for _ in range(20):
+            if len(runs) >= 3:
+                break
+            time.sleep(0.05)
+        self.scheduler.remove('task')
+        self.assertTrue(len(runs) >= 3)
+        self.assertEqual(len(self.scheduler), 0)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestScheduler)
@@ -16,11 +16,12 @@ import sys
 from sleekxmpp.plugins.xep_0009.stanza.RPC import RPCQuery, MethodCall, \
     MethodResponse
 from sleekxmpp.plugins.xep_0009.binding import py2xml, xml2py, rpcbase64, \
-    rpctime
+    rpctime, iterxml2py, iterarray
 from sleekxmpp.stanza.iq import Iq
 from sleekxmpp.test.sleektest import SleekTest
 from sleekxmpp.xmlstream.stanzabase import register_stanza_plugin
 from sleekxmpp.xmlstream.tostring import tostring
+from sleekxmpp.xmlstream import ET
 import unittest
 
 
@@ -28,6 +29,9 @@ if sys.version_info > (3, 0):
     unicode = str
 
 
+NS = 'jabber:iq:rpc'
+
+
 class TestJabberRPC(SleekTest):
 
     def setUp(self):
@@ -310,5 +314,38 @@ class TestJabberRPC(SleekTest):
         self.assertEqual(params, xml2py(expected_xml),
                          "XML to struct conversion")
 
+    def testConvertNested(self):
+        """Test converting data nested deeper than the recursion limit."""
+        depth = sys.getrecursionlimit() + 100
+        params = [[]]
+        inner = params[0]
+        for x in range(depth):
+            inner.append({'depth': x, 'next': []})
+            inner = inner[0]['next']
+
+        inner = xml2py(py2xml(*params))[0]
+        for x in range(depth):
+            self.assertEqual(inner[0]['depth'], x)
+            inner = inner[0]['next']
+        self.assertEqual(inner, [])
+
+    def testStreamArray(self):
+        """Test decoding the items of an array one at a time."""
+        params = [[{'id': x, 'ok': x % 2 == 0} for x in range(10)], 'end']
+        params_xml = py2xml(*params)
+        decoded = iterxml2py(params_xml)
+        value = params_xml.find('{%s}param/{%s}value' % (NS, NS))
+        items = iterarray(value)
+        self.assertEqual(next(items), {'id': 0, 'ok': True})
+        self.assertEqual(list(items), params[0][1:])
+        self.assertEqual(list(decoded), params)
+
+    def testLargeRoundTrip(self):
+        """Test converting a large batch of structs both ways."""
+        params = [[{'id': x, 'name': 'item %s' % x, 'price': x * 1.5,
+                    'tags': ['a', 'b'], 'active': True}
+                   for x in range(2000)]]
+        self.assertEqual(xml2py(py2xml(*params)), params)
+
 suite = unittest.TestLoader().loadTestsFromTestCase(TestJabberRPC)
 
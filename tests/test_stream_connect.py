@@ -0,0 +1,138 @@
+import socket
+import unittest
+from sleekxmpp.test import SleekTest
+from sleekxmpp.xmlstream import XMLStream
+from sleekxmpp.xmlstream import xmlstream
+
+
+class TestConnectionRacing(SleekTest):
+    """
+    Test racing connection attempts across DNS answers.
+    """
+
+    def setUp(self):
+        self.stream = XMLStream()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+
+        # Reserve a port with nothing listening on it.
+        closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        closed.bind(('127.0.0.1', 0))
+        self.closed_port = closed.getsockname()[1]
+        closed.close()
+
+    def tearDown(self):
+        self.server.close()
+
+    def testRaceSkipsRefused(self):
+        """Test that a refused address does not delay the next attempt."""
+        self.stream.connection_attempt_delay = 10
+        answers = [('a.example', '127.0.0.1', self.closed_port),
+                   ('b.example', '127.0.0.1', self.port)]
+
+        result = self.stream._race_connect(answers)
+        self.assertTrue(result is not None, "No connection was made.")
+        sock, host, address, port = result
+        sock.close()
+
+        self.assertEqual((host, address, port),
+                         ('b.example', '127.0.0.1', self.port))
+        self.assertEqual(self.stream.connect_latency[('127.0.0.1',
+                                                      self.closed_port)],
+                         None)
+        self.assertTrue(self.stream.connect_latency[('127.0.0.1',
+                                                     self.port)] < 10)
+
+    def testRacePrefersFast(self):
+        """Test that failed addresses are tried after known-good ones."""
+        self.stream.connect_latency[('127.0.0.1', self.closed_port)] = None
+        self.stream.connect_latency[('127.0.0.1', self.port)] = 0.01
+
+        attempts = []
+        start_connect = self.stream._start_connect
+
+        def record(address, port):
+            attempts.append(port)
+            return start_connect(address, port)
+        self.stream._start_connect = record
+
+        answers = [('a.example', '127.0.0.1', self.closed_port),
+                   ('b.example', '127.0.0.1', self.port)]
+        sock = self.stream._race_connect(answers)[0]
+        sock.close()
+
+        self.assertEqual(attempts[0], self.port)
+
+    def testRaceFails(self):
+        """Test that None is returned when no address is reachable."""
+        answers = [('a.example', '127.0.0.1', self.closed_port)]
+        self.assertEqual(self.stream._race_connect(answers), None)
+
+
+class FakeSSLSocket(object):
+
+    def __init__(self, context, session, session_reused):
+        self.context = context
+        self.session = session
+        self.session_reused = session_reused
+
+
+class TestTLSResumption(SleekTest):
+    """
+    Test sharing SSL contexts and sessions between connections.
+    """
+
+    def setUp(self):
+        xmlstream._ssl_contexts.clear()
+        xmlstream._ssl_sessions.clear()
+        self.socks = []
+
+    def tearDown(self):
+        for sock in self.socks:
+            sock.close()
+
+    def wrap(self, stream):
+        sock, peer = socket.socketpair()
+        if not isinstance(sock, socket.socket):
+            # Python 2 returns the bare sockets, which ssl can not wrap.
+            sock = socket.socket(_sock=sock)
+        self.socks.extend([sock, peer])
+        stream.socket = sock
+        stream.address = ('127.0.0.1', 5222)
+        return stream._create_secure_socket()
+
+    def testSharedContext(self):
+        """Test that streams with the same TLS settings share a context."""
+        first = self.wrap(XMLStream())
+        second = self.wrap(XMLStream())
+        self.assertTrue(first.context is second.context)
+
+        stream = XMLStream()
+        stream.ciphers = 'HIGH'
+        third = self.wrap(stream)
+        self.assertFalse(first.context is third.context)
+
+    def testSessionStats(self):
+        """Test counting full and resumed handshakes."""
+        stream = XMLStream()
+        stream.address = ('127.0.0.1', 5222)
+        context = object()
+
+        stream._ssl_socket = FakeSSLSocket(context, 'session-1', False)
+        stream._tls_established()
+        stream._ssl_socket = FakeSSLSocket(context, 'session-2', True)
+        stream._tls_established()
+
+        self.assertEqual(stream.tls_stats, {'full': 1, 'resumed': 1})
+        self.assertEqual(xmlstream._ssl_sessions[(context, stream.address)],
+                         'session-2')
+
+        stream._save_tls_session(discard=True)
+        self.assertEqual(xmlstream._ssl_sessions, {})
+
+
+suite = unittest.TestSuite([
+    unittest.TestLoader().loadTestsFromTestCase(TestConnectionRacing),
+    unittest.TestLoader().loadTestsFromTestCase(TestTLSResumption)])
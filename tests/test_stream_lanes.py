@@ -0,0 +1,144 @@
+import time
+import threading
+import unittest
+from sleekxmpp.test import SleekTest
+from sleekxmpp.xmlstream.sendqueue import SendQueue
+
+
+class TestSendQueue(unittest.TestCase):
+    """
+    Test draining the lanes of the send queue.
+    """
+
+    def testWeightedDrain(self):
+        """Test that lanes are drained by weighted round robin."""
+        queue = SendQueue(weights={'control': 2, 'interactive': 1, 'bulk': 1})
+        for x in range(4):
+            queue.put('b%s' % x, 'bulk')
+            queue.put('i%s' % x, 'interactive')
+        for x in range(3):
+            queue.put('c%s' % x, 'control')
+
+        items = [queue.get(block=False) for x in range(11)]
+        self.assertEqual(items, ['c0', 'c1', 'i0', 'b0',
+                                 'c2', 'i1', 'b1',
+                                 'i2', 'b2',
+                                 'i3', 'b3'])
+        self.assertTrue(queue.empty())
+        self.assertEqual(queue.stats['control']['sent'], 3)
+
+    def testLaneBounds(self):
+        """Test waiting for space in a full lane."""
+        queue = SendQueue(maxsizes={'bulk': 2})
+        queue.put('b0', 'bulk')
+        queue.put('b1', 'bulk')
+        self.assertTrue(queue.full('bulk'))
+        self.assertFalse(queue.wait_for_space('bulk', 0.01))
+        self.assertTrue(queue.wait_for_space('control', 0.01))
+
+        threading.Timer(0.1, queue.get).start()
+        self.assertTrue(queue.wait_for_space('bulk', 5))
+
+    def testJoin(self):
+        """Test that wakeup items are not counted as unfinished."""
+        queue = SendQueue()
+        queue.put(None, 'control')
+        queue.put('data')
+        queue.get()
+        queue.get()
+        queue.task_done()
+        queue.join()
+
+
+class TestSendLanes(SleekTest):
+    """
+    Test choosing send queue lanes for stanzas.
+    """
+
+    def setUp(self):
+        self.stream_start(mode='client')
+
+    def tearDown(self):
+        self.stream_close()
+
+    def testLaneChoice(self):
+        """Test deriving lanes from stanzas and hints."""
+        iq = self.xmpp.Iq(stype='result')
+        self.assertEqual(self.xmpp.send_lane(iq), 'control')
+        iq = self.xmpp.Iq(stype='get')
+        self.assertEqual(self.xmpp.send_lane(iq), 'interactive')
+        iq.lane = 'bulk'
+        self.assertEqual(self.xmpp.send_lane(iq), 'bulk')
+        msg = self.xmpp.Message()
+        self.assertEqual(self.xmpp.send_lane(msg), 'interactive')
+
+    def testControlLatency(self):
+        """Test that control stanzas overtake a saturated bulk lane."""
+        # Pause the send thread while the bulk lane fills up.
+        self.xmpp.session_started_event.clear()
+        self.xmpp.send_queue.put(None, 'control')
+        time.sleep(0.1)
+        for x in range(200):
+            msg = self.xmpp.Message(sto='user@localhost')
+            msg['body'] = 'bulk %s' % x
+            msg.lane = 'bulk'
+            msg.send()
+        self.xmpp.Iq(stype='result', sto='user@localhost', sid='1').send()
+        self.xmpp.session_started_event.set()
+
+        position = None
+        for x in range(201):
+            data = self.xmpp.socket.next_sent(timeout=1)
+            if data is None:
+                break
+            if b'<iq' in data:
+                position = x
+        self.assertEqual(position, 0)
+
+        stats = self.xmpp.send_queue.stats
+        self.assertEqual(stats['bulk']['sent'], 200)
+
+    def testOrderedWrite(self):
+        """Test that the send lock is held from ordered filters to the write."""
+        events = []
+
+        class RecordingLock(object):
+            def __init__(self, lock):
+                self.lock = lock
+                self.depth = 0
+
+            def __enter__(self):
+                self.lock.acquire()
+                self.depth += 1
+
+            def __exit__(self, *args):
+                self.depth -= 1
+                if not self.depth:
+                    events.append('release')
+                self.lock.release()
+
+        def ordered(stanza, data):
+            events.append('filter')
+            return data
+
+        socket_send = self.xmpp.socket.send
+
+        def send(data):
+            events.append('write')
+            return socket_send(data)
+
+        self.xmpp.send_lock = RecordingLock(self.xmpp.send_lock)
+        self.xmpp.socket.send = send
+        self.xmpp.add_filter('out_ordered', ordered)
+
+        self.xmpp.send_message(mto='user@localhost', mbody='queued')
+        self.xmpp.socket.next_sent(timeout=1)
+        self.xmpp.send(self.xmpp.make_message('user@localhost'), now=True)
+        self.xmpp.socket.next_sent(timeout=1)
+
+        self.assertEqual(events, ['filter', 'write', 'release'] * 2)
+
+
+suite = unittest.TestSuite([
+    unittest.TestLoader().loadTestsFromTestCase(TestSendQueue),
+    unittest.TestLoader().loadTestsFromTestCase(TestSendLanes)])
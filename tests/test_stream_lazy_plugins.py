@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import subprocess
+import unittest
+from sleekxmpp.test import SleekTest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP = """
+import sys
+import sleekxmpp
+xmpp = sleekxmpp.ClientXMPP('tester@localhost', 'test')
+xmpp.lazy_plugins = %s
+xmpp.register_plugins()
+print(len([name for name in sleekxmpp.plugins.__all__
+           if xmpp.plugin.enabled(name)]))
+print(len([name for name in sys.modules
+           if name.startswith('sleekxmpp.plugins.xep_')]))
+"""
+
+
+class TestLazyPlugins(SleekTest):
+    """
+    Test enabling plugins on first use.
+    """
+
+    def setUp(self):
+        self.stream_start(mode='client', plugins=[])
+        self.xmpp.lazy_plugins = True
+        self.xmpp.plugin_whitelist = ['xep_0030', 'xep_0092', 'xep_0198']
+        self.xmpp.plugin_config = {'xep_0092': {'name': 'Lazy'}}
+        self.xmpp.register_plugins()
+
+    def tearDown(self):
+        self.stream_close()
+
+    def testDeferred(self):
+        """Test that only stream negotiation plugins start enabled."""
+        self.assertTrue(self.xmpp.plugin.enabled('xep_0198'))
+        self.assertFalse(self.xmpp.plugin.enabled('xep_0092'))
+        self.assertTrue(self.xmpp.plugin.deferred('xep_0092'))
+        self.assertTrue('xep_0092' in self.xmpp.plugin)
+
+    def testAccess(self):
+        """Test enabling a plugin and its dependencies on access."""
+        version = self.xmpp['xep_0092']
+        self.assertEqual(version.software_name, 'Lazy')
+        self.assertTrue(self.xmpp.plugin.enabled('xep_0030'))
+        self.assertFalse(self.xmpp.plugin.deferred('xep_0030'))
+
+    def testReceived(self):
+        """Test enabling a plugin when its namespace is received."""
+        self.recv("""
+          <iq type="get" id="1" from="user@localhost">
+            <query xmlns="jabber:iq:version" />
+          </iq>
+        """)
+        self.send("""
+          <iq type="result" id="1" to="user@localhost">
+            <query xmlns="jabber:iq:version">
+              <name>Lazy</name>
+              <version>%s</version>
+            </query>
+          </iq>
+        """ % self.xmpp['xep_0092'].version)
+
+    def testAdvertised(self):
+        """Test that deferred plugins' features are advertised."""
+        self.xmpp.event('session_bind', self.xmpp.boundjid)
+        time.sleep(0.2)
+        info = self.xmpp['xep_0030'].get_info(jid=self.xmpp.boundjid.full,
+                                              local=True)
+        self.assertTrue('jabber:iq:version' in info['features'])
+        self.assertTrue(self.xmpp.plugin.deferred('xep_0092'))
+
+
+class TestLazyStartup(unittest.TestCase):
+    """
+    Compare registering all plugins eagerly and lazily.
+    """
+
+    def startup(self, lazy):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+                [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+        out = subprocess.check_output(
+                [sys.executable, '-c', STARTUP % lazy],
+                cwd=ROOT, env=env)
+        return [int(n) for n in out.split()]
+
+    def testStartup(self):
+        """Test that lazy registration enables and imports fewer plugins."""
+        eager_enabled, eager_imported = self.startup(False)
+        lazy_enabled, lazy_imported = self.startup(True)
+        self.assertTrue(lazy_enabled < eager_enabled)
+        self.assertTrue(lazy_imported < eager_imported)
+
+
+suite = unittest.TestSuite([
+    unittest.TestLoader().loadTestsFromTestCase(TestLazyPlugins),
+    unittest.TestLoader().loadTestsFromTestCase(TestLazyStartup)])
@@ -350,5 +350,77 @@ class TestStreamRoster(SleekTest):
 
         t.join()
 
+    def testRosterIndexes(self):
+        """Test that roster group and subscription indexes track changes."""
+        self.stream_start()
+        roster = self.xmpp.client_roster
+
+        roster.add('user@localhost', groups=['Friends'], afrom=True)
+        roster.add('other@localhost', ato=True, pending_in=True)
+
+        self.assertEqual(roster.by_group('Friends'), ['user@localhost'])
+        self.assertEqual(roster.by_group(''), ['other@localhost'])
+        self.assertEqual(roster.by_subscription('from'), ['user@localhost'])
+        self.assertEqual(roster.by_subscription('pending_in'),
+                         ['other@localhost'])
+
+        roster['other@localhost']['from'] = True
+        roster['other@localhost']['pending_in'] = False
+        roster['user@localhost']['groups'] = ['Work']
+
+        self.assertEqual(roster.by_subscription('both'), ['other@localhost'])
+        self.assertEqual(roster.by_subscription('pending_in'), [])
+        self.assertEqual(roster.by_group('Friends'), [])
+        self.assertEqual(roster.groups(), {'Work': ['user@localhost'],
+                                           '': ['other@localhost']})
+
+        del roster['user@localhost']
+        self.assertEqual(roster.by_group('Work'), [])
+        self.assertEqual(roster.by_subscription('from'), [])
+
+    def testRosterAvailableIndex(self):
+        """Test that the roster tracks JIDs with online resources."""
+        self.stream_start()
+        roster = self.xmpp.client_roster
+
+        self.recv("""
+          <presence from="user@localhost/a" to="tester@localhost" />
+        """)
+        self.recv("""
+          <presence from="user@localhost/b" to="tester@localhost" />
+        """)
+        time.sleep(.1)
+        self.assertEqual(roster.available(), ['user@localhost'])
+
+        self.recv("""
+          <presence from="user@localhost/a" to="tester@localhost"
+                    type="unavailable" />
+        """)
+        time.sleep(.1)
+        self.assertEqual(roster.available(), ['user@localhost'])
+
+        self.recv("""
+          <presence from="user@localhost/b" to="tester@localhost"
+                    type="unavailable" />
+        """)
+        time.sleep(.1)
+        self.assertEqual(roster.available(), [])
+
+    def testComponentPresenceBroadcast(self):
+        """Test that components broadcast presence to subscribers only."""
+        self.stream_start(mode='component', plugins=[])
+        roster = self.xmpp.roster['tester.localhost']
+        roster.add('user@localhost', afrom=True)
+        roster.add('other@localhost', ato=True)
+
+        roster.send_presence(pshow='away')
+
+        self.send("""
+          <presence to="user@localhost" from="tester.localhost">
+            <show>away</show>
+          </presence>
+        """, use_values=False)
+        self.send(None)
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestStreamRoster)
@@ -0,0 +1,145 @@
+import time
+import unittest
+from sleekxmpp.test import SleekTest
+from sleekxmpp.exceptions import RateLimited, IqTimeout
+from sleekxmpp.xmlstream.shaper import RateShaper
+
+
+class TestRateShaper(unittest.TestCase):
+    """
+    Test token bucket rate limits.
+    """
+
+    def testStanzaRate(self):
+        """Test waiting for stanza tokens."""
+        shaper = RateShaper(stanzas_per_sec=20, burst=0.1)
+        start = time.time()
+        for x in range(6):
+            self.assertEqual(shaper.admit(None), None)
+        elapsed = time.time() - start
+
+        # Two stanzas fit in the burst, the rest wait 50ms each.
+        self.assertTrue(elapsed >= 0.18, elapsed)
+        self.assertEqual(shaper.stats['sent'], 6)
+        self.assertEqual(shaper.stats['delayed'], 4)
+        self.assertTrue(shaper.stats['max_delay'] > 0)
+
+    def testByteDebt(self):
+        """Test that large stanzas hold back the ones after them."""
+        shaper = RateShaper(bytes_per_sec=1000, mode='drop')
+        self.assertEqual(shaper.admit(None), None)
+        shaper.charge(None, 1500)
+        delay = shaper.admit(None)
+        self.assertTrue(0.4 < delay <= 0.5, delay)
+        self.assertEqual(shaper.stats['dropped'], 1)
+
+    def testPerJID(self):
+        """Test that per JID limits do not affect other JIDs."""
+        shaper = RateShaper(jid_stanzas_per_sec=1, mode='drop')
+        self.assertEqual(shaper.admit('a@localhost'), None)
+        self.assertNotEqual(shaper.admit('a@localhost'), None)
+        self.assertEqual(shaper.admit('b@localhost'), None)
+        self.assertEqual(shaper.admit(None), None)
+
+    def testMaxDelay(self):
+        """Test shedding stanzas which would wait too long."""
+        shaper = RateShaper(stanzas_per_sec=1, max_delay=0.1)
+        self.assertEqual(shaper.admit(None), None)
+        start = time.time()
+        self.assertNotEqual(shaper.admit(None), None)
+        self.assertTrue(time.time() - start < 0.1)
+        self.assertEqual(shaper.stats['dropped'], 1)
+
+
+class TestStreamShaping(SleekTest):
+    """
+    Test applying rate limits to sent stanzas.
+    """
+
+    def setUp(self):
+        self.stream_start(mode='client')
+        self.xmpp.shaper.jid_stanzas_per_sec = 1
+
+    def tearDown(self):
+        self.stream_close()
+
+    def testDrop(self):
+        """Test shedding stanzas in drop mode."""
+        events = []
+        self.xmpp.add_event_handler('rate_limited', events.append)
+        self.xmpp.shaper.mode = 'drop'
+
+        self.xmpp.send_message(mto='user@localhost', mbody='a')
+        self.send("""
+          <message to="user@localhost"><body>a</body></message>
+        """)
+        self.xmpp.send_message(mto='user@localhost', mbody='b')
+        self.xmpp.send_message(mto='other@localhost', mbody='c')
+        self.send("""
+          <message to="other@localhost"><body>c</body></message>
+        """)
+
+        time.sleep(0.1)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['jid'], 'user@localhost')
+        self.assertEqual(events[0]['action'], 'drop')
+        self.assertEqual(events[0]['stanza']['body'], 'b')
+
+    def testFail(self):
+        """Test failing fast when a stanza exceeds the limits."""
+        msg = self.xmpp.Message(sto='user@localhost')
+        msg.send()
+        try:
+            self.xmpp.send(msg, shaping='fail')
+        except RateLimited as e:
+            self.assertTrue(e.delay > 0)
+            self.assertTrue(e.stanza is msg)
+        else:
+            self.fail('Expected RateLimited')
+        self.assertEqual(self.xmpp.shaper.stats['failed'], 1)
+
+    def testFailInHandler(self):
+        """Test that a rate limit failure in a handler sends no reply."""
+        def handle_message(msg):
+            raise RateLimited(msg, 1.0)
+
+        self.xmpp.add_event_handler('message', handle_message)
+        self.recv("""
+          <message to="tester@localhost" from="user@localhost" id="1">
+            <body>Hi</body>
+          </message>
+        """)
+        self.send(None)
+
+    def testDroppedIq(self):
+        """Test that a dropped Iq does not wait for a reply."""
+        self.xmpp.shaper.mode = 'drop'
+        self.xmpp.Iq(sto='user@localhost', stype='get', sid='1').send(
+                block=False)
+
+        iq = self.xmpp.Iq(sto='user@localhost', stype='get', sid='2')
+        start = time.time()
+        self.assertRaises(IqTimeout, iq.send, timeout=5)
+        self.assertTrue(time.time() - start < 1)
+        self.assertFalse(self.xmpp.remove_handler('IqWait_2'))
+
+        timeouts = []
+        iq = self.xmpp.Iq(sto='user@localhost', stype='get', sid='3')
+        self.assertEqual(iq.send(callback=lambda iq: None,
+                                 timeout_callback=timeouts.append), False)
+        self.assertFalse(self.xmpp.remove_handler('IqCallback_3'))
+        self.assertEqual(len(timeouts), 1)
+
+    def testChargeBytes(self):
+        """Test that stanzas are charged by their encoded size."""
+        sizes = []
+        self.xmpp.shaper.charge = lambda jid, size: sizes.append(size)
+        msg = self.xmpp.Message(sto='user@localhost')
+        msg['body'] = u'\u00e9'
+        msg.send()
+        self.assertEqual(sizes, [len(msg.__str__().encode('utf-8'))])
+
+
+suite = unittest.TestSuite([
+    unittest.TestLoader().loadTestsFromTestCase(TestRateShaper),
+    unittest.TestLoader().loadTestsFromTestCase(TestStreamShaping)])
@@ -0,0 +1,180 @@
+import time
+import threading
+import unittest
+
+from sleekxmpp.exceptions import RateLimited
+from sleekxmpp.plugins.xep_0009.remote import RemoteSession, Endpoint, \
+    ANY_ALL, TimeoutException, remote
+from sleekxmpp.test import SleekTest
+
+
+class Thermostat(Endpoint):
+
+    def FQN(self):
+        return 'thermostat'
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    @remote
+    def get_temperature(self):
+        time.sleep(self.delay)
+        return 18
+
+
+class TestJabberRPC(SleekTest):
+    """
+    Test pipelined and concurrent Jabber-RPC calls.
+    """
+
+    def setUp(self):
+        self.stream_start(mode='client', plugins=['xep_0009'])
+        self.session = RemoteSession(self.xmpp, lambda: None, window=2)
+        self.session._bind_events()
+
+    def tearDown(self):
+        self.session._workers.shutdown()
+        self.stream_close()
+
+    def respond(self, pid, value):
+        self.recv("""
+          <iq type="result" id="%s" from="rpc@localhost">
+            <query xmlns="jabber:iq:rpc">
+              <methodResponse>
+                <params>
+                  <param><value><i4>%s</i4></value></param>
+                </params>
+              </methodResponse>
+            </query>
+          </iq>
+        """ % (pid, value))
+
+    def wait_for_calls(self, count):
+        for _ in range(20):
+            if self.session.stats['calls'] >= count:
+                break
+            time.sleep(0.1)
+
+    def testWindow(self):
+        """Test that calls beyond the in-flight window wait for replies."""
+        first = self.session.call_async('rpc@localhost', 'calc.add', 1, 2)
+        second = self.session.call_async('rpc@localhost', 'calc.add', 3, 4)
+
+        third = []
+        t = threading.Thread(target=lambda: third.append(
+            self.session.call_async('rpc@localhost', 'calc.add', 5, 6)))
+        t.daemon = True
+        t.start()
+        time.sleep(0.2)
+        self.assertEqual(third, [], 'Call sent beyond the window.')
+        self.assertEqual(self.session._in_flight['rpc@localhost'], 2)
+
+        self.respond('1', 3)
+        t.join(2)
+        self.assertEqual(len(third), 1)
+        self.assertEqual(first.get_value(1), 3)
+
+        self.respond('2', 7)
+        self.respond('3', 11)
+        self.assertEqual(second.get_value(1), 7)
+        self.assertEqual(third[0].get_value(1), 11)
+        self.assertFalse(self.session._in_flight)
+        self.assertEqual(self.session.stats['completed'], 3)
+
+    def testMultiCall(self):
+        """Test a batch of calls, including a failed one."""
+        results = []
+        t = threading.Thread(target=lambda: results.extend(
+            self.session.multi_call('rpc@localhost', [
+                ('calc.add', (1, 2)),
+                ('calc.div', (1, 0)),
+                ('calc.add', (3, 4))], timeout=5)))
+        t.daemon = True
+        t.start()
+
+        self.wait_for_calls(2)
+        self.respond('1', 3)
+        self.recv("""
+          <iq type="result" id="2" from="rpc@localhost">
+            <query xmlns="jabber:iq:rpc">
+              <methodResponse>
+                <fault>
+                  <value>
+                    <struct>
+                      <member>
+                        <name>faultCode</name>
+                        <value><int>500</int></value>
+                      </member>
+                      <member>
+                        <name>faultString</name>
+                        <value><string>Division by zero</string></value>
+                      </member>
+                    </struct>
+                  </value>
+                </fault>
+              </methodResponse>
+            </query>
+          </iq>
+        """)
+        # The third call waits for room in the window.
+        self.wait_for_calls(3)
+        self.respond('3', 7)
+        t.join(5)
+
+        self.assertEqual(results[0], 3)
+        self.assertTrue(isinstance(results[1], Exception))
+        self.assertEqual(results[2], 7)
+        self.assertEqual(self.session.stats['completed'], 2)
+        self.assertEqual(self.session.stats['failed'], 1)
+        self.assertEqual(self.session.stats['batches'], 1)
+        self.assertTrue(self.session.stats['batch_rate'] > 0)
+
+    def testExpiredCalls(self):
+        """Test that unanswered calls fail without a full window."""
+        self.session.call_timeout = 0.2
+        future = self.session.call_async('rpc@localhost', 'calc.add', 1, 2)
+        self.assertRaises(TimeoutException, future.get_value, 3)
+        self.assertFalse(self.session._in_flight)
+        self.assertEqual(self.session.stats['timeouts'], 1)
+
+    def testFailedSend(self):
+        """Test that a call which could not be sent leaves the window."""
+        self.xmpp.shaper.jid_stanzas_per_sec = 1
+        self.xmpp.shaper.mode = 'fail'
+        first = self.session.call_async('rpc@localhost', 'calc.add', 1, 2)
+        self.assertRaises(RateLimited, self.session.call_async,
+                          'rpc@localhost', 'calc.add', 3, 4)
+        self.assertEqual(self.session._in_flight['rpc@localhost'], 1)
+        self.assertEqual(self.session.stats['failed'], 1)
+
+        self.respond('1', 3)
+        self.assertEqual(first.get_value(1), 3)
+        self.assertFalse(self.session._in_flight)
+        self.assertFalse(self.session._calls)
+
+    def testConcurrentHandlers(self):
+        """Test that incoming calls are handled in parallel."""
+        self.session.new_handler(ANY_ALL, Thermostat, 0.5)
+        start = time.time()
+        for pid in ('a', 'b'):
+            self.recv("""
+              <iq type="set" id="%s" from="rpc@localhost">
+                <query xmlns="jabber:iq:rpc">
+                  <methodCall>
+                    <methodName>thermostat.get_temperature</methodName>
+                    <params />
+                  </methodCall>
+                </query>
+              </iq>
+            """ % pid)
+        for _ in range(30):
+            if self.session.stats['handled'] == 2:
+                break
+            time.sleep(0.1)
+        elapsed = time.time() - start
+        self.assertEqual(self.session.stats['handled'], 2)
+        self.assertTrue(elapsed < 1.0,
+                        'Handlers ran one after another: %.2fs' % elapsed)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestJabberRPC)
@@ -0,0 +1,140 @@
+import time
+import unittest
+from sleekxmpp.test import SleekTest
+from sleekxmpp.jid import JID
+from sleekxmpp.plugins.xep_0045 import Occupant, Occupants
+
+
+class TestMUCOccupants(SleekTest):
+
+    """
+    Test tracking room occupants with the XEP-0045 plugin.
+    """
+
+    def setUp(self):
+        self.stream_start(mode='client',
+                          plugins=['xep_0030',
+                                   'xep_0004',
+                                   'xep_0045'])
+        self.muc = self.xmpp['xep_0045']
+
+    def tearDown(self):
+        self.stream_close()
+
+    def join(self):
+        self.muc.joinMUC('room@muc.example.com', 'sleek')
+        self.send("""
+          <presence to="room@muc.example.com/sleek">
+            <x xmlns="http://jabber.org/protocol/muc">
+              <history maxchars="0" />
+            </x>
+          </presence>
+        """, use_values=False)
+
+    def occupant(self, nick, jid, role='participant',
+                 affiliation='member', status=''):
+        self.recv("""
+          <presence from="room@muc.example.com/%s">
+            <x xmlns="http://jabber.org/protocol/muc#user">
+              <item jid="%s" role="%s" affiliation="%s" />
+              %s
+            </x>
+          </presence>
+        """ % (nick, jid, role, affiliation, status))
+
+    def testOccupantIndexes(self):
+        """Test looking up occupants by JID, role, and affiliation."""
+        self.join()
+        self.occupant('alice', 'alice@example.com/home',
+                      role='moderator', affiliation='owner')
+        self.occupant('bob', 'bob@example.com/work')
+        self.occupant('bob2', 'bob@example.com/phone')
+        time.sleep(0.2)
+
+        room = 'room@muc.example.com'
+        self.assertTrue(self.muc.jidInRoom(room, 'bob@example.com/work'))
+        self.assertEqual(self.muc.getNick(room, 'alice@example.com/home'),
+                         'alice')
+        self.assertEqual(self.muc.getUsersByRole(room, 'participant'),
+                         set(['bob', 'bob2']))
+        self.assertEqual(self.muc.getNicksByAffiliation(room, 'owner'),
+                         set(['alice']))
+        self.assertEqual(self.muc.rooms[room].by_bare_jid('bob@example.com'),
+                         set(['bob', 'bob2']))
+        self.assertEqual(self.muc.getJidProperty(room, 'bob', 'role'),
+                         'participant')
+
+        # Role changes update the indexes.
+        self.occupant('bob', 'bob@example.com/work', role='moderator')
+        self.recv("""
+          <presence from="room@muc.example.com/bob2" type="unavailable">
+            <x xmlns="http://jabber.org/protocol/muc#user">
+              <item jid="bob@example.com/phone" role="none"
+                    affiliation="member" />
+            </x>
+          </presence>
+        """)
+        time.sleep(0.2)
+
+        self.assertEqual(self.muc.getUsersByRole(room, 'moderator'),
+                         set(['alice', 'bob']))
+        self.assertEqual(self.muc.getUsersByRole(room, 'participant'),
+                         set())
+        self.assertFalse(self.muc.jidInRoom(room, 'bob@example.com/phone'))
+        self.assertEqual(self.muc.getNick(room, 'bob@example.com/phone'),
+                         None)
+
+    def testOccupantChanges(self):
+        """Test that changing stored occupants updates the indexes."""
+        occupants = Occupants()
+        occupants['alice'] = Occupant('room', 'alice',
+                                      JID('alice@example.com/home'),
+                                      role='participant')
+        occupants['alice']['role'] = 'moderator'
+        occupants['alice'].affiliation = 'owner'
+        occupants['alice']['jid'] = JID('alice@example.com/work')
+        self.assertEqual(occupants.by_role('moderator'), set(['alice']))
+        self.assertEqual(occupants.by_role('participant'), set())
+        self.assertEqual(occupants.by_affiliation('owner'), set(['alice']))
+        self.assertEqual(occupants.by_jid('alice@example.com/work'), 'alice')
+        self.assertEqual(occupants.by_jid('alice@example.com/home'), None)
+
+        bob = Occupant('room', 'bob', role='visitor')
+        occupants.update(bob=bob)
+        occupants.setdefault('carol', Occupant('room', 'carol',
+                                               role='visitor'))
+        self.assertEqual(occupants.by_role('visitor'), set(['bob', 'carol']))
+
+        # Removed occupants no longer change the indexes.
+        del occupants['bob']
+        bob['role'] = 'moderator'
+        self.assertEqual(occupants.by_role('moderator'), set(['alice']))
+        self.assertEqual(occupants.by_role('visitor'), set(['carol']))
+
+    def testBatchedJoin(self):
+        """Test reporting the initial occupants with one event."""
+        self.muc.batch_join = True
+        events = []
+        loaded = []
+
+        self.xmpp.add_event_handler(
+                'muc::room@muc.example.com::got_online',
+                lambda pr: events.append(pr['muc']['nick']))
+        self.xmpp.add_event_handler(
+                'muc::room@muc.example.com::roster_loaded',
+                lambda occupants: loaded.append(sorted(occupants)))
+
+        self.join()
+        self.occupant('alice', 'alice@example.com/home')
+        self.occupant('bob', 'bob@example.com/work')
+        self.occupant('sleek', 'tester@localhost/resource',
+                      status='<status code="110" />')
+        time.sleep(0.2)
+        self.occupant('carol', 'carol@example.com/home')
+        time.sleep(0.2)
+
+        self.assertEqual(loaded, [['alice', 'bob', 'sleek']])
+        self.assertEqual(events, ['sleek', 'carol'])
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestMUCOccupants)
@@ -1,3 +1,4 @@
+import socket
 import threading
 import time
 
@@ -177,5 +178,146 @@ class TestInBandByteStreams(SleekTest):
 
         self.assertEqual(data, [b'it works!'])
 
+    def open_test_stream(self, **kwargs):
+        """Open an outgoing stream with sid 'testing'."""
+        streams = []
+        self.xmpp.add_event_handler('ibb_stream_start', streams.append)
+
+        kwargs['sid'] = 'testing'
+        t = threading.Thread(name='open_stream',
+                             target=self.xmpp['xep_0047'].open_stream,
+                             args=('tester@localhost/receiver',),
+                             kwargs=kwargs)
+        t.start()
+
+        self.send("""
+          <iq type="set" to="tester@localhost/receiver" id="1">
+            <open xmlns="http://jabber.org/protocol/ibb"
+                  sid="testing"
+                  block-size="%s"
+                  stanza="iq" />
+          </iq>
+        """ % kwargs.get('block_size', 4096))
+
+        self.recv("""
+          <iq type="result" id="1"
+              to="tester@localhost"
+              from="tester@localhost/receiver" />
+        """)
+
+        t.join()
+        time.sleep(0.2)
+        return streams[0]
+
+    def testPipelinedSend(self):
+        """Test sending several blocks before any are acked."""
+        stream = self.open_test_stream(block_size=4, window=2)
+
+        t = threading.Thread(name='sendall',
+                             target=stream.sendall,
+                             args=(b'abcdefgh12',))
+        t.start()
+
+        self.send("""
+          <iq type="set" id="2"
+              from="tester@localhost"
+              to="tester@localhost/receiver">
+            <data xmlns="http://jabber.org/protocol/ibb"
+                  seq="0" sid="testing">YWJjZA==</data>
+          </iq>
+        """)
+        self.send("""
+          <iq type="set" id="3"
+              from="tester@localhost"
+              to="tester@localhost/receiver">
+            <data xmlns="http://jabber.org/protocol/ibb"
+                  seq="1" sid="testing">ZWZnaA==</data>
+          </iq>
+        """)
+
+        # The window is full until a block is acked.
+        self.send(None)
+        self.recv("""
+          <iq type="result" id="2"
+              to="tester@localhost"
+              from="tester@localhost/receiver" />
+        """)
+
+        self.send("""
+          <iq type="set" id="4"
+              from="tester@localhost"
+              to="tester@localhost/receiver">
+            <data xmlns="http://jabber.org/protocol/ibb"
+                  seq="2" sid="testing">MTI=</data>
+          </iq>
+        """)
+        t.join()
+        self.assertEqual(stream.bytes_sent, 10)
+
+    def testDroppedBlock(self):
+        """Test that a block dropped by the rate limits fails the stream."""
+        stream = self.open_test_stream(block_size=4, window=2)
+        self.xmpp.shaper.jid_stanzas_per_sec = 1
+        self.xmpp.shaper.mode = 'drop'
+
+        self.assertEqual(stream.send(b'abcd'), 4)
+        self.assertRaises(socket.error, stream.send, b'efgh')
+        self.assertEqual(stream.window_ids, set(['2']))
+        self.assertEqual(list(stream._sent_at), ['2'])
+        self.assertTrue(stream.stream_out_closed.is_set())
+        self.assertEqual(stream.bytes_sent, 4)
+
+    def testReadFile(self):
+        """Test reassembling received blocks through a file object."""
+        stream = self.open_test_stream()
+        self.assertTrue(stream.makefile() is stream)
+        reader = stream.as_file()
+
+        for seq, data in enumerate(('aXQg', 'd29ya3Mh')):
+            self.recv("""
+              <iq type="set" id="%s"
+                  to="tester@localhost"
+                  from="tester@localhost/receiver">
+                <data xmlns="http://jabber.org/protocol/ibb"
+                      seq="%s" sid="testing">%s</data>
+              </iq>
+            """ % (seq, seq, data))
+            self.send("""
+              <iq type="result" id="%s"
+                  to="tester@localhost/receiver" />
+            """ % seq)
+
+        buf = bytearray(16)
+        size = reader.readinto(buf)
+        self.assertEqual(bytes(buf[:size]), b'it works!')
+        self.assertEqual(stream.bytes_received, 9)
+
+    def testAdaptiveWindow(self):
+        """Test growing and shrinking the send window."""
+        from sleekxmpp.plugins.xep_0047 import IBBytestream
+
+        stream = IBBytestream(self.xmpp, 'testing', 4096, None,
+                              'tester@localhost/receiver',
+                              window_size=1, max_window_size=3)
+        for x in range(10):
+            stream._adjust_window(0.01)
+        self.assertEqual(stream.window_size, 3)
+
+        stream._adjust_window(0.05)
+        self.assertEqual(stream.window_size, 1)
+
+        # The window only changes when a larger maximum size is given.
+        stream = IBBytestream(self.xmpp, 'testing', 4096, None,
+                              'tester@localhost/receiver')
+        for x in range(10):
+            stream._adjust_window(0.01)
+        self.assertEqual(stream.window_size, 1)
+
+        stream = IBBytestream(self.xmpp, 'testing', 4096, None,
+                              'tester@localhost/receiver', window_size=8)
+        stream._adjust_window(0.01)
+        stream._adjust_window(0.05)
+        self.assertEqual(stream.window_size, 8)
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestInBandByteStreams)
@@ -1,9 +1,17 @@
+import os
 import time
 import logging
+import tempfile
+import pickle
 
 import unittest
 from sleekxmpp.test import SleekTest
-from sleekxmpp.xmlstream import ElementBase, register_stanza_plugin
+from sleekxmpp.xmlstream import ElementBase, register_stanza_plugin, JID
+from sleekxmpp.plugins.xep_0050.sessions import SessionStore, SQLiteBackend
+
+
+def handle_stored_step(form, session):
+    return session
 
 
 class TestAdHocCommands(SleekTest):
@@ -778,7 +786,151 @@ class TestAdHocCommands(SleekTest):
                 'Incomplete command workflow: %s' % results)
 
 
+    def testSessionExpiry(self):
+        """Test that abandoned sessions expire."""
+
+        def handle_command(iq, session):
+            form = self.xmpp['xep_0004'].makeForm('form')
+            form.addField(var='foo', ftype='text-single', label='Foo')
+            session['payload'] = form
+            session['next'] = lambda form, session: session
+            session['has_next'] = True
+            return session
+
+        self.xmpp['xep_0050'].add_command('tester@localhost', 'foo',
+                                          'Do Foo', handle_command)
+        self.recv("""
+          <iq id="11" type="set" to="tester@localhost" from="foo@bar">
+            <command xmlns="http://jabber.org/protocol/commands"
+                     node="foo"
+                     action="execute" />
+          </iq>
+        """)
+        self.send("""
+          <iq id="11" type="result" to="foo@bar">
+            <command xmlns="http://jabber.org/protocol/commands"
+                     node="foo"
+                     status="executing"
+                     sessionid="_sessionid_">
+              <actions>
+                <next />
+              </actions>
+              <x xmlns="jabber:x:data" type="form">
+                <field var="foo" label="Foo" type="text-single" />
+              </x>
+            </command>
+          </iq>
+        """)
+
+        sessions = self.xmpp['xep_0050'].sessions
+        expires, packed = sessions.backend['_sessionid_']
+        self.assertFalse(isinstance(packed['stanzas']['payload'][1][0][1],
+                                    ElementBase),
+                         'Session payload was not serialized.')
+        self.assertEqual(packed['jids']['from'], 'foo@bar')
+
+        self.assertEqual(sessions.expire(), 0)
+        self.assertEqual(sessions.expire(expires), 1)
+        self.assertFalse('_sessionid_' in sessions)
+
+    def testSessionLimit(self):
+        """Test that the oldest sessions are discarded beyond the limit."""
+        sessions = SessionStore(ttl=60, max_sessions=2)
+        for sid in ('a', 'b', 'c'):
+            sessions[sid] = {'id': sid}
+            time.sleep(0.01)
+        self.assertEqual(len(sessions), 2)
+        self.assertFalse('a' in sessions)
+        self.assertEqual(sessions['c'], {'id': 'c'})
+        self.assertEqual(sessions.stats['evicted'], 1)
+
+    def testSessionIndex(self):
+        """Test that sessions are expired and evicted by expiry time."""
+        sessions = SessionStore(ttl=60, max_sessions=2)
+        sessions['a'] = {'id': 'a'}
+        sessions['b'] = {'id': 'b'}
+        sessions['a'] = {'id': 'a', 'step': 2}
+        sessions['c'] = {'id': 'c'}
+        self.assertFalse('b' in sessions)
+        self.assertEqual(sessions['a'], {'id': 'a', 'step': 2})
+
+        for _ in range(500):
+            sessions['c'] = {'id': 'c'}
+        self.assertTrue(len(sessions._heap) < 200,
+                        'Replaced sessions were kept in the index.')
+
+        self.assertEqual(sessions.expire(time.time() + 120), 2)
+        self.assertEqual(len(sessions), 0)
+        self.assertFalse(sessions._index)
+
+    def testPersistentSessions(self):
+        """Test resuming a session stored in a database."""
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            form = self.xmpp['xep_0004'].makeForm('form')
+            form.addField(var='foo', ftype='text-single', label='Foo')
 
+            first = SessionStore(SQLiteBackend(path), ttl=60)
+            first.register_handler(handle_stored_step)
+            first['_sessionid_'] = {'id': '_sessionid_',
+                                    'from': JID('foo@bar/baz'),
+                                    'payload': form,
+                                    'payload_classes': set([form.__class__]),
+                                    'next': handle_stored_step,
+                                    'notes': [('info', 'Stored')]}
+            first.backend.close()
+
+            second = SessionStore(SQLiteBackend(path), ttl=60)
+            second.register_handler(handle_stored_step)
+            session = second['_sessionid_']
+            second.backend.close()
+        finally:
+            os.remove(path)
+
+        self.assertEqual(session['from'], JID('foo@bar/baz'))
+        self.assertTrue(session['next'] is handle_stored_step)
+        self.assertEqual(session['payload_classes'], set([form.__class__]))
+        self.assertEqual(session['notes'], [('info', 'Stored')])
+        self.assertEqual(session['payload'].get_fields().keys(),
+                         form.get_fields().keys())
+
+    def testUnknownStoredHandler(self):
+        """Test that sessions with unknown handlers are missing."""
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            first = SessionStore(SQLiteBackend(path), ttl=60)
+            first.register_handler(handle_stored_step)
+            first['_sessionid_'] = {'id': '_sessionid_',
+                                    'next': handle_stored_step}
+            first.backend.close()
+
+            second = SessionStore(SQLiteBackend(path), ttl=60)
+            self.assertFalse('_sessionid_' in second)
+            self.assertEqual(second.get('_sessionid_'), None)
+            self.assertRaises(KeyError, lambda: second['_sessionid_'])
+            second.backend.close()
+        finally:
+            os.remove(path)
+
+    def testStoredObjects(self):
+        """Test that stored sessions can not load arbitrary objects."""
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            backend = SQLiteBackend(path)
+            backend._query('INSERT INTO %s VALUES (?, ?, ?)', 'bad', None,
+                           backend._binary(pickle.dumps(
+                               {'data': JID('foo@bar')}, 2)))
+            backend['good'] = (None, {'data': {'notes': [('info', 'a')],
+                                               'seen': set(['x'])}})
+            self.assertFalse('bad' in SessionStore(backend))
+            self.assertEqual(backend['good'][1]['data']['seen'],
+                             set(['x']))
+            backend.close()
+        finally:
+            os.remove(path)
 
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestAdHocCommands)
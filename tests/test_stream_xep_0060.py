@@ -1,3 +1,4 @@
+import time
 import threading
 
 import unittest
@@ -789,5 +790,56 @@ class TestStreamPubsub(SleekTest):
           </iq>
         """)
 
+    def recvMultiItemEvent(self):
+        self.recv("""
+          <message from="pubsub.example.com" to="tester@localhost">
+            <event xmlns="http://jabber.org/protocol/pubsub#event">
+              <items node="somenode">
+                <item id="item1"><foo xmlns="test:ns">1</foo></item>
+                <item id="item2"><foo xmlns="test:ns">2</foo></item>
+                <retract id="item3" />
+              </items>
+            </event>
+          </message>
+        """)
+
+    def testMultiItemEvents(self):
+        """Test raising one event per item of a notification"""
+        events = []
+
+        def handler(event_type):
+            def record(msg):
+                items = msg['pubsub_event']['items']
+                events.append((event_type, items['node'], msg['from'].full,
+                               [item['id'] for item in items]))
+            return record
+
+        self.xmpp['xep_0060'].map_node_event('somenode', 'some')
+        self.xmpp.add_event_handler('some_publish', handler('publish'))
+        self.xmpp.add_event_handler('some_retract', handler('retract'))
+
+        self.recvMultiItemEvent()
+        time.sleep(0.2)
+
+        self.assertEqual(events, [
+            ('publish', 'somenode', 'pubsub.example.com', ['item1']),
+            ('publish', 'somenode', 'pubsub.example.com', ['item2']),
+            ('retract', 'somenode', 'pubsub.example.com', ['item3'])])
+
+    def testBatchedItemEvent(self):
+        """Test raising a single event for all items of a notification"""
+        events = []
+        self.xmpp['xep_0060'].batch_items = True
+        self.xmpp['xep_0060'].map_node_event('somenode', 'some')
+        self.xmpp.add_event_handler('some_publish', events.append)
+        self.xmpp.add_event_handler('some_items',
+                lambda msg: events.append(
+                    [item['id'] for item in msg['pubsub_event']['items']]))
+
+        self.recvMultiItemEvent()
+        time.sleep(0.2)
+
+        self.assertEqual(events, [['item1', 'item2', 'item3']])
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestStreamPubsub)
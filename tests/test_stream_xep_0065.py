@@ -0,0 +1,86 @@
+import os
+import socket
+import tempfile
+import threading
+
+import unittest
+from sleekxmpp.test import SleekTest
+
+
+class TestSocks5Transfer(SleekTest):
+
+    def setUp(self):
+        self.stream_start(plugins=['xep_0030', 'xep_0065'])
+        self.local, self.remote = socket.socketpair()
+        self.xmpp['xep_0065']._sessions['testing'] = self.local
+
+    def tearDown(self):
+        self.local.close()
+        self.remote.close()
+        self.stream_close()
+
+    def testSendFile(self):
+        """Test sending part of a file over a session."""
+        data = os.urandom(200000)
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            f.flush()
+
+            received = []
+            def reader():
+                while sum(len(chunk) for chunk in received) < 150000:
+                    received.append(self.remote.recv(65536))
+            t = threading.Thread(target=reader)
+            t.start()
+
+            sent = self.xmpp['xep_0065'].send_file('testing', f,
+                                                   offset=50000)
+            t.join()
+
+        self.assertEqual(sent, 150000)
+        self.assertEqual(b''.join(received), data[50000:])
+
+        stats = self.xmpp['xep_0065'].get_stats('testing')
+        self.assertEqual(stats['bytes_sent'], 150000)
+        self.assertEqual(stats['bytes_received'], 0)
+
+    def testRecvFile(self):
+        """Test receiving a session's data into a file."""
+        data = os.urandom(200000)
+
+        def writer():
+            self.remote.sendall(data)
+            self.remote.shutdown(socket.SHUT_WR)
+        t = threading.Thread(target=writer)
+        t.start()
+
+        with tempfile.TemporaryFile() as f:
+            received = self.xmpp['xep_0065'].recv_file('testing', f)
+            t.join()
+            f.seek(0)
+            self.assertEqual(f.read(), data)
+
+        self.assertEqual(received, 200000)
+        stats = self.xmpp['xep_0065'].get_stats('testing')
+        self.assertEqual(stats['bytes_received'], 200000)
+
+    def testClosedSessionStats(self):
+        """Test reading the statistics of a closed session."""
+        self.remote.sendall(b'abc')
+        self.remote.shutdown(socket.SHUT_WR)
+        with tempfile.TemporaryFile() as f:
+            self.xmpp['xep_0065'].recv_file('testing', f)
+
+        del self.xmpp['xep_0065']._sessions['testing']
+        stats = self.xmpp['xep_0065'].get_stats('testing')
+        self.assertEqual(stats['bytes_received'], 3)
+        self.assertEqual(self.xmpp['xep_0065'].get_stats('testing'), {})
+
+    def testUnknownSession(self):
+        """Test transferring over a session that does not exist."""
+        self.assertRaises(socket.error,
+                          self.xmpp['xep_0065'].recv_file,
+                          'unknown', None)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSocks5Transfer)
@@ -0,0 +1,92 @@
+import socket
+import unittest
+from sleekxmpp.test import SleekTest
+from sleekxmpp.plugins.xep_0138 import ZlibSocket
+
+
+MESSAGE = ('<message to="user%d@example.com/phone" from="tester@localhost/r" '
+           'type="chat" id="msg%d"><body>Are we still on for lunch?</body>'
+           '<active xmlns="http://jabber.org/protocol/chatstates" /></message>')
+
+PRESENCE = ('<presence from="user%d@example.com/laptop" id="pres%d">'
+            '<show>away</show><status>In a meeting</status>'
+            '<priority>5</priority></presence>')
+
+
+class TestZlibSocket(SleekTest):
+    """
+    Test compressing and decompressing stream data.
+    """
+
+    def setUp(self):
+        self.sock, self.peer = socket.socketpair()
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+
+    def traffic(self, count=200):
+        return [(MESSAGE if i % 2 else PRESENCE) % (i % 10, i)
+                for i in range(count)]
+
+    def testRoundTrip(self):
+        """Test that compressed data is read back intact."""
+        sender = ZlibSocket(self.sock)
+        receiver = ZlibSocket(self.peer)
+        data = ''.join(self.traffic(20)).encode('utf-8')
+
+        self.assertEqual(sender.send(data), len(data))
+
+        received = b''
+        reader = receiver.makefile('rb', 0)
+        while len(received) < len(data):
+            chunk = reader.read(100)
+            self.assertTrue(len(chunk) <= 100)
+            received += chunk
+        self.assertEqual(received, data)
+        self.assertEqual(receiver.stats['received'], len(data))
+        self.assertEqual(receiver.stats['received_compressed'],
+                         sender.stats['sent_compressed'])
+
+    def testCompressionLevels(self):
+        """Compare wire bytes and CPU time for chat and presence traffic."""
+        stanzas = [s.encode('utf-8') for s in self.traffic()]
+        self.peer.setblocking(0)
+
+        results = {}
+        for level in (1, 6, 9):
+            for flush in ('sync', 'full'):
+                sender = ZlibSocket(self.sock, level=level, flush=flush)
+                for stanza in stanzas:
+                    sender.sendall(stanza)
+                    self.peer.recv(65536)
+                results[(level, flush)] = sender.ratio
+                self.assertEqual(sender.stats['sent'],
+                                 sum(len(s) for s in stanzas))
+                self.assertTrue(sender.stats['compress_time'] >= 0)
+
+        # Keeping the dictionary between stanzas is what makes
+        # compressing small stanzas worthwhile.
+        self.assertTrue(results[(6, 'sync')] < 0.3)
+        self.assertTrue(results[(6, 'sync')] < results[(6, 'full')])
+
+    def testCoalescedWrites(self):
+        """Test that coalesced writes produce fewer wire bytes."""
+        stanzas = [s.encode('utf-8') for s in self.traffic()]
+        self.peer.setblocking(0)
+
+        single = ZlibSocket(self.sock)
+        for stanza in stanzas:
+            single.sendall(stanza)
+            self.peer.recv(65536)
+
+        batched = ZlibSocket(self.sock)
+        for i in range(0, len(stanzas), 10):
+            batched.sendall(b''.join(stanzas[i:i + 10]))
+            self.peer.recv(65536)
+
+        self.assertTrue(batched.stats['sent_compressed'] <
+                        single.stats['sent_compressed'])
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestZlibSocket)
@@ -0,0 +1,208 @@
+import re
+import shutil
+import time
+import tempfile
+import threading
+import unittest
+
+from sleekxmpp.test import SleekTest
+from sleekxmpp.plugins.xep_0198.replay import ReplayBuffer
+from sleekxmpp.plugins.xep_0198.stream_management import MAX_ACK_REQUESTS
+
+
+class TestStreamManagement(SleekTest):
+
+    def tearDown(self):
+        self.stream_close()
+
+    def start(self, **config):
+        self.stream_start(mode='client', plugins=['xep_0198'],
+                          plugin_config={'xep_0198': config})
+        self.xmpp['xep_0198'].enabled.set()
+
+    def testBatchedAck(self):
+        """Test that one event is raised per received ack."""
+        self.start()
+        events = []
+        self.xmpp.add_event_handler('stanzas_acked', events.append)
+
+        for body in ('a', 'b', 'c'):
+            self.xmpp.send_message(mto='user@localhost', mbody=body)
+            self.send("""
+              <message to="user@localhost"><body>%s</body></message>
+            """ % body)
+
+        self.recv("""<a xmlns="urn:xmpp:sm:3" h="2" />""")
+        time.sleep(.1)
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(len(events[0]), 2)
+        self.assertTrue('<body>b</body>' in events[0][1])
+        self.assertEqual(len(self.xmpp['xep_0198'].unacked_queue), 1)
+
+    def testSingleAck(self):
+        """Test that an event is still raised for each acked stanza."""
+        self.start()
+        events = []
+        self.xmpp.add_event_handler('stanza_acked', events.append)
+
+        for body in ('a', 'b'):
+            self.xmpp.send_message(mto='user@localhost', mbody=body)
+            self.send("""
+              <message to="user@localhost"><body>%s</body></message>
+            """ % body)
+
+        self.recv("""<a xmlns="urn:xmpp:sm:3" h="2" />""")
+        time.sleep(.1)
+
+        self.assertEqual([msg['body'] for msg in events], ['a', 'b'])
+        self.assertEqual(events[0]['to'], 'user@localhost')
+
+    def testAckWindow(self):
+        """Test requesting an ack after a window of sent stanzas."""
+        self.start(window=2, window_time=None)
+
+        self.xmpp.send_message(mto='user@localhost', mbody='a')
+        self.send("""
+          <message to="user@localhost"><body>a</body></message>
+        """)
+
+        # The ack request is sent immediately after the stanza
+        # that completed the window.
+        self.xmpp.send_message(mto='user@localhost', mbody='b')
+        sent = self.xmpp.socket.next_sent(timeout=1)
+        self.assertTrue(sent.endswith(b'<r xmlns="urn:xmpp:sm:3" />'))
+
+        self.recv("""<a xmlns="urn:xmpp:sm:3" h="2" />""")
+        time.sleep(.1)
+
+        stats = self.xmpp['xep_0198'].ack_stats
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['acks'], 1)
+        self.assertEqual(stats['unacked'], 0)
+        self.assertTrue(stats['rtt'] is not None)
+
+    def testAckWindowTime(self):
+        """Test requesting an ack after stanzas have waited too long."""
+        self.start(window=10, window_time=0.2)
+
+        self.xmpp.send_message(mto='user@localhost', mbody='a')
+        self.send("""
+          <message to="user@localhost"><body>a</body></message>
+        """)
+        self.send("""<r xmlns="urn:xmpp:sm:3" />""", timeout=2)
+
+    def testResumeResend(self):
+        """Test resending unacked stanzas after resuming a stream."""
+        self.start()
+        self.xmpp['xep_0198'].sm_id = 'sm-1'
+
+        for body in ('a', 'b'):
+            self.xmpp.send_message(mto='user@localhost', mbody=body)
+            self.send("""
+              <message to="user@localhost"><body>%s</body></message>
+            """ % body)
+
+        self.recv("""<resumed xmlns="urn:xmpp:sm:3" previd="sm-1" h="1" />""")
+        self.send("""
+          <message to="user@localhost"><body>b</body></message>
+        """)
+
+    def testBufferOverflow(self):
+        """Test that resumption is abandoned when the buffer overflows."""
+        self.start(buffer_size=10)
+
+        self.xmpp.send_message(mto='user@localhost', mbody='a')
+        self.send("""
+          <message to="user@localhost"><body>a</body></message>
+        """)
+
+        sm = self.xmpp['xep_0198']
+        self.assertTrue(sm.unacked_queue.overflowed)
+        self.assertEqual(len(sm.unacked_queue), 0)
+
+    def testUnansweredRequests(self):
+        """Test that unanswered ack requests are not kept forever."""
+        self.start()
+        sm = self.xmpp['xep_0198']
+        for _ in range(MAX_ACK_REQUESTS + 10):
+            sm.request_ack()
+        self.assertEqual(len(sm._ack_requests), MAX_ACK_REQUESTS)
+        self.assertEqual(sm.ack_stats['requests'], MAX_ACK_REQUESTS + 10)
+
+    def testConcurrentSenders(self):
+        """Test that stanzas sent from many threads keep their order."""
+        self.start(window=1000, window_time=None)
+        threads, count = 8, 250
+
+        def produce(name):
+            for x in range(count):
+                self.xmpp.send_message(mto='user@localhost',
+                                       mbody='%s-%s' % (name, x))
+
+        producers = [threading.Thread(target=produce, args=(n,))
+                     for n in range(threads)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+
+        sent = []
+        while len(sent) < threads * count:
+            data = self.xmpp.socket.next_sent(timeout=1)
+            if data is None:
+                break
+            sent.extend(re.findall('<body>([^<]*)</body>',
+                                   data.decode('utf-8')))
+
+        # Each thread's stanzas are sent in order, and are numbered
+        # for stream management in the order they were sent.
+        self.assertEqual(len(sent), threads * count)
+        for name in range(threads):
+            mine = [body for body in sent if body.startswith('%s-' % name)]
+            self.assertEqual(mine, ['%s-%s' % (name, x)
+                                    for x in range(count)])
+        queued = [re.search('<body>([^<]*)</body>', data).group(1)
+                  for data in self.xmpp['xep_0198'].unacked_queue]
+        self.assertEqual(queued, sent)
+        self.assertEqual(self.xmpp['xep_0198'].seq, threads * count)
+
+
+class TestReplayBuffer(unittest.TestCase):
+
+    def testSpillRing(self):
+        """Test spilling to disk and wrapping around the spill ring."""
+        spill_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spill_path, True)
+        buf = ReplayBuffer(max_size=10, spill_path=spill_path,
+                           spill_size=30)
+        for seq in range(1, 5):
+            buf.append(seq, '%010d' % seq)
+
+        self.assertEqual(len(buf), 4)
+        self.assertFalse(buf.overflowed)
+        self.assertEqual(buf.pop(2), ['%010d' % 1, '%010d' % 2])
+
+        # The freed space at the start of the ring is reused.
+        buf.append(5, '%010d' % 5)
+        buf.append(6, '%010d' % 6)
+        self.assertFalse(buf.overflowed)
+        self.assertEqual(list(buf), ['%010d' % seq for seq in range(3, 7)])
+
+        buf.append(7, '%010d' % 7)
+        buf.append(8, '%010d' % 8)
+        self.assertTrue(buf.overflowed)
+        self.assertEqual(len(buf), 0)
+        buf.close()
+
+    def testNoLoad(self):
+        """Test discarding acked entries without returning them."""
+        buf = ReplayBuffer()
+        buf.append(1, '<message />')
+        self.assertEqual(buf.pop(1, load=False), [])
+        self.assertEqual(len(buf), 0)
+
+
+suite = unittest.TestSuite([
+    unittest.TestLoader().loadTestsFromTestCase(TestStreamManagement),
+    unittest.TestLoader().loadTestsFromTestCase(TestReplayBuffer)])
@@ -0,0 +1,93 @@
+import threading
+import unittest
+from sleekxmpp.test import SleekTest
+
+
+class TestStreamMAM(SleekTest):
+
+    """
+    Test streaming archive results with the XEP-0313 plugin.
+    """
+
+    def setUp(self):
+        self.stream_start(mode='client', plugins=['xep_0313'])
+        self.mam = self.xmpp['xep_0313']
+        self.received = []
+
+    def tearDown(self):
+        self.stream_close()
+
+    def consume(self, **kwargs):
+        for msg in self.mam.stream(page_size=2, **kwargs):
+            self.received.append(msg['mam_result']['id'])
+
+    def sendQuery(self, iq_id, after=None):
+        after = '<after>%s</after>' % after if after else ''
+        self.send("""
+          <iq type="set" id="%s">
+            <query xmlns="urn:xmpp:mam:2" queryid="%s">
+              <set xmlns="http://jabber.org/protocol/rsm" max="2">%s</set>
+            </query>
+          </iq>
+        """ % (iq_id, iq_id, after), use_values=False)
+
+    def recvResults(self, iq_id, ids, complete=False):
+        for msg_id in ids:
+            self.recv("""
+              <message to="tester@localhost">
+                <result xmlns="urn:xmpp:mam:2" queryid="%s" id="%s">
+                  <forwarded xmlns="urn:xmpp:forward:0">
+                    <message from="user@example.com">
+                      <body>Message %s</body>
+                    </message>
+                  </forwarded>
+                </result>
+              </message>
+            """ % (iq_id, msg_id, msg_id))
+        self.recv("""
+          <iq type="result" id="%s">
+            <fin xmlns="urn:xmpp:mam:2" %s>
+              <set xmlns="http://jabber.org/protocol/rsm">
+                <last>%s</last>
+              </set>
+            </fin>
+          </iq>
+        """ % (iq_id, 'complete="true"' if complete else '', ids[-1]))
+
+    def testStreamPages(self):
+        """Test streaming results a page at a time with a checkpoint."""
+        t = threading.Thread(target=self.consume,
+                             kwargs={'checkpoint': 'sync'})
+        t.start()
+
+        self.sendQuery('1')
+        self.recvResults('1', ['a', 'b'])
+        self.sendQuery('2', after='b')
+        self.recvResults('2', ['c'], complete=True)
+        t.join(2)
+
+        self.assertEqual(self.received, ['a', 'b', 'c'])
+        self.assertEqual(self.mam.api['get_checkpoint'](None, 'sync'), 'c')
+
+        # A new stream with the same checkpoint resumes after it.
+        t = threading.Thread(target=self.consume,
+                             kwargs={'checkpoint': 'sync'})
+        t.start()
+        self.sendQuery('3', after='c')
+        self.recvResults('3', ['d'], complete=True)
+        t.join(2)
+
+        self.assertEqual(self.received, ['a', 'b', 'c', 'd'])
+
+    def testSplitRange(self):
+        """Test dividing a time range for parallel retrieval."""
+        import datetime as dt
+        start = dt.datetime(2020, 1, 1)
+        end = dt.datetime(2020, 1, 5)
+        ranges = self.mam.split_range(start, end, 4)
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[0], (start, dt.datetime(2020, 1, 2)))
+        self.assertEqual(ranges[-1], (dt.datetime(2020, 1, 4), end))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestStreamMAM)
@@ -1245,6 +1245,213 @@ class TestStreamSensorData(SleekTest):
         self.send(None)
 
 
+    def testBatchedFields(self):
+        """Test combining readouts from several nodes in one message."""
+        self.stream_start(mode='component',
+                          plugins=['xep_0030',
+                                   'xep_0323'])
+        self.xmpp['xep_0323'].batch_latency = 0.5
+
+        myDevice = Device("Device44")
+        myDevice._add_field(name='Voltage', typename="numeric", unit="V")
+        myDevice._add_field_values("Voltage", [("2000-01-01T00:01:02", "230.4"),
+                                               ("2000-01-01T01:01:02", "230.6")])
+        self.xmpp['xep_0323'].register_node('Device44', myDevice, commTimeout=0.5)
+
+        myDevice = Device("Device22")
+        myDevice._add_field(name="Temperature", typename="numeric", unit="C")
+        myDevice._add_field_timestamp_data("Temperature", "2013-03-07T16:24:30", "23.4")
+        self.xmpp['xep_0323'].register_node('Device22', myDevice, commTimeout=0.5)
+
+        self.recv("""
+            <iq type='get'
+                from='master@clayster.com/amr'
+                to='device@clayster.com'
+                id='1'>
+                <req xmlns='urn:xmpp:iot:sensordata' seqnr='1'>
+                    <node nodeId='Device44'/>
+                    <node nodeId='Device22'/>
+                </req>
+            </iq>
+        """)
+
+        self.send("""
+            <iq type='result'
+                from='device@clayster.com'
+                to='master@clayster.com/amr'
+                id='1'>
+                <accepted xmlns='urn:xmpp:iot:sensordata' seqnr='1'/>
+            </iq>
+            """)
+
+        self.send("""
+            <message from='device@clayster.com'
+                     to='master@clayster.com/amr'>
+                <fields xmlns='urn:xmpp:iot:sensordata' seqnr='1' done='true'>
+                    <node nodeId='Device44'>
+                        <timestamp value='2000-01-01T00:01:02'>
+                            <numeric name='Voltage' value='230.4' unit='V'/>
+                        </timestamp>
+                        <timestamp value='2000-01-01T01:01:02'>
+                            <numeric name='Voltage' value='230.6' unit='V'/>
+                        </timestamp>
+                    </node>
+                    <node nodeId='Device22'>
+                        <timestamp value='2013-03-07T16:24:30'>
+                            <numeric name='Temperature' value='23.4' unit='C'/>
+                        </timestamp>
+                    </node>
+                </fields>
+            </message>
+            """)
+
+    def testBatchedFieldsLimit(self):
+        """Test splitting batched readouts at batch_max_fields."""
+
+        class SlowDevice(Device):
+            def request_fields(self, fields, flags, session, callback):
+                blocks = [{"timestamp": "2000-01-01T00:0%s:00" % x,
+                           "fields": [{"name": "Voltage",
+                                       "type": "numeric",
+                                       "unit": "V",
+                                       "dataType": None,
+                                       "value": str(x),
+                                       "flags": None}]} for x in range(3)]
+                callback(session, result="fields", nodeId=self.nodeId,
+                         timestamp_block=blocks)
+
+        self.stream_start(mode='component',
+                          plugins=['xep_0030',
+                                   'xep_0323'])
+        self.xmpp['xep_0323'].batch_latency = 0.2
+        self.xmpp['xep_0323'].batch_max_fields = 2
+
+        myDevice = SlowDevice("Device44")
+        myDevice._add_field(name='Voltage', typename="numeric", unit="V")
+        self.xmpp['xep_0323'].register_node('Device44', myDevice, commTimeout=5)
+
+        self.recv("""
+            <iq type='get'
+                from='master@clayster.com/amr'
+                to='device@clayster.com'
+                id='1'>
+                <req xmlns='urn:xmpp:iot:sensordata' seqnr='1'/>
+            </iq>
+        """)
+
+        self.send("""
+            <iq type='result'
+                from='device@clayster.com'
+                to='master@clayster.com/amr'
+                id='1'>
+                <accepted xmlns='urn:xmpp:iot:sensordata' seqnr='1'/>
+            </iq>
+            """)
+
+        # The first two values fill a message, the last one is sent
+        # once the latency window has passed.
+        self.send("""
+            <message from='device@clayster.com'
+                     to='master@clayster.com/amr'>
+                <fields xmlns='urn:xmpp:iot:sensordata' seqnr='1'>
+                    <node nodeId='Device44'>
+                        <timestamp value='2000-01-01T00:00:00'>
+                            <numeric name='Voltage' value='0' unit='V'/>
+                        </timestamp>
+                        <timestamp value='2000-01-01T00:01:00'>
+                            <numeric name='Voltage' value='1' unit='V'/>
+                        </timestamp>
+                    </node>
+                </fields>
+            </message>
+            """)
+
+        self.send("""
+            <message from='device@clayster.com'
+                     to='master@clayster.com/amr'>
+                <fields xmlns='urn:xmpp:iot:sensordata' seqnr='1'>
+                    <node nodeId='Device44'>
+                        <timestamp value='2000-01-01T00:02:00'>
+                            <numeric name='Voltage' value='2' unit='V'/>
+                        </timestamp>
+                    </node>
+                </fields>
+            </message>
+            """, timeout=1)
+
+    def _device_farm(self, size, device_class=Device, commTimeout=0.5):
+        for x in range(size):
+            device = device_class("Device%s" % x)
+            device._add_field(name="Temperature", typename="numeric", unit="C")
+            device._set_momentary_timestamp("2013-03-07T16:24:30")
+            device._add_field_momentary_data("Temperature", str(x),
+                                             flags={"momentary": "true"})
+            self.xmpp['xep_0323'].register_node("Device%s" % x, device,
+                                                commTimeout=commTimeout)
+
+    def _request_all(self):
+        self.recv("""
+            <iq type='get'
+                from='master@clayster.com/amr'
+                to='device@clayster.com'
+                id='1'>
+                <req xmlns='urn:xmpp:iot:sensordata' seqnr='1' momentary='true'/>
+            </iq>
+        """)
+        self.send("""
+            <iq type='result'
+                from='device@clayster.com'
+                to='master@clayster.com/amr'
+                id='1'>
+                <accepted xmlns='urn:xmpp:iot:sensordata' seqnr='1'/>
+            </iq>
+        """)
+
+    def testDeviceFarmLoad(self):
+        """Test reading out 10k devices with a bounded number of threads."""
+        self.stream_start(mode='component',
+                          plugins=['xep_0030',
+                                   'xep_0323'])
+        self._device_farm(10000)
+        threads = threading.active_count()
+        peak = threads
+
+        self._request_all()
+        plugin = self.xmpp['xep_0323']
+        end = time.time() + 60
+        while plugin.sessions and time.time() < end:
+            peak = max(peak, threading.active_count())
+            time.sleep(0.01)
+
+        self.assertEqual(plugin.sessions, {})
+        self.assertTrue(peak - threads <= plugin.max_workers,
+                        "Readout used %s threads." % (peak - threads))
+        self.assertEqual(len(self.xmpp.scheduler.tasks), 0)
+
+    def testDeviceFarmTimeout(self):
+        """Test that a timeout cancels the timers of the other devices."""
+
+        class SilentDevice(Device):
+            def request_fields(self, fields, flags, session, callback):
+                pass
+
+        self.stream_start(mode='component',
+                          plugins=['xep_0030',
+                                   'xep_0323'])
+        self._device_farm(10000, SilentDevice, commTimeout=2)
+        plugin = self.xmpp['xep_0323']
+
+        self._request_all()
+        end = time.time() + 60
+        while len(self.xmpp.scheduler.tasks) < 10000 and time.time() < end:
+            time.sleep(0.01)
+        self.assertEqual(len(self.xmpp.scheduler.tasks), 10000)
+
+        while plugin.sessions and time.time() < end:
+            time.sleep(0.05)
+        self.assertEqual(plugin.sessions, {})
+        self.assertEqual(len(self.xmpp.scheduler.tasks), 0)
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestStreamSensorData)
 
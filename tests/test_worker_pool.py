@@ -0,0 +1,47 @@
+import time
+import threading
+import unittest
+from sleekxmpp.test import SleekTest
+from sleekxmpp.util import WorkerPool
+
+
+class TestWorkerPool(SleekTest):
+
+    """
+    Test running jobs in a bounded pool of worker threads.
+    """
+
+    def setUp(self):
+        self.pool = WorkerPool(4, name='test_pool')
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def testBurst(self):
+        """Test that a burst of jobs does not wait on one idle worker."""
+        self.pool.submit(lambda: None)
+        for _ in range(20):
+            if self.pool._idle:
+                break
+            time.sleep(0.05)
+
+        started = []
+        release = threading.Event()
+
+        def job(x):
+            started.append(x)
+            release.wait(2)
+
+        for x in range(3):
+            self.pool.submit(job, x)
+        for _ in range(20):
+            if len(started) == 3:
+                break
+            time.sleep(0.05)
+        release.set()
+
+        self.assertEqual(sorted(started), [0, 1, 2])
+        self.assertTrue(self.pool.threads <= 4)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestWorkerPool)